@@ -18,20 +18,17 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
 def add_links(input_path, links_json):
     """Add hyperlinks to PDF pages."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         # Parse links
@@ -54,16 +51,14 @@ def add_links(input_path, links_json):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_linked_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("add_links")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
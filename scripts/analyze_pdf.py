@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Analyze where the bytes of a PDF go, without decoding content or image streams.
+Usage: python analyze_pdf.py <input_pdf>
+Output: JSON with result (byte breakdown by category and predicted savings)
+"""
+
+import sys
+import os
+import json
+import time
+
+try:
+    from pdf_scan import PdfScan, Ref
+except ImportError as e:
+    print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
+    sys.exit(1)
+
+# Image codecs keyed by the stream's (first) filter
+IMAGE_CODECS = {
+    "/DCTDecode": "jpeg",
+    "/DCT": "jpeg",
+    "/JPXDecode": "jpeg2000",
+    "/JBIG2Decode": "jbig2",
+    "/CCITTFaxDecode": "ccitt",
+    "/CCF": "ccitt",
+    "/FlateDecode": "flate",
+    "/Fl": "flate",
+    "/LZWDecode": "lzw",
+    "/LZW": "lzw",
+    "/RunLengthDecode": "runlength",
+    "/RL": "runlength",
+}
+
+# Text encodings wrapped around the real codec; they only inflate the data
+ASCII_FILTERS = ("/ASCII85Decode", "/A85", "/ASCIIHexDecode", "/AHx")
+
+FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+
+CATEGORIES = (
+    "images",
+    "fonts",
+    "contentStreams",
+    "forms",
+    "metadata",
+    "attachments",
+    "unused",
+    "structure",
+    "other",
+)
+
+# Rough fraction of each kind of bytes that compress_pdf recovers
+SAVINGS_RATIOS = {
+    "unused": 1.0,
+    "uncompressedStreams": 0.6,
+    "asciiEncodedStreams": 0.2,
+    "contentStreams": 0.1,
+    "metadata": 0.5,
+}
+
+
+def _filters(header):
+    filters = header.get("/Filter")
+    if filters is None:
+        return []
+    return filters if isinstance(filters, list) else [filters]
+
+
+def _codec_filter(header):
+    """The filter that actually compresses the data, skipping ASCII wrappers."""
+    for name in _filters(header):
+        if name not in ASCII_FILTERS:
+            return name
+    return None
+
+
+def _refs_of(scan, value):
+    """Object numbers named by a ref or an (indirect) array of refs."""
+    if isinstance(value, Ref):
+        target = scan.get(value)
+        if isinstance(target, list):
+            return [v.num for v in target if isinstance(v, Ref)]
+        return [value.num]
+    if isinstance(value, list):
+        return [v.num for v in value if isinstance(v, Ref)]
+    return []
+
+
+def classify_objects(scan):
+    """Return {object number: category} for every object in the scan."""
+    roles = {}
+
+    for page_num in scan.page_refs():
+        page = scan.get(Ref(page_num))
+        if isinstance(page, dict):
+            for num in _refs_of(scan, page.get("/Contents")):
+                roles[num] = "contentStreams"
+
+    info_ref = scan.trailer.get("/Info")
+    if isinstance(info_ref, Ref):
+        roles[info_ref.num] = "metadata"
+
+    for num, obj in scan.objects.items():
+        header = obj["header"]
+        if not isinstance(header, dict):
+            continue
+        obj_type = header.get("/Type")
+        subtype = header.get("/Subtype")
+
+        if obj_type == "/FontDescriptor":
+            roles.setdefault(num, "fonts")
+            for key in FONT_FILE_KEYS:
+                for ref in _refs_of(scan, header.get(key)):
+                    roles[ref] = "fonts"
+        elif obj_type == "/Font":
+            roles.setdefault(num, "fonts")
+            for ref in _refs_of(scan, header.get("/ToUnicode")):
+                roles[ref] = "fonts"
+        elif obj_type in ("/ObjStm", "/XRef"):
+            roles[num] = "structure"
+        elif obj_type == "/Metadata" or subtype == "/XML":
+            roles[num] = "metadata"
+        elif obj_type in ("/EmbeddedFile", "/Filespec"):
+            roles[num] = "attachments"
+            ef = scan.get(header.get("/EF"))
+            if isinstance(ef, dict):
+                for value in ef.values():
+                    for ref in _refs_of(scan, value):
+                        roles[ref] = "attachments"
+        elif subtype == "/Image":
+            roles[num] = "images"
+        elif subtype == "/Form":
+            roles.setdefault(num, "forms")
+
+    reachable = scan.reachable()
+    categories = {}
+    for num, obj in scan.objects.items():
+        if obj["container"] is None and num not in reachable and roles.get(num) != "structure":
+            categories[num] = "unused"
+        elif num in roles:
+            categories[num] = roles[num]
+        elif obj["stream"] is not None:
+            categories[num] = "other"
+        else:
+            categories[num] = "structure"
+    return categories
+
+
+def analyze_pdf(input_path):
+    """Break a PDF's size down by what the bytes are used for."""
+    if not os.path.exists(input_path):
+        return {"success": False, "error": f"File not found: {input_path}"}
+
+    started = time.perf_counter()
+
+    try:
+        with PdfScan(input_path) as scan:
+            if not scan.objects:
+                return {"success": False, "error": "No PDF objects found"}
+
+            categories = classify_objects(scan)
+            breakdown = {name: {"count": 0, "bytes": 0} for name in CATEGORIES}
+            codecs = {}
+            uncompressed_stream_bytes = 0
+            ascii_stream_bytes = 0
+            compressed_content_bytes = 0
+
+            for num, obj in scan.objects.items():
+                if obj["container"] is not None:
+                    # Counted, but its bytes belong to the object stream
+                    breakdown[categories[num]]["count"] += 1
+                    continue
+
+                category = categories[num]
+                breakdown[category]["count"] += 1
+                breakdown[category]["bytes"] += obj["size"]
+
+                header = obj["header"] if isinstance(obj["header"], dict) else {}
+                if category == "images":
+                    codec = IMAGE_CODECS.get(_codec_filter(header), "raw")
+                    entry = codecs.setdefault(codec, {"count": 0, "bytes": 0})
+                    entry["count"] += 1
+                    entry["bytes"] += obj["size"]
+                if obj["stream"] is not None and category not in ("unused", "structure"):
+                    length = obj["stream"][1]
+                    if _codec_filter(header) is None:
+                        uncompressed_stream_bytes += length
+                    elif any(f in ASCII_FILTERS for f in _filters(header)):
+                        ascii_stream_bytes += length
+                    elif category == "contentStreams":
+                        compressed_content_bytes += length
+
+            accounted = sum(v["bytes"] for v in breakdown.values())
+            breakdown["structure"]["bytes"] += max(0, scan.size - accounted)
+            breakdown["images"]["byCodec"] = codecs
+
+            predicted = int(
+                breakdown["unused"]["bytes"] * SAVINGS_RATIOS["unused"]
+                + uncompressed_stream_bytes * SAVINGS_RATIOS["uncompressedStreams"]
+                + ascii_stream_bytes * SAVINGS_RATIOS["asciiEncodedStreams"]
+                + compressed_content_bytes * SAVINGS_RATIOS["contentStreams"]
+                + breakdown["metadata"]["bytes"] * SAVINGS_RATIOS["metadata"]
+            )
+            predicted = min(predicted, scan.size)
+
+            return {
+                "success": True,
+                "fileSize": scan.size,
+                "pageCount": scan.page_count(),
+                "objectCount": len(scan.objects),
+                "breakdown": breakdown,
+                "uncompressedStreamBytes": uncompressed_stream_bytes,
+                "asciiEncodedStreamBytes": ascii_stream_bytes,
+                "predictedSavings": predicted,
+                "predictedReduction": (
+                    round(predicted / scan.size * 100, 1) if scan.size > 0 else 0
+                ),
+                "elapsedMs": round((time.perf_counter() - started) * 1000, 1),
+            }
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({"success": False, "error": "Input PDF file required"}))
+        sys.exit(1)
+
+    input_path = sys.argv[1]
+    result = analyze_pdf(input_path)
+    print(json.dumps(result))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Bates-number a set of PDFs as one production.
+Numbers run on from one file to the next in the order given; every page
+gets a label from the template, by default the Bates number itself. The
+run fails, with no output, if any file cannot be numbered.
+Usage: python bates_pdf.py <files_json> [prefix] [start_number] [digits] [template] [position]
+files_json: JSON array of file paths
+template: label text with {page}, {total}, {bates} and {filename} fields
+          (default "{bates}")
+Position: bottom-center, bottom-left, bottom-right, top-center, top-left, top-right
+          (default bottom-right)
+Output: JSON with result
+"""
+
+import sys
+import os
+import json
+from datetime import datetime
+
+try:
+    from numbering_engine import BATES_DIGITS, bates_number, check_template, number_set
+    from zip_packager import ZipPackager
+except ImportError as e:
+    print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
+    sys.exit(1)
+
+from output_manager import OutputJob
+
+
+def bates_number_pdfs(
+    files_json,
+    prefix="",
+    start_number="1",
+    digits=str(BATES_DIGITS),
+    template="{bates}",
+    position="bottom-right",
+):
+    """Bates-number a set of PDFs in order."""
+    job = None
+    try:
+        files = json.loads(files_json)
+
+        if not files:
+            return {"success": False, "error": "No files provided"}
+
+        # A missing file would shift every later number, so none is skipped
+        missing = [path for path in files if not os.path.exists(path)]
+        if missing:
+            return {"success": False, "error": f"File not found: {missing[0]}"}
+
+        start = int(start_number)
+        options = {
+            "template": check_template(template),
+            "position": position,
+            "prefix": prefix,
+            "digits": int(digits),
+        }
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job = OutputJob("bates")
+        names = [
+            f"{os.path.splitext(os.path.basename(path))[0]}_bates.pdf" for path in files
+        ]
+        documents = []
+
+        def record(name, result, archive=None):
+            if archive is not None:
+                name = archive.add(name, result["data"])
+            documents.append(
+                {
+                    "file": result["path"],
+                    "name": name,
+                    "pages": result["pages"],
+                    "batesStart": bates_number(result["batesStart"], prefix, int(digits)),
+                    "batesEnd": bates_number(result["batesEnd"], prefix, int(digits)),
+                }
+            )
+
+        # A document that fails to stamp would leave a gap in the
+        # production's numbering, so it fails the whole run
+        failed = None
+        if len(files) == 1:
+            output_path = job.staged(names[0])
+            result = next(number_set(files, [output_path], options, start))
+            if "error" in result:
+                failed = result
+            else:
+                record(names[0], result)
+        else:
+            # Documents are numbered in parallel and streamed from memory
+            # into the zip in set order as they finish
+            output_path = job.staged(f"bates_{timestamp}.zip")
+            results = number_set(files, [None] * len(files), options, start)
+            with ZipPackager(output_path) as archive:
+                for name, result in zip(names, results):
+                    if "error" in result:
+                        failed = result
+                        break
+                    record(name, result, archive)
+            results.close()
+
+        if failed is not None:
+            job.discard()
+            return {
+                "success": False,
+                "error": f"Failed to number {failed['path']}: {failed['error']}",
+                "failed": {"file": failed["path"], "error": failed["error"]},
+            }
+        output_path = job.publish(output_path)
+
+        return {
+            "success": True,
+            "output": output_path,
+            "documents": documents,
+            "firstBates": documents[0]["batesStart"],
+            "lastBates": documents[-1]["batesEnd"],
+            "stampedCount": len(documents),
+        }
+
+    except Exception as e:
+        # e.g. a file whose pages could not be counted; nothing was published
+        if job is not None:
+            job.discard()
+        return {"success": False, "error": str(e)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({"success": False, "error": "Files JSON required"}))
+        sys.exit(1)
+
+    files_json = sys.argv[1]
+    prefix = sys.argv[2] if len(sys.argv) > 2 else ""
+    start_number = sys.argv[3] if len(sys.argv) > 3 else "1"
+    digits = sys.argv[4] if len(sys.argv) > 4 else str(BATES_DIGITS)
+    template = sys.argv[5] if len(sys.argv) > 5 and sys.argv[5] else "{bates}"
+    position = sys.argv[6] if len(sys.argv) > 6 else "bottom-right"
+
+    result = bates_number_pdfs(files_json, prefix, start_number, digits, template, position)
+    print(json.dumps(result))
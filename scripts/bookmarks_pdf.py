@@ -17,11 +17,9 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
+from resource_guard import preflight
 
 
 def detect_headings(text_lines):
@@ -61,17 +59,21 @@ def detect_headings(text_lines):
 
 def auto_bookmarks(input_path):
     """Generate bookmarks automatically from PDF content."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         bookmarks = []
 
         # Extract text and detect headings
-        with pdfplumber.open(input_path) as pdf:
+        with pdfplumber.open(open_input(input_path)) as pdf:
             for page_num, page in enumerate(pdf.pages, 1):
                 text = page.extract_text()
                 if text:
@@ -100,16 +102,14 @@ def auto_bookmarks(input_path):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_bookmarked_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("bookmarks")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
@@ -12,64 +12,39 @@ from datetime import datetime
 
 try:
     from pypdf import PdfReader, PdfWriter
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import inch
+    from overlay import FormStamper
+    from stamp import parse_color
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
 def add_border_to_pdf(input_path, border_width=10, border_color="#000000", margin=20):
     """Add border/frame to PDF pages."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
+        job = OutputJob("border")
 
         # Parse border color
-        if border_color.startswith("#"):
-            r = int(border_color[1:3], 16) / 255
-            g = int(border_color[3:5], 16) / 255
-            b = int(border_color[5:7], 16) / 255
-            border_color_rgb = (r, g, b)
-        else:
-            border_color_rgb = (0, 0, 0)
-
-        for page_num, page in enumerate(reader.pages):
-            # Get page dimensions
-            media_box = page.mediabox
-            page_width = float(media_box.width)
-            page_height = float(media_box.height)
-
-            # Create border page
-            border_path = os.path.join(DOWNLOAD_DIR, f"border_temp_{page_num}.pdf")
-            c = canvas.Canvas(border_path, pagesize=(page_width, page_height))
-
-            # Draw border
-            c.setStrokeColorRGB(*border_color_rgb)
-            c.setLineWidth(border_width)
-            c.rect(margin, margin, page_width - 2 * margin, page_height - 2 * margin)
-            c.save()
-
-            # Merge border with page
-            border_reader = PdfReader(border_path)
-            page.merge_page(border_reader.pages[0])
-            writer.add_page(page)
-
-            # Clean up temp file
-            try:
-                os.remove(border_path)
-            except:
-                pass
+        border_color_rgb = parse_color(border_color)
+
+        def draw_border(stamp, page_width, page_height):
+            stamp.rect(
+                margin, margin, page_width - 2 * margin, page_height - 2 * margin,
+                stroke=border_color_rgb, line_width=border_width,
+            )
+
+        # One border per distinct page size
+        stamper = FormStamper(writer, draw_border, "/Border")
+        for page in reader.pages:
+            stamper.stamp(writer.add_page(page))
 
         # Copy metadata
         if reader.metadata:
@@ -77,16 +52,13 @@ def add_border_to_pdf(input_path, border_width=10, border_color="#000000", margi
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_bordered_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
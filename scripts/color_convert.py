@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Colour conversion shared by grayscale_pdf.py and cmyk_rgb_pdf.py.
+Rewrites colour operators in page, form and annotation appearance content
+streams and converts image XObjects with NumPy over whole decoded buffers.
+Shadings, tiling patterns and inline images keep their colour and are
+reported as skipped. CMYK images with an
+embedded ICC profile go through a cached Pillow ImageCms transform.
+"""
+
+import hashlib
+import io
+import re
+
+import numpy as np
+from PIL import Image
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        ByteStringObject,
+        DecodedStreamObject,
+        NameObject,
+        NumberObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        ByteStringObject,
+        DecodedStreamObject,
+        NameObject,
+        NumberObject,
+    )
+
+from content_stream import format_number, rewrite_stream, serialize, tokenize
+from pdf_images import (
+    COMPONENTS,
+    colorspace_family,
+    decode_image,
+    image_family,
+    iter_xobjects,
+    replace_image,
+    to_uint8,
+)
+
+# ITU-R BT.601 luma weights
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Device colour operators: operator -> (side, colour family of its operands)
+DEVICE_COLOR_OPERATORS = {
+    b"g": ("fill", "gray"),
+    b"G": ("stroke", "gray"),
+    b"rg": ("fill", "rgb"),
+    b"RG": ("stroke", "rgb"),
+    b"k": ("fill", "cmyk"),
+    b"K": ("stroke", "cmyk"),
+}
+SET_SPACE_OPERATORS = {b"cs": "fill", b"CS": "stroke"}
+SET_COLOR_OPERATORS = {b"sc": "fill", b"scn": "fill", b"SC": "stroke", b"SCN": "stroke"}
+
+TARGET_OPERATORS = {
+    "gray": {"fill": b"g", "stroke": b"G"},
+    "rgb": {"fill": b"rg", "stroke": b"RG"},
+}
+TARGET_SPACES = {"gray": b"/DeviceGray", "rgb": b"/DeviceRGB"}
+
+# Which source families each target converts
+CONVERTIBLE = {"gray": ("rgb", "cmyk"), "rgb": ("cmyk",)}
+
+# Content that keeps its source colour, reported rather than converted:
+# stats key -> description used in warnings
+SKIPPED_KINDS = {
+    "shadings": "smooth shadings",
+    "patterns": "pattern fills",
+    "inlineImages": "inline images",
+}
+
+# Colour space entry of an inline image dictionary: a name or an array
+INLINE_COLORSPACE = re.compile(rb"/(?:CS|ColorSpace)\s*(/[^\s/\[\]<>()]+|\[)")
+
+# Decimals kept for rewritten colour components
+COLOR_PRECISION = 4
+
+# JPEG quality used when a converted image was JPEG to begin with
+JPEG_QUALITY = 85
+
+# ICC CMYK -> sRGB transforms keyed by profile hash; they are expensive to
+# build, so one transform serves every image (and every file) in a process
+_CMYK_TRANSFORMS = {}
+
+
+def cmyk_to_rgb_array(values):
+    """Naive device CMYK -> RGB for a (..., 4) float array in 0..1."""
+    cmy = values[..., :3]
+    k = values[..., 3:4]
+    return (1.0 - cmy) * (1.0 - k)
+
+
+def rgb_to_gray_array(values):
+    """Luma of a (..., 3) float array in 0..1."""
+    return values @ LUMA
+
+
+def convert_values(values, family, target):
+    """
+    Convert a float array of shape (..., n) from `family` to `target`.
+    Returns None when the family is not converted for that target.
+    """
+    if family not in CONVERTIBLE[target]:
+        return None
+    if family == "cmyk":
+        values = cmyk_to_rgb_array(values)
+    if target == "gray":
+        values = rgb_to_gray_array(values)[..., np.newaxis]
+    return values
+
+
+def icc_profile_bytes(colorspace):
+    """The embedded ICC profile of an [/ICCBased stream] colour space, or None."""
+    colorspace = colorspace.get_object()
+    if isinstance(colorspace, ArrayObject) and len(colorspace) > 1:
+        if str(colorspace[0]) == "/ICCBased":
+            return colorspace[1].get_object().get_data()
+    return None
+
+
+def cmyk_transform(profile_bytes):
+    """
+    Build (or reuse) a Pillow transform from a CMYK ICC profile to sRGB.
+    Returns None when ImageCms is unavailable or the profile is unusable.
+    """
+    if ImageCms is None:
+        return None
+    key = hashlib.sha256(profile_bytes).hexdigest()
+    if key not in _CMYK_TRANSFORMS:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(profile_bytes))
+            target = ImageCms.createProfile("sRGB")
+            _CMYK_TRANSFORMS[key] = ImageCms.buildTransform(source, target, "CMYK", "RGB")
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            _CMYK_TRANSFORMS[key] = None
+    return _CMYK_TRANSFORMS[key]
+
+
+def apply_cmyk_transform(transform, values):
+    """Run a (h, w, 4) 0..1 CMYK array through an ICC transform to RGB."""
+    height, width = values.shape[:2]
+    cmyk = Image.frombytes("CMYK", (width, height), to_uint8(values).tobytes())
+    rgb = ImageCms.applyTransform(cmyk, transform)
+    return np.asarray(rgb, dtype=np.float32) / 255.0
+
+
+def _numbers(operands):
+    if not operands or not all(t[0] == "num" for t in operands):
+        return None
+    return np.array([float(t[1]) for t in operands], dtype=np.float32)
+
+
+def _number_tokens(values):
+    return [("num", format_number(float(v), COLOR_PRECISION).encode("latin-1")) for v in values]
+
+
+def _resource(resources, category, operand):
+    """Named resource an operand refers to, or None."""
+    if resources is None or operand[0] != "name":
+        return None
+    named = resources.get_object().get(category)
+    name = operand[1].decode("latin-1")
+    if named is None or name not in named.get_object():
+        return None
+    return named.get_object()[name].get_object()
+
+
+def _shading_family(shading, resources):
+    return colorspace_family(shading.get("/ColorSpace"), resources) if shading else None
+
+
+def _inline_image_family(raw, resources):
+    match = INLINE_COLORSPACE.search(raw)
+    if match is None:
+        return None
+    if match.group(1).startswith(b"["):
+        return "indexed"
+    return colorspace_family(NameObject(match.group(1).decode("latin-1")), resources)
+
+
+def _unconverted_kind(operands, operator, target, resources):
+    """
+    SKIPPED_KINDS key of an operation that paints in a colour space target
+    converts but whose colour is left alone, or None.
+    """
+    if operator == b"sh" and operands:
+        shading = _resource(resources, "/Shading", operands[0])
+        if _shading_family(shading, resources) in CONVERTIBLE[target]:
+            return "shadings"
+    elif operator == b"BI":
+        family = _inline_image_family(operands[0][1], resources)
+        if family in CONVERTIBLE[target] or family == "indexed":
+            return "inlineImages"
+    elif operator in SET_COLOR_OPERATORS and operands and operands[-1][0] == "name":
+        pattern = _resource(resources, "/Pattern", operands[-1])
+        if pattern is None:
+            return None
+        if pattern.get("/PatternType") == 2:
+            shading = pattern.get("/Shading")
+            shading = shading.get_object() if shading is not None else None
+            if _shading_family(shading, resources) in CONVERTIBLE[target]:
+                return "shadings"
+        else:
+            # Tiling pattern cells are content streams of their own
+            return "patterns"
+    return None
+
+
+def convert_operations(
+    operations, target, resources=None, converter=convert_values, skipped=None
+):
+    """
+    Rewrite colour operators so they use the target family.
+    Returns (operations, number of operators changed). Shadings, tiling
+    patterns and inline images keep their colour; those in a family target
+    converts are counted in the `skipped` dict, when given, under
+    SKIPPED_KINDS.
+    """
+    out = []
+    changed = 0
+    # Source colour family of the current fill/stroke space, saved by q/Q
+    spaces = {"fill": "gray", "stroke": "gray"}
+    stack = []
+
+    for operands, operator in operations:
+        kind = _unconverted_kind(operands, operator, target, resources)
+        if kind and skipped is not None:
+            skipped[kind] = skipped.get(kind, 0) + 1
+
+        if operator == b"q":
+            stack.append(dict(spaces))
+        elif operator == b"Q":
+            spaces = stack.pop() if stack else {"fill": None, "stroke": None}
+
+        elif operator in DEVICE_COLOR_OPERATORS:
+            side, family = DEVICE_COLOR_OPERATORS[operator]
+            spaces[side] = family
+            values = _numbers(operands)
+            if values is not None and len(values) == COMPONENTS[family]:
+                converted = converter(values, family, target)
+                if converted is not None:
+                    operands = _number_tokens(converted.ravel())
+                    operator = TARGET_OPERATORS[target][side]
+                    changed += 1
+
+        elif operator in SET_SPACE_OPERATORS:
+            side = SET_SPACE_OPERATORS[operator]
+            family = None
+            if operands and operands[0][0] == "name":
+                name = NameObject(operands[0][1].decode("latin-1"))
+                family = colorspace_family(name, resources)
+            spaces[side] = family
+            if family in CONVERTIBLE[target]:
+                operands = [("name", TARGET_SPACES[target])]
+                changed += 1
+
+        elif operator in SET_COLOR_OPERATORS:
+            side = SET_COLOR_OPERATORS[operator]
+            family = spaces[side]
+            values = _numbers(operands)
+            if (
+                family in CONVERTIBLE[target]
+                and values is not None
+                and len(values) == COMPONENTS[family]
+            ):
+                converted = converter(values, family, target)
+                if converted is not None:
+                    operands = _number_tokens(converted.ravel())
+                    changed += 1
+
+        out.append((operands, operator))
+
+    return out, changed
+
+
+def convert_page_content(page, target, converter=convert_values, level=9, skipped=None):
+    """Rewrite the colour operators of a writer page's content stream."""
+    if page.get("/Contents") is None:
+        return 0
+    try:
+        operations = tokenize(page.get_contents().get_data())
+    except (ValueError, IndexError):
+        return 0
+    operations, changed = convert_operations(
+        operations, target, page.get("/Resources"), converter, skipped
+    )
+    if changed:
+        stream = DecodedStreamObject()
+        stream.set_data(serialize(operations))
+        page.replace_contents(stream.flate_encode(level=level))
+    return changed
+
+
+def convert_form_content(form, target, converter=convert_values, level=9, skipped=None):
+    """Rewrite the colour operators of a Form XObject in place."""
+    try:
+        operations = tokenize(form.get_data())
+    except (ValueError, IndexError):
+        return 0
+    operations, changed = convert_operations(
+        operations, target, form.get("/Resources"), converter, skipped
+    )
+    if changed:
+        rewrite_stream(form, operations, level)
+    return changed
+
+
+def _palette_bytes(lookup):
+    lookup = lookup.get_object()
+    if hasattr(lookup, "get_data"):
+        return lookup.get_data()
+    if hasattr(lookup, "original_bytes"):
+        return lookup.original_bytes
+    return bytes(lookup)
+
+
+def convert_indexed_image(image, target, converter=convert_values):
+    """Convert the palette of an /Indexed image; the samples stay untouched."""
+    colorspace = image["/ColorSpace"].get_object()
+    if len(colorspace) < 4:
+        return False
+    base = colorspace_family(colorspace[1])
+    if base not in CONVERTIBLE[target]:
+        return False
+    n = COMPONENTS[base]
+    palette = np.frombuffer(_palette_bytes(colorspace[3]), dtype=np.uint8)
+    palette = palette[: len(palette) // n * n].reshape(-1, n).astype(np.float32) / 255.0
+    converted = converter(palette, base, target)
+    if converted is None:
+        return False
+    image[NameObject("/ColorSpace")] = ArrayObject(
+        [
+            NameObject("/Indexed"),
+            NameObject(TARGET_SPACES[target].decode("latin-1")),
+            NumberObject(int(colorspace[2])),
+            ByteStringObject(to_uint8(converted).tobytes()),
+        ]
+    )
+    return True
+
+
+def convert_image(image, target, converter=convert_values):
+    """
+    Convert an image XObject to the target family in place.
+    Returns True when the image was converted.
+    """
+    family = image_family(image)
+    if family == "indexed":
+        return convert_indexed_image(image, target, converter)
+    if family not in CONVERTIBLE[target]:
+        return False
+    if isinstance(image.get("/Mask"), ArrayObject):
+        # Colour-key masks are expressed in the source colour space
+        return False
+
+    values = decode_image(image, family)
+    if values is None:
+        return False
+
+    transform = None
+    if family == "cmyk" and target == "rgb":
+        profile = icc_profile_bytes(image["/ColorSpace"])
+        transform = cmyk_transform(profile) if profile else None
+    if transform is not None:
+        converted = apply_cmyk_transform(transform, values)
+    else:
+        converted = converter(values, family, target)
+    if converted is None:
+        return False
+
+    pixels = to_uint8(converted)
+    if target == "gray":
+        pixels = pixels.reshape(pixels.shape[0], pixels.shape[1])
+    replace_image(image, pixels, target, jpeg_quality=JPEG_QUALITY)
+    return True
+
+
+def _appearance_streams(page, seen):
+    """
+    Appearance streams (/AP /N, /R and /D, every state) of a page's
+    annotations that are not in `seen` yet.
+    """
+    annotations = page.get("/Annots")
+    for annotation in annotations.get_object() if annotations is not None else ():
+        appearances = annotation.get_object().get("/AP")
+        if appearances is None:
+            continue
+        appearances = appearances.get_object()
+        for kind in ("/N", "/R", "/D"):
+            if kind not in appearances:
+                continue
+            ref = appearances.raw_get(kind)
+            entry = ref.get_object()
+            # A stream, or a dictionary of streams keyed by appearance state
+            if hasattr(entry, "get_data"):
+                refs = [ref]
+            else:
+                refs = [entry.raw_get(state) for state in entry]
+            for stream_ref in refs:
+                stream = stream_ref.get_object()
+                key = getattr(stream_ref, "idnum", None)
+                key = id(stream) if key is None else key
+                if key in seen or not hasattr(stream, "get_data"):
+                    continue
+                seen.add(key)
+                yield stream
+
+
+def _convert_xobjects(resources, target, seen, converter, stats):
+    for _, xobject, _ in iter_xobjects(resources, seen):
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Form":
+            changed = convert_form_content(xobject, target, converter, skipped=stats)
+            if changed:
+                stats["forms"] += 1
+                stats["operators"] += changed
+        elif subtype == "/Image":
+            try:
+                converted = convert_image(xobject, target, converter)
+            except (ValueError, OSError):
+                converted = False
+            if converted:
+                stats["images"] += 1
+            elif image_family(xobject) in CONVERTIBLE[target]:
+                stats["skippedImages"] += 1
+
+
+def convert_page_colors(page, target, seen, converter=convert_values):
+    """
+    Convert a writer page's content, Form XObjects, images and annotation
+    appearances to target. `seen` is shared across pages so shared
+    XObjects are converted once.
+    Returns counts of what was changed, and of what was left unconverted.
+    """
+    stats = {
+        "operators": 0,
+        "forms": 0,
+        "images": 0,
+        "annotations": 0,
+        "skippedImages": 0,
+        **{kind: 0 for kind in SKIPPED_KINDS},
+    }
+    stats["operators"] += convert_page_content(page, target, converter, skipped=stats)
+    _convert_xobjects(page.get("/Resources"), target, seen, converter, stats)
+
+    for appearance in _appearance_streams(page, seen):
+        changed = convert_form_content(appearance, target, converter, skipped=stats)
+        if changed:
+            stats["annotations"] += 1
+            stats["operators"] += changed
+        _convert_xobjects(appearance.get("/Resources"), target, seen, converter, stats)
+
+    return stats
+
+
+def unconverted_warnings(stats):
+    """Warnings for content convert_page_colors left in its source colours."""
+    warnings = [
+        f"{stats[kind]} {description} left unconverted"
+        for kind, description in SKIPPED_KINDS.items()
+        if stats.get(kind)
+    ]
+    if stats.get("skippedImages"):
+        warnings.append(f"{stats['skippedImages']} images left unconverted")
+    return warnings
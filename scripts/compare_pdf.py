@@ -27,11 +27,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Cross-platform download directory
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def extract_text_by_page(pdf_path):
@@ -51,6 +48,11 @@ def compare_pdfs(pdf1_path, pdf2_path):
     if not os.path.exists(pdf2_path):
         return {"success": False, "error": f"File not found: {pdf2_path}"}
 
+    for path in (pdf1_path, pdf2_path):
+        rejected = preflight(path)
+        if rejected:
+            return rejected
+
     try:
         # Extract text from both PDFs
         text1 = extract_text_by_page(pdf1_path)
@@ -59,8 +61,8 @@ def compare_pdfs(pdf1_path, pdf2_path):
         # Generate comparison report
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"comparison_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("compare")
+        output_path = job.staged(output_filename)
 
         doc = SimpleDocTemplate(output_path, pagesize=A4)
         styles = getSampleStyleSheet()
@@ -144,6 +146,7 @@ def compare_pdfs(pdf1_path, pdf2_path):
                 )
 
         doc.build(story)
+        output_path = job.publish(output_path)
 
         # Calculate differences
         identical_pages = sum(1 for a, b in zip(text1, text2) if a == b)
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """
 Compress a PDF file.
-Usage: python compress_pdf.py <input_file> [quality]
+Usage: python compress_pdf.py <input_file> [quality] [precision]
 Quality: low, medium, high (default: medium)
+Precision: decimals kept for content stream coordinates (default depends on quality)
 Output: JSON with result
 """
 
@@ -29,6 +30,11 @@ except ImportError:
         )
         sys.exit(1)
 
+from content_stream import CONTENT_SETTINGS, minify_page_contents
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, input_size, open_input
+from resource_guard import preflight
+
 
 # Timeout handler
 def timeout_handler(signum, frame):
@@ -41,25 +47,34 @@ if hasattr(signal, "SIGALRM") and sys.platform != "win32":
     signal.signal(signal.SIGALRM, timeout_handler)
     signal.alarm(120)  # 2 minute timeout
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
-
 
-def compress_pdf(input_path, quality="medium"):
+def compress_pdf(input_path, quality="medium", precision=None):
     """Compress PDF by removing unnecessary data."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
-        # Copy all pages
+        default_precision, level = CONTENT_SETTINGS.get(
+            quality, CONTENT_SETTINGS["medium"]
+        )
+        if precision is None:
+            precision = default_precision
+
+        # Copy all pages and minify their content streams
+        content_before = 0
+        content_after = 0
         for page in reader.pages:
-            writer.add_page(page)
+            new_page = writer.add_page(page)
+            before, after = minify_page_contents(new_page, precision, level)
+            content_before += before
+            content_after += after
 
         # Remove links for compression
         try:
@@ -67,18 +82,9 @@ def compress_pdf(input_path, quality="medium"):
         except Exception:
             pass  # Some versions may not support this
 
-        # Compress based on quality
-        if quality == "low":
-            # More aggressive compression settings
-            pass
-        elif quality == "high":
-            # Less compression, better quality
-            pass
-        # medium is default
-
-        # Ensure download directory exists
+        # Create this job's output directory
         try:
-            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+            job = OutputJob("compress")
         except OSError as e:
             return {
                 "success": False,
@@ -87,25 +93,31 @@ def compress_pdf(input_path, quality="medium"):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_compressed_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
 
         # Write compressed PDF
         try:
-            with open(output_path, "wb") as output_file:
+            with job.open(output_filename) as output_file:
                 writer.write(output_file)
+            output_path = job.output
         except Exception as e:
+            job.discard()
             return {"success": False, "error": f"Failed to write output file: {str(e)}"}
 
         # Get file sizes
-        original_size = os.path.getsize(input_path)
-        compressed_size = os.path.getsize(output_path)
+        original_size = input_size(input_path)
+        compressed_size = job.output_size
         reduction = (
             round((1 - compressed_size / original_size) * 100, 1)
             if original_size > 0
             else 0
         )
+        content_reduction = (
+            round((1 - content_after / content_before) * 100, 1)
+            if content_before > 0
+            else 0
+        )
 
         return {
             "success": True,
@@ -113,6 +125,12 @@ def compress_pdf(input_path, quality="medium"):
             "originalSize": original_size,
             "compressedSize": compressed_size,
             "reduction": f"{reduction}%",
+            "contentStreams": {
+                "originalSize": content_before,
+                "minifiedSize": content_after,
+                "reduction": f"{content_reduction}%",
+                "precision": precision,
+            },
         }
 
     except Exception as e:
@@ -126,6 +144,7 @@ if __name__ == "__main__":
 
     input_path = sys.argv[1]
     quality = sys.argv[2] if len(sys.argv) > 2 else "medium"
+    precision = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
-    result = compress_pdf(input_path, quality)
+    result = compress_pdf(input_path, quality, precision)
     print(json.dumps(result))
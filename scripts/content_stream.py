@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Content stream tokenizer and minifier shared by the PDF tools.
+Used by the compression and colour conversion tools to rewrite page
+contents at the operator level before re-compressing them.
+"""
+
+import math
+import re
+import zlib
+
+try:
+    from pypdf.generic import DecodedStreamObject, NameObject, StreamObject
+except ImportError:
+    from PyPDF2.generic import DecodedStreamObject, NameObject, StreamObject
+
+WHITESPACE = b" \t\n\r\x0c\x00"
+DELIMITERS = b"()<>[]{}/%"
+
+NUMBER_RE = re.compile(rb"^[+-]?(\d+\.?\d*|\.\d+)$")
+
+NAME_RE = re.compile(rb"/([^\s/\[\]()<>{}%]*)")
+NAME_ESCAPE_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+# Operators that only change the graphics state, keyed by the state slot they set
+STATE_OPERATORS = {
+    b"w": b"w",
+    b"J": b"J",
+    b"j": b"j",
+    b"M": b"M",
+    b"d": b"d",
+    b"ri": b"ri",
+    b"i": b"i",
+    b"Tc": b"Tc",
+    b"Tw": b"Tw",
+    b"Tz": b"Tz",
+    b"TL": b"TL",
+    b"Tf": b"Tf",
+    b"Tr": b"Tr",
+    b"Ts": b"Ts",
+    b"g": b"fill",
+    b"rg": b"fill",
+    b"k": b"fill",
+    b"cs": b"fill",
+    b"sc": b"fill",
+    b"scn": b"fill",
+    b"G": b"stroke",
+    b"RG": b"stroke",
+    b"K": b"stroke",
+    b"CS": b"stroke",
+    b"SC": b"stroke",
+    b"SCN": b"stroke",
+}
+
+# Operators that may appear inside a q/Q block without making it visible
+PURE_STATE_OPERATORS = set(STATE_OPERATORS) | {b"cm", b"gs"}
+
+TEXT_SHOW_OPERATORS = {b"Tj", b"TJ"}
+MATRIX_OPERATORS = {b"cm", b"Tm"}
+
+IDENTITY_MATRIX = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+
+# Minifier settings per compression quality: (coordinate precision, zlib level)
+CONTENT_SETTINGS = {
+    "low": (2, 9),
+    "medium": (3, 9),
+    "high": (4, 6),
+}
+
+
+def _is_regular(byte):
+    return byte not in WHITESPACE and byte not in DELIMITERS
+
+
+def _skip_whitespace(data, i):
+    """Skip whitespace and comments starting at index i."""
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c in WHITESPACE:
+            i += 1
+        elif c == 0x25:  # %
+            while i < n and data[i] not in b"\r\n":
+                i += 1
+        else:
+            break
+    return i
+
+
+def _read_literal(data, i):
+    """Return the end index of the literal string starting at data[i] == '('."""
+    depth = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c == 0x5C:  # backslash escapes the next byte
+            i += 2
+            continue
+        if c == 0x28:
+            depth += 1
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise ValueError("Unterminated literal string")
+
+
+def _read_dict(data, i):
+    """Return the end index of the dictionary starting at data[i:i+2] == '<<'."""
+    depth = 0
+    n = len(data)
+    while i < n:
+        if data[i] == 0x28:
+            i = _read_literal(data, i)
+            continue
+        pair = data[i : i + 2]
+        if pair == b"<<":
+            depth += 1
+            i += 2
+            if depth == 0:
+                return i
+            continue
+        if pair == b">>":
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+            continue
+        i += 1
+    raise ValueError("Unterminated dictionary")
+
+
+def _read_token(data, i):
+    """Read one operand or operator token. Returns (token, next_index)."""
+    c = data[i]
+    if c == 0x28:  # (
+        end = _read_literal(data, i)
+        return ("str", data[i:end]), end
+    if c == 0x3C:  # <
+        if data[i : i + 2] == b"<<":
+            end = _read_dict(data, i)
+            return ("raw", data[i:end]), end
+        end = data.find(b">", i)
+        if end < 0:
+            raise ValueError("Unterminated hex string")
+        hex_digits = bytes(b for b in data[i + 1 : end] if b not in WHITESPACE)
+        return ("hex", b"<" + hex_digits + b">"), end + 1
+    if c == 0x5B:  # [
+        items = []
+        i = _skip_whitespace(data, i + 1)
+        while i < len(data) and data[i] != 0x5D:
+            token, i = _read_token(data, i)
+            if token[0] == "op":
+                # Keywords such as true/false/null inside arrays
+                token = ("raw", token[1])
+            items.append(token)
+            i = _skip_whitespace(data, i)
+        if i >= len(data):
+            raise ValueError("Unterminated array")
+        return ("array", items), i + 1
+    if c == 0x2F:  # /
+        end = i + 1
+        while end < len(data) and _is_regular(data[end]):
+            end += 1
+        return ("name", data[i:end]), end
+    if c in b")>]{}":
+        raise ValueError(f"Unexpected delimiter {chr(c)!r}")
+    end = i
+    while end < len(data) and _is_regular(data[end]):
+        end += 1
+    word = data[i:end]
+    if NUMBER_RE.match(word):
+        return ("num", word), end
+    if word in (b"true", b"false", b"null"):
+        return ("raw", word), end
+    return ("op", word), end
+
+
+def _read_inline_image(data, i):
+    """Return the end index of inline image data starting after the ID operator."""
+    # A single whitespace byte separates ID from the image data
+    i += 1
+    n = len(data)
+    while True:
+        end = data.find(b"EI", i)
+        if end < 0:
+            raise ValueError("Unterminated inline image")
+        before = data[end - 1] if end > 0 else 0x20
+        after = data[end + 2] if end + 2 < n else 0x20
+        if before in WHITESPACE and (after in WHITESPACE or after in DELIMITERS):
+            return end + 2
+        i = end + 2
+
+
+def tokenize(data):
+    """
+    Split a decoded content stream into operations.
+    Returns a list of (operands, operator) tuples. Inline images are kept
+    verbatim as a single operation with operator b"BI".
+    """
+    operations = []
+    operands = []
+    i = _skip_whitespace(data, 0)
+    n = len(data)
+
+    while i < n:
+        start = i
+        token, i = _read_token(data, i)
+        if token[0] != "op":
+            operands.append(token)
+        elif token[1] == b"BI":
+            id_pos = data.find(b"ID", i)
+            while id_pos >= 0 and (
+                data[id_pos - 1] not in WHITESPACE
+                or (id_pos + 2 < n and data[id_pos + 2] not in WHITESPACE)
+            ):
+                id_pos = data.find(b"ID", id_pos + 2)
+            if id_pos < 0:
+                raise ValueError("Inline image without ID")
+            i = _read_inline_image(data, id_pos + 2)
+            operations.append(([("raw", data[start:i])], b"BI"))
+            operands = []
+        else:
+            operations.append((operands, token[1]))
+            operands = []
+        i = _skip_whitespace(data, i)
+
+    if operands:
+        raise ValueError("Trailing operands without operator")
+
+    return operations
+
+
+def resource_names(data):
+    """
+    Every name that appears in a decoded content stream, as "/Name" strings.
+    A fast superset of the resources the stream can use: names inside
+    strings or inline image data are included too, which only keeps extra.
+    """
+    names = set()
+    for raw in set(NAME_RE.findall(data)):
+        raw = NAME_ESCAPE_RE.sub(lambda m: bytes([int(m.group(1), 16)]), raw)
+        names.add("/" + raw.decode("latin-1"))
+    return names
+
+
+def format_number(value, precision):
+    """Format a number with at most `precision` decimals and no redundant digits."""
+    if precision <= 0:
+        text = str(int(round(value)))
+    else:
+        text = f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    if text in ("-0", "", "-"):
+        return "0"
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = "-" + text[2:]
+    return text
+
+
+def _format_significant(value, digits):
+    """Format a matrix scale/skew factor keeping `digits` significant digits."""
+    if value == 0:
+        return "0"
+    decimals = max(0, digits - 1 - int(math.floor(math.log10(abs(value)))))
+    return format_number(value, decimals)
+
+
+def _round_token(token, precision):
+    if token[0] == "num" and b"." in token[1]:
+        return ("num", format_number(float(token[1]), precision).encode("latin-1"))
+    if token[0] == "array":
+        return ("array", [_round_token(t, precision) for t in token[1]])
+    return token
+
+
+def _round_operands(operands, operator, precision):
+    if operator in MATRIX_OPERATORS and len(operands) == 6:
+        if not all(t[0] == "num" for t in operands):
+            return operands
+        values = [float(t[1]) for t in operands]
+        parts = [_format_significant(v, 6) for v in values[:4]]
+        parts += [format_number(v, precision) for v in values[4:]]
+        return [("num", p.encode("latin-1")) for p in parts]
+    return [_round_token(t, precision) for t in operands]
+
+
+def _serialize_token(token):
+    if token[0] == "array":
+        return b"[" + _join([_serialize_token(t) for t in token[1]]) + b"]"
+    return token[1]
+
+
+def _join(parts):
+    """Join serialized tokens, inserting a space only where one is required."""
+    out = bytearray()
+    for part in parts:
+        if not part:
+            continue
+        if out and _is_regular(out[-1]) and _is_regular(part[0]):
+            out += b" "
+        out += part
+    return bytes(out)
+
+
+def serialize(operations, separator=b"\n"):
+    """Serialize operations back into content stream bytes."""
+    out = bytearray()
+    for operands, operator in operations:
+        if operator == b"BI":
+            chunk = operands[0][1]
+        else:
+            chunk = _join([_serialize_token(t) for t in operands] + [operator])
+        if out:
+            out += separator
+        out += chunk
+    return bytes(out)
+
+
+def _state_key(operands):
+    return _join([_serialize_token(t) for t in operands])
+
+
+def _is_identity(operands):
+    if len(operands) != 6 or not all(t[0] == "num" for t in operands):
+        return False
+    return [float(t[1]) for t in operands] == IDENTITY_MATRIX
+
+
+def _text_items(operands, operator):
+    if operator == b"TJ":
+        return list(operands[0][1]) if operands and operands[0][0] == "array" else None
+    return list(operands[:1])
+
+
+def minify_operations(operations, precision=3):
+    """
+    Drop no-op state changes, empty q/Q blocks and identity matrices,
+    round numbers and merge adjacent text-showing operators.
+    """
+    out = []
+    # Known graphics state per q/Q level; None means "unknown"
+    state = {}
+    state_stack = []
+    # Output index of each open q
+    save_stack = []
+
+    for operands, operator in operations:
+        if operator != b"BI":
+            operands = _round_operands(operands, operator, precision)
+
+        if operator == b"q":
+            state_stack.append(dict(state))
+            save_stack.append(len(out))
+            out.append((operands, operator))
+            continue
+
+        if operator == b"Q":
+            state = state_stack.pop() if state_stack else {}
+            if save_stack:
+                start = save_stack.pop()
+                if all(op in PURE_STATE_OPERATORS for _, op in out[start + 1 :]):
+                    # Nothing visible happened inside the block
+                    del out[start:]
+                    continue
+            out.append((operands, operator))
+            continue
+
+        if operator in STATE_OPERATORS:
+            slot = STATE_OPERATORS[operator]
+            key = (operator, _state_key(operands))
+            if state.get(slot) == key:
+                continue
+            state[slot] = key
+            out.append((operands, operator))
+            continue
+
+        if operator == b'"' and len(operands) == 3:
+            # aw ac string " sets word and character spacing as it shows
+            state[b"Tw"] = (b"Tw", _state_key(operands[:1]))
+            state[b"Tc"] = (b"Tc", _state_key(operands[1:2]))
+            out.append((operands, operator))
+            continue
+
+        if operator == b"TD":
+            # tx ty TD also sets the leading to -ty
+            if len(operands) == 2 and operands[1][0] == "num":
+                leading = format_number(-float(operands[1][1]), precision)
+                state[b"TL"] = (b"TL", _state_key([("num", leading.encode("latin-1"))]))
+            else:
+                state.pop(b"TL", None)
+            out.append((operands, operator))
+            continue
+
+        if operator == b"gs":
+            # An ExtGState can set any parameter, so forget what we know
+            state = {}
+            out.append((operands, operator))
+            continue
+
+        if operator == b"cm" and _is_identity(operands):
+            continue
+
+        if operator == b"ET" and out and out[-1][1] == b"BT":
+            # Empty text object
+            out.pop()
+            continue
+
+        if operator in TEXT_SHOW_OPERATORS and out and out[-1][1] in TEXT_SHOW_OPERATORS:
+            previous = _text_items(*out[-1])
+            current = _text_items(operands, operator)
+            if previous is not None and current is not None:
+                out[-1] = ([("array", previous + current)], b"TJ")
+                continue
+
+        out.append((operands, operator))
+
+    return out
+
+
+def minify_content(data, precision=3):
+    """Return the minified form of a decoded content stream."""
+    operations = tokenize(data)
+    return serialize(minify_operations(operations, precision))
+
+
+def _encoded_length(contents):
+    """Best-effort encoded size of a page's /Contents entry."""
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, list) else [contents]
+    total = 0
+    for stream in streams:
+        stream = stream.get_object()
+        length = stream.get("/Length")
+        if length is not None:
+            total += int(length.get_object())
+        else:
+            total += len(stream.get_data())
+    return total
+
+
+def minify_page_contents(page, precision=3, level=9):
+    """
+    Minify and re-Flate a page's content stream in place.
+    The page must already belong to a PdfWriter.
+    Returns (original_bytes, new_bytes); both are equal when the page was left untouched.
+    """
+    contents = page.get("/Contents")
+    if contents is None:
+        return 0, 0
+
+    original_size = _encoded_length(contents)
+
+    try:
+        data = page.get_contents().get_data()
+        minified = minify_content(data, precision)
+    except (ValueError, IndexError):
+        # Malformed content is left exactly as it was
+        return original_size, original_size
+
+    stream = DecodedStreamObject()
+    stream.set_data(minified)
+    encoded = stream.flate_encode(level=level)
+    new_size = len(encoded._data)
+
+    if new_size >= original_size:
+        return original_size, original_size
+
+    page.replace_contents(encoded)
+    return original_size, new_size
+
+
+def replace_stream_data(stream, data, filter_name=None):
+    """
+    Store already-encoded data in an existing stream object in place.
+    filter_name describes the new encoding (None for unfiltered data);
+    any previous /Filter and /DecodeParms are dropped.
+    """
+    StreamObject.set_data(stream, data)
+    if getattr(stream, "decoded_self", None) is not None:
+        stream.decoded_self = None
+    for key in ("/Filter", "/DecodeParms"):
+        if key in stream:
+            del stream[key]
+    if filter_name:
+        stream[NameObject("/Filter")] = NameObject(filter_name)
+
+
+def rewrite_stream(stream, operations, level=9):
+    """Serialize operations into a (form) stream object, Flate-encoded at level."""
+    replace_stream_data(stream, zlib.compress(serialize(operations), level), "/FlateDecode")
@@ -11,7 +11,6 @@ Output: JSON with result
 """
 
 import sys
-import os
 import json
 from datetime import datetime
 from typing import Union, List, Tuple
@@ -24,11 +23,8 @@ except ImportError:
 
     RectangleObject = None
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, open_input
 
 
 def parse_margins(args: list) -> Tuple[float, float, float, float]:
@@ -48,11 +44,11 @@ def parse_margins(args: list) -> Tuple[float, float, float, float]:
 
 def crop_pdf(input_path, left=0, bottom=0, right=0, top=0):
     """Crop PDF pages with specified margins."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         for page in reader.pages:
@@ -99,14 +95,12 @@ def crop_pdf(input_path, left=0, bottom=0, right=0, top=0):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"cropped_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("crop")
 
         # Write output
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {
             "success": True,
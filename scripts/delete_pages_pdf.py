@@ -2,12 +2,11 @@
 """
 Add/delete pages from PDF.
 Usage: python delete_pages_pdf.py <input_pdf> <pages_to_delete>
-       pages_to_delete: comma-separated page numbers (e.g., "1,3,5-7")
+       pages_to_delete: page selection (e.g., "1,3,5-7", "even", "last-2-last")
 Output: JSON with result
 """
 
 import sys
-import os
 import json
 from datetime import datetime
 
@@ -16,70 +15,51 @@ try:
 except ImportError:
     from PyPDF2 import PdfWriter, PdfReader
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from page_selection import parse_pages
 
-
-def parse_page_ranges(range_str, total_pages):
-    """Parse page range string into set of page numbers (1-indexed)."""
-    pages_to_delete = set()
-
-    for part in range_str.split(","):
-        part = part.strip()
-        if "-" in part:
-            start, end = part.split("-")
-            start = int(start.strip())
-            end = int(end.strip())
-            pages_to_delete.update(range(start, min(end + 1, total_pages + 1)))
-        else:
-            page = int(part)
-            if 1 <= page <= total_pages:
-                pages_to_delete.add(page)
-
-    return pages_to_delete
+from output_manager import OutputJob
+from pipe_io import input_exists, open_input
 
 
 def delete_pages(input_path, pages_to_delete_str):
     """Delete specified pages from PDF."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         total_pages = len(reader.pages)
 
         # Parse page ranges
-        pages_to_delete = parse_page_ranges(pages_to_delete_str, total_pages)
+        try:
+            pages_to_delete = parse_pages(pages_to_delete_str, total_pages)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
 
         if not pages_to_delete:
             return {"success": False, "error": "No valid pages specified for deletion"}
 
-        if len(pages_to_delete) >= total_pages:
+        pages_to_keep = pages_to_delete.complement()
+        if not pages_to_keep:
             return {"success": False, "error": "Cannot delete all pages"}
 
         # Create new PDF without deleted pages
         writer = PdfWriter()
 
-        for i in range(total_pages):
-            if (i + 1) not in pages_to_delete:
-                writer.add_page(reader.pages[i])
+        for i in pages_to_keep.indices():
+            writer.add_page(reader.pages[i])
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"pages_deleted_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("delete_pages")
 
         # Write output
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
-        deleted_count = len(pages_to_delete)
+        deleted_count = total_pages - len(pages_to_keep)
         return {
             "success": True,
             "output": output_path,
@@ -16,11 +16,7 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def convert_to_epub(input_path):
@@ -46,16 +42,15 @@ def convert_to_epub(input_path):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(input_path))[0]
         output_filename = f"{base_name}_epub_content_{timestamp}.txt"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("epub")
+        output_path = job.staged(output_filename)
 
         # Write content
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(f"Title: {base_name}\n")
             f.write(f"Author: Unknown\n\n")
             f.write(full_content)
+        output_path = job.publish(output_path)
 
         return {
             "success": True,
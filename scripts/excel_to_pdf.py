@@ -20,11 +20,7 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def excel_to_pdf(input_path):
@@ -39,10 +35,8 @@ def excel_to_pdf(input_path):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"excel_to_pdf_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("excel_to_pdf")
+        output_path = job.staged(output_filename)
 
         # Create PDF document
         doc = SimpleDocTemplate(output_path, pagesize=landscape(A4))
@@ -91,6 +85,7 @@ def excel_to_pdf(input_path):
             story.append(Spacer(1, 30))
 
         doc.build(story)
+        output_path = job.publish(output_path)
 
         return {"success": True, "output": output_path}
 
@@ -8,20 +8,16 @@ Output: JSON with result
 import sys
 import os
 import json
-import zipfile
 from datetime import datetime
 
 try:
     from pypdf import PdfReader
+    from zip_packager import write_zip
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def extract_attachments(input_path):
@@ -32,26 +28,29 @@ def extract_attachments(input_path):
     try:
         reader = PdfReader(input_path)
         attachments = []
+        members = []
 
-        # Try to extract embedded files
-        # Note: pypdf has limited attachment support
-        # Full implementation requires PyMuPDF
+        # Embedded files from the /EmbeddedFiles name tree; a name can map
+        # to several files, which the packager gives unique member names
+        for name, contents in reader.attachments.items():
+            for data in contents:
+                members.append((name, data))
+                attachments.append({"name": name, "size": len(data)})
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(input_path))[0]
         output_filename = f"{base_name}_attachments_{timestamp}.zip"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
+        job = OutputJob("extract_attachments")
+        output_path = job.staged(output_filename)
 
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-        # Create ZIP (empty if no attachments)
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            # Add a placeholder if no attachments found
-            if not attachments:
-                placeholder = f"No attachments found in {os.path.basename(input_path)}"
-                zipf.writestr("readme.txt", placeholder)
+        # Create ZIP, streamed from memory
+        # Add a placeholder if no attachments found
+        if not attachments:
+            placeholder = f"No attachments found in {os.path.basename(input_path)}"
+            members.append(("readme.txt", placeholder.encode("utf-8")))
+        write_zip(output_path, members)
+        output_path = job.publish(output_path)
 
         return {
             "success": True,
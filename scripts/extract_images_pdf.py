@@ -15,19 +15,17 @@ try:
     import pdfplumber
     from PIL import Image
     import io
+    from zip_packager import write_zip
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def extract_images_from_pdf(pdf_path):
-    """Extract all images from PDF."""
+    """Extract all images from PDF as (filename, PNG bytes) pairs."""
     extracted_images = []
 
     with pdfplumber.open(pdf_path) as pdf:
@@ -42,19 +40,19 @@ def extract_images_from_pdf(pdf_path):
                             img_data = xobj["imagedata"]
                             img_format = img.get("colorspace", "RGB")
 
-                            # Save image
+                            # Encode image in memory
                             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                             img_filename = (
                                 f"page{page_num}_img{img_idx + 1}_{timestamp}.png"
                             )
-                            img_path = os.path.join(DOWNLOAD_DIR, img_filename)
 
                             # Create placeholder image if actual extraction fails
                             # In production, you'd use PyMuPDF (fitz) for proper extraction
                             pil_img = Image.new("RGB", (100, 100), color="gray")
-                            pil_img.save(img_path, "PNG")
+                            buffer = io.BytesIO()
+                            pil_img.save(buffer, "PNG")
 
-                            extracted_images.append(img_path)
+                            extracted_images.append((img_filename, buffer.getvalue()))
                 except Exception as e:
                     print(
                         f"Warning: Could not extract image {img_idx} from page {page_num}: {e}",
@@ -65,20 +63,16 @@ def extract_images_from_pdf(pdf_path):
     return extracted_images
 
 
-def create_images_zip(image_paths):
-    """Create a ZIP file containing all extracted images."""
-    import zipfile
-
+def create_images_zip(images):
+    """Stream (filename, data) images into a ZIP file."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     zip_filename = f"extracted_images_{timestamp}.zip"
-    zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
+    job = OutputJob("extract_images")
+    zip_path = job.staged(zip_filename)
 
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for img_path in image_paths:
-            if os.path.exists(img_path):
-                zipf.write(img_path, os.path.basename(img_path))
+    write_zip(zip_path, images)
 
-    return zip_path
+    return job.publish(zip_path)
 
 
 def extract_images_from_pdf_main(input_path):
@@ -86,10 +80,11 @@ def extract_images_from_pdf_main(input_path):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
-    try:
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
 
+    try:
         # Extract images
         images = extract_images_from_pdf(input_path)
 
@@ -99,13 +94,6 @@ def extract_images_from_pdf_main(input_path):
         # Create ZIP file
         zip_path = create_images_zip(images)
 
-        # Clean up individual image files
-        for img_path in images:
-            try:
-                os.remove(img_path)
-            except:
-                pass
-
         return {"success": True, "output": zip_path, "count": len(images)}
 
     except Exception as e:
@@ -16,11 +16,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def extract_links(input_path):
@@ -28,6 +25,10 @@ def extract_links(input_path):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
         links = []
 
@@ -49,15 +50,14 @@ def extract_links(input_path):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(input_path))[0]
         output_filename = f"{base_name}_links_{timestamp}.txt"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("extract_links")
+        output_path = job.staged(output_filename)
 
         # Write links to file
         with open(output_path, "w", encoding="utf-8") as f:
             for link in links:
                 f.write(f"Page {link['page']}: {link['url']}\n")
+        output_path = job.publish(output_path)
 
         # Also create JSON output
         json_path = output_path.replace(".txt", ".json")
@@ -2,7 +2,7 @@
 """
 Extract specific pages from PDF.
 Usage: python extract_pages_pdf.py <input_pdf> <pages_json>
-pages_json format: "1,3,5-7" or "[1,3,5,6,7]"
+pages_json format: "1,3,5-7", "[1,3,5,6,7]" or any page selection ("odd", "10-")
 Output: JSON with result
 """
 
@@ -17,61 +17,44 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from page_selection import parse_pages
 
-
-def parse_page_string(page_str):
-    """Parse page string like '1,3,5-7' into list of page numbers."""
-    pages = []
-    parts = page_str.replace("[", "").replace("]", "").split(",")
-    for part in parts:
-        part = part.strip()
-        if "-" in part:
-            start, end = part.split("-")
-            pages.extend(range(int(start.strip()), int(end.strip()) + 1))
-        elif part.isdigit():
-            pages.append(int(part))
-    return sorted(set(pages))
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
 def extract_pages(input_path, page_string):
     """Extract specific pages from PDF."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         total_pages = len(reader.pages)
-        pages_to_extract = parse_page_string(page_string)
-
-        # Validate page numbers
-        valid_pages = [p for p in pages_to_extract if 1 <= p <= total_pages]
+        try:
+            valid_pages = parse_pages(page_string, total_pages)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
 
         if not valid_pages:
             return {"success": False, "error": "No valid pages specified"}
 
         # Add pages to writer
-        for page_num in valid_pages:
-            writer.add_page(reader.pages[page_num - 1])  # 0-indexed
+        for index in valid_pages.indices():
+            writer.add_page(reader.pages[index])
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_extracted_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("extract_pages")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Font consolidation shared by the PDF tools.
+Detects equivalent embedded fonts across the pages of a PdfWriter and
+points every page at a single copy, so merged documents do not carry the
+same font program once per source file.
+"""
+
+import hashlib
+import re
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        StreamObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        StreamObject,
+    )
+
+# Subset fonts are named like /ABCDEF+Helvetica; the tag is random per producer run
+SUBSET_TAG_RE = re.compile(r"^/[A-Z]{6}\+")
+
+FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+
+
+def base_font_name(font):
+    """Return the font's /BaseFont without its subset tag."""
+    name = str(font.get("/BaseFont", ""))
+    return SUBSET_TAG_RE.sub("/", name)
+
+
+def _update_digest(obj, digest, seen):
+    """Feed a canonical serialization of obj into digest, following references."""
+    if isinstance(obj, IndirectObject):
+        key = (id(obj.pdf), obj.idnum)
+        if key in seen:
+            digest.update(b"R")
+            return
+        seen.add(key)
+        obj = obj.get_object()
+
+    if isinstance(obj, StreamObject):
+        digest.update(b"S")
+        _update_digest_dict(obj, digest, seen, skip=("/Length", "/Filter", "/DecodeParms"))
+        digest.update(hashlib.sha256(obj.get_data()).digest())
+    elif isinstance(obj, DictionaryObject):
+        _update_digest_dict(obj, digest, seen)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _update_digest(item, digest, seen)
+        digest.update(b"]")
+    elif isinstance(obj, NameObject):
+        digest.update(SUBSET_TAG_RE.sub("/", str(obj)).encode("utf-8"))
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+    digest.update(b" ")
+
+
+def _update_digest_dict(obj, digest, seen, skip=()):
+    digest.update(b"<<")
+    for key in sorted(obj.keys()):
+        if key in skip:
+            continue
+        digest.update(key.encode("utf-8"))
+        _update_digest(obj.raw_get(key), digest, seen)
+    digest.update(b">>")
+
+
+def font_fingerprint(font_ref):
+    """
+    Fingerprint a font by base-font name and the hash of its whole definition,
+    including the embedded font program, widths, encoding and descriptor.
+    Subset tags are ignored, so identical subsets from different files match.
+    """
+    font = font_ref.get_object()
+    digest = hashlib.sha256()
+    _update_digest(font_ref, digest, set())
+    return base_font_name(font), digest.hexdigest()
+
+
+def is_embedded(font):
+    """True when the font (or its descendant) carries an embedded program."""
+    font = font.get_object()
+    descendants = font.get("/DescendantFonts")
+    if descendants is not None:
+        return any(is_embedded(d) for d in descendants.get_object())
+    descriptor = font.get("/FontDescriptor")
+    if descriptor is None:
+        return False
+    descriptor = descriptor.get_object()
+    return any(key in descriptor for key in FONT_FILE_KEYS)
+
+
+def _iter_resource_dicts(resources, seen):
+    """Yield a resources dictionary and those of the Form XObjects it uses."""
+    if resources is None:
+        return
+    resources = resources.get_object()
+    if id(resources) in seen:
+        return
+    seen.add(id(resources))
+    yield resources
+
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    for ref in xobjects.get_object().values():
+        xobject = ref.get_object()
+        if xobject.get("/Subtype") == "/Form":
+            yield from _iter_resource_dicts(xobject.get("/Resources"), seen)
+
+
+def iter_font_refs(pages):
+    """
+    Yield (fonts dictionary, resource name, reference) for every indirect font
+    used by the pages, including fonts of the Form XObjects they draw.
+    """
+    seen_resources = set()
+    for page in pages:
+        for resources in _iter_resource_dicts(page.get("/Resources"), seen_resources):
+            fonts = resources.get("/Font")
+            if fonts is None:
+                continue
+            fonts = fonts.get_object()
+            for name in list(fonts.keys()):
+                ref = fonts.raw_get(name)
+                if isinstance(ref, IndirectObject):
+                    yield fonts, name, ref
+
+
+def deduplicate_fonts(writer):
+    """
+    Point every font resource in writer at one canonical copy per fingerprint.
+    Returns a dict with the number of font references examined and replaced.
+    Unreferenced duplicates are dropped when the writer supports it.
+    """
+    canonical = {}
+    fingerprints = {}
+    examined = 0
+    replaced = 0
+
+    for fonts, name, ref in iter_font_refs(writer.pages):
+        examined += 1
+        if not is_embedded(ref):
+            continue
+
+        ref_key = ref.idnum
+        if ref_key not in fingerprints:
+            fingerprints[ref_key] = font_fingerprint(ref)
+        fingerprint = fingerprints[ref_key]
+
+        keep = canonical.setdefault(fingerprint, ref)
+        if keep.idnum != ref.idnum:
+            fonts[NameObject(name)] = keep
+            replaced += 1
+
+    if replaced and hasattr(writer, "compress_identical_objects"):
+        writer.compress_identical_objects()
+
+    return {
+        "fontsExamined": examined,
+        "uniqueFonts": len(canonical),
+        "fontsDeduplicated": replaced,
+    }
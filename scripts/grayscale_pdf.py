@@ -8,34 +8,45 @@ Output: JSON with result
 import sys
 import os
 import json
+from collections import Counter
 from datetime import datetime
 
 try:
     from pypdf import PdfReader, PdfWriter
+    from color_convert import convert_page_colors, unconverted_warnings
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, input_size, open_input
+from resource_guard import preflight
 
 
 def convert_to_grayscale(input_path):
     """Convert PDF to grayscale."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
+        # Rewrite colour operators and convert images page by page;
+        # XObjects shared between pages are converted only once
+        stats = Counter()
+        seen = set()
         for page in reader.pages:
-            writer.add_page(page)
-            # Note: Full grayscale conversion requires PyMuPDF
-            # pypdf has limited colorspace manipulation
+            new_page = writer.add_page(page)
+            page_stats = convert_page_colors(new_page, "gray", seen)
+            for key, value in page_stats.items():
+                stats[key] += value
+
+        warnings = unconverted_warnings(stats)
 
         # Copy metadata
         if reader.metadata:
@@ -43,21 +54,31 @@ def convert_to_grayscale(input_path):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_grayscale_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("grayscale")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
             "output": output_path,
-            "converted": True,
+            "converted": stats["operators"] > 0 or stats["images"] > 0,
+            "colorOperatorsConverted": stats["operators"],
+            "formsConverted": stats["forms"],
+            "imagesConverted": stats["images"],
+            "imagesSkipped": stats["skippedImages"],
+            "annotationsConverted": stats["annotations"],
+            "shadingsSkipped": stats["shadings"],
+            "patternsSkipped": stats["patterns"],
+            "inlineImagesSkipped": stats["inlineImages"],
+            "complete": not warnings,
+            "warnings": warnings,
+            "originalSize": input_size(input_path),
+            "newSize": job.output_size,
         }
 
     except Exception as e:
@@ -22,11 +22,7 @@ except ImportError:
         print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
         sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def html_to_pdf(input_path):
@@ -38,10 +34,8 @@ def html_to_pdf(input_path):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"html_to_pdf_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("html_to_pdf")
+        output_path = job.staged(output_filename)
 
         # Try using WeasyPrint for better HTML rendering
         try:
@@ -96,6 +90,7 @@ def html_to_pdf(input_path):
 
             doc.build(story)
 
+        output_path = job.publish(output_path)
         return {"success": True, "output": output_path}
 
     except Exception as e:
@@ -19,11 +19,7 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def convert_images_to_pdf(input_paths):
@@ -35,10 +31,8 @@ def convert_images_to_pdf(input_paths):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"images_to_pdf_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("image_to_pdf")
+        output_path = job.staged(output_filename)
 
         # Create PDF
         doc = SimpleDocTemplate(output_path, pagesize=A4)
@@ -82,6 +76,7 @@ def convert_images_to_pdf(input_paths):
             return {"success": False, "error": "No valid images to convert"}
 
         doc.build(story)
+        output_path = job.publish(output_path)
 
         return {"success": True, "output": output_path}
 
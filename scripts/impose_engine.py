@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Imposition engine used by impose_pdf.py.
+Every source page is wrapped once in a Form XObject that carries the
+page's own content stream bytes, copied without decoding, and its
+resources, which are shared between pages as in the source. Sheets only
+hold "q a b c d e f cm /Name Do Q" placements of those forms, so nothing
+is rasterised or drawn twice and the output stays about the size of the
+input.
+
+Layouts are N-up grids in reading order, and booklets: sheets printed on
+both sides, folded and saddle-stitched, optionally gathered in
+signatures of a few sheets each, with creep compensation for the
+inner sheets of each signature.
+"""
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+        StreamObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+        StreamObject,
+    )
+
+from content_stream import format_number, replace_stream_data
+
+# Page layouts for different N-up values: (rows, columns)
+LAYOUTS = {
+    2: (1, 2),
+    4: (2, 2),
+    6: (2, 3),
+    9: (3, 3),
+    16: (4, 4),
+}
+
+# Sheet sizes in points, portrait; "auto" sizes sheets from the pages
+SHEET_SIZES = {
+    "letter": (612, 792),
+    "legal": (612, 1008),
+    "tabloid": (792, 1224),
+    "a5": (419.53, 595.28),
+    "a4": (595.28, 841.89),
+    "a3": (841.89, 1190.55),
+}
+
+# Sheet edge to the nearest cell, and space between cells, for N-up
+MARGIN = 18
+SPACING = 14.4
+
+# Decimal places kept in placement matrices
+PLACEMENT_PRECISION = 4
+
+# Name prefix of the page forms in each sheet's /XObject resources
+FORM_PREFIX = "/Pg"
+
+# Transformations that turn a page clockwise by its /Rotate, for a crop box
+# w wide and h high at the origin: (a, b, c, d, e, f) in terms of w and h
+_ROTATIONS = {
+    0: lambda w, h: (1, 0, 0, 1, 0, 0),
+    90: lambda w, h: (0, -1, 1, 0, 0, w),
+    180: lambda w, h: (-1, 0, 0, -1, w, h),
+    270: lambda w, h: (0, 1, -1, 0, h, 0),
+}
+
+
+def _copy_contents(form, contents):
+    """Put a page's /Contents into form, keeping the encoded bytes if possible."""
+    contents = contents.get_object() if contents is not None else None
+    if isinstance(contents, StreamObject):
+        replace_stream_data(form, contents._data)
+        for key in ("/Filter", "/DecodeParms"):
+            if key in contents:
+                form[NameObject(key)] = contents[key]
+        return form
+    # Several streams only make sense joined, so they are decoded once
+    data = b"\n".join(part.get_object().get_data() for part in contents or ())
+    decoded = DecodedStreamObject()
+    decoded.set_data(data)
+    encoded = decoded.flate_encode() if data else decoded
+    replace_stream_data(form, encoded._data, "/FlateDecode" if data else None)
+    return form
+
+
+class PageForms:
+    """
+    Source pages of reader wrapped as forms in writer, built on first use.
+    A form shows its page's crop box upright, i.e. with the page's /Rotate
+    applied, with the lower-left corner at the origin.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.forms = {}
+
+    def get(self, index):
+        """(reference, width, height) of the form for page index."""
+        form = self.forms.get(index)
+        if form is None:
+            form = self.forms[index] = self._wrap(self.reader.pages[index])
+        return form
+
+    def _wrap(self, page):
+        box = page.cropbox
+        x0, y0 = float(box.left), float(box.bottom)
+        w, h = float(box.width), float(box.height)
+        rotation = (page.get("/Rotate", 0) or 0) % 360
+        a, b, c, d, e, f = _ROTATIONS.get(rotation, _ROTATIONS[0])(w, h)
+
+        contents = page.raw_get("/Contents") if "/Contents" in page else None
+        form = _copy_contents(StreamObject(), contents)
+        form[NameObject("/Type")] = NameObject("/XObject")
+        form[NameObject("/Subtype")] = NameObject("/Form")
+        form[NameObject("/BBox")] = ArrayObject(
+            [FloatObject(x0), FloatObject(y0), FloatObject(x0 + w), FloatObject(y0 + h)]
+        )
+        # Crop box corner to the origin, then the page's rotation
+        form[NameObject("/Matrix")] = ArrayObject(
+            FloatObject(v)
+            for v in (a, b, c, d, e - a * x0 - c * y0, f - b * x0 - d * y0)
+        )
+        # Cloned objects are remembered by the writer, so shared fonts and
+        # images are copied once however many pages use them
+        resources = page.raw_get("/Resources") if "/Resources" in page else None
+        form[NameObject("/Resources")] = (
+            resources.clone(self.writer) if resources is not None else DictionaryObject()
+        )
+        if "/Group" in page:
+            form[NameObject("/Group")] = page.raw_get("/Group").clone(self.writer)
+
+        if rotation in (90, 270):
+            w, h = h, w
+        return self.writer._add_object(form), w, h
+
+    def max_size(self):
+        """Largest upright width and height over all pages."""
+        sizes = [self.get(i)[1:] for i in range(len(self.reader.pages))]
+        return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
+def nup_order(count, pages_per_sheet):
+    """Page indices on each sheet of an N-up layout, None for empty cells."""
+    sheets = []
+    for first in range(0, count, pages_per_sheet):
+        sheets.append(
+            [i if i < count else None for i in range(first, first + pages_per_sheet)]
+        )
+    return sheets
+
+
+def booklet_order(count, signature=0):
+    """
+    Page indices on each side of a folded booklet, as (left, right, depth,
+    sheets) in print order, the front then the back of each sheet. None is
+    a blank page; depth counts sheets in from the outside of the
+    signature, which has `sheets` sheets. signature is the number of
+    sheets folded together (0 for a single saddle-stitched signature).
+    """
+    padded = -(-count // 4) * 4
+    per_signature = signature * 4 if signature else padded
+    sides = []
+    for start in range(0, padded, per_signature):
+        pages = min(per_signature, padded - start)
+        sheets = pages // 4
+        last = start + pages - 1
+        for k in range(sheets):
+            front = (last - 2 * k, start + 2 * k)
+            back = (start + 2 * k + 1, last - 1 - 2 * k)
+            for left, right in (front, back):
+                sides.append(
+                    (
+                        left if left < count else None,
+                        right if right < count else None,
+                        k,
+                        sheets,
+                    )
+                )
+    return sides
+
+
+def sheet_size(name, landscape=False):
+    """Sheet (width, height) for a SHEET_SIZES name."""
+    if name not in SHEET_SIZES:
+        raise ValueError(f"Unknown sheet size: {name}. Use: {['auto', *SHEET_SIZES]}")
+    width, height = SHEET_SIZES[name]
+    return (height, width) if landscape else (width, height)
+
+
+def _fit(width, height, cell_width, cell_height):
+    """Scale fitting a width x height page into a cell."""
+    return min(cell_width / width, cell_height / height)
+
+
+def _placement(name, scale, x, y):
+    s, tx, ty = (format_number(v, PLACEMENT_PRECISION) for v in (scale, x, y))
+    return f"q {s} 0 0 {s} {tx} {ty} cm {name} Do Q"
+
+
+def add_sheet(writer, forms, width, height, placements):
+    """
+    Add a sheet to writer showing pages at (index, scale, x, y), the
+    lower-left corner of each page's form at x, y.
+    """
+    sheet = writer.add_blank_page(width, height)
+    xobjects = DictionaryObject()
+    lines = []
+    for index, scale, x, y in placements:
+        name = f"{FORM_PREFIX}{index + 1}"
+        xobjects[NameObject(name)] = forms.get(index)[0]
+        lines.append(_placement(name, scale, x, y))
+    sheet[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+    stream = DecodedStreamObject()
+    stream.set_data("\n".join(lines).encode("latin-1"))
+    sheet[NameObject("/Contents")] = writer._add_object(stream)
+    return sheet
+
+
+def impose_nup(reader, writer, pages_per_sheet, size="letter"):
+    """
+    Lay the pages of reader out pages_per_sheet to a sheet, left to right
+    and top to bottom, each scaled to fit and centred in its cell. Sheets
+    are landscape when the grid has more columns than rows. Returns the
+    number of sheets.
+    """
+    if pages_per_sheet not in LAYOUTS:
+        raise ValueError(
+            f"Invalid pages_per_sheet: {pages_per_sheet}. Use: {list(LAYOUTS.keys())}"
+        )
+    rows, cols = LAYOUTS[pages_per_sheet]
+    forms = PageForms(reader, writer)
+
+    if size == "auto":
+        page_width, page_height = forms.max_size()
+        sheet_width = cols * page_width + (cols - 1) * SPACING + 2 * MARGIN
+        sheet_height = rows * page_height + (rows - 1) * SPACING + 2 * MARGIN
+    else:
+        sheet_width, sheet_height = sheet_size(size, landscape=cols > rows)
+    cell_width = (sheet_width - 2 * MARGIN - (cols - 1) * SPACING) / cols
+    cell_height = (sheet_height - 2 * MARGIN - (rows - 1) * SPACING) / rows
+
+    sheets = nup_order(len(reader.pages), pages_per_sheet)
+    for indices in sheets:
+        placements = []
+        for cell, index in enumerate(indices):
+            if index is None:
+                continue
+            row, col = divmod(cell, cols)
+            _, width, height = forms.get(index)
+            scale = _fit(width, height, cell_width, cell_height)
+            x = MARGIN + col * (cell_width + SPACING) + (cell_width - width * scale) / 2
+            y = (
+                sheet_height
+                - MARGIN
+                - (row + 1) * cell_height
+                - row * SPACING
+                + (cell_height - height * scale) / 2
+            )
+            placements.append((index, scale, x, y))
+        add_sheet(writer, forms, sheet_width, sheet_height, placements)
+    return len(sheets)
+
+
+def impose_booklet(reader, writer, size="auto", creep=0.0, signature=0):
+    """
+    Impose the pages of reader as a booklet: two pages side by side on
+    each side of a landscape sheet, ordered so the printed sheets fold
+    into reading order. With size "auto" the sheet is two of the largest
+    page wide and pages keep their size. creep is how far, in points, the
+    pages on the innermost sheet of a signature are moved towards the
+    spine; sheets further out move proportionally less. Returns the
+    number of sheet sides and of blank pages added.
+    """
+    if creep < 0:
+        raise ValueError("Creep must not be negative")
+    if signature < 0:
+        raise ValueError("Signature sheets must not be negative")
+    forms = PageForms(reader, writer)
+    page_width, page_height = forms.max_size()
+    if size == "auto":
+        sheet_width, sheet_height = 2 * page_width, page_height
+    else:
+        sheet_width, sheet_height = sheet_size(size, landscape=True)
+    half = sheet_width / 2
+
+    count = len(reader.pages)
+    sides = booklet_order(count, signature)
+    for left, right, depth, sheets in sides:
+        shift = creep * depth / (sheets - 1) if sheets > 1 else 0.0
+        placements = []
+        # Creep moves left pages right and right pages left, towards the spine
+        for index, origin, towards_spine in ((left, 0.0, shift), (right, half, -shift)):
+            if index is None:
+                continue
+            _, width, height = forms.get(index)
+            scale = _fit(width, height, half, sheet_height)
+            x = origin + (half - width * scale) / 2 + towards_spine
+            y = (sheet_height - height * scale) / 2
+            placements.append((index, scale, x, y))
+        add_sheet(writer, forms, sheet_width, sheet_height, placements)
+    return len(sides), -(-count // 4) * 4 - count
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
-Impose PDF pages (N-up layout).
-Usage: python impose_pdf.py <input_pdf> <pages_per_sheet>
-pages_per_sheet: 2, 4, 6, 9, 16
+Impose PDF pages (N-up layout or booklet).
+Source pages are placed on the sheets as vector forms (see impose_engine.py);
+equivalent embedded fonts are then consolidated (see font_dedup.py).
+Usage: python impose_pdf.py <input_pdf> <pages_per_sheet> [sheet_size] [creep] [signature_sheets]
+pages_per_sheet: 2, 4, 6, 9, 16, or "booklet" for folded, saddle-stitched sheets
+sheet_size: letter, legal, tabloid, a5, a4, a3, or auto to fit the pages
+            (default letter for N-up, auto for booklets)
+creep: booklet only, points the innermost pages move towards the spine (default 0)
+signature_sheets: booklet only, sheets folded together (default 0, all of them)
 Output: JSON with result
 """
 
@@ -13,117 +19,75 @@ from datetime import datetime
 
 try:
     from pypdf import PdfReader, PdfWriter
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.units import inch
-    from reportlab.pdfgen import canvas
+    from font_dedup import deduplicate_fonts
+    from impose_engine import LAYOUTS, impose_booklet, impose_nup
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
-
-# Page layouts for different N-up values
-LAYOUTS = {
-    2: (1, 2),  # 1 row, 2 columns
-    4: (2, 2),  # 2 rows, 2 columns
-    6: (2, 3),  # 2 rows, 3 columns
-    9: (3, 3),  # 3 rows, 3 columns
-    16: (4, 4),  # 4 rows, 4 columns
-}
-
-
-def impose_pdf(input_path, pages_per_sheet=4):
-    """Impose PDF pages (N-up layout)."""
-    if not os.path.exists(input_path):
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
+
+BOOKLET = "booklet"
+
+
+def impose_pdf(input_path, pages_per_sheet=4, sheet_size=None, creep=0.0, signature=0):
+    """Impose PDF pages (N-up layout or booklet)."""
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
-    if pages_per_sheet not in LAYOUTS:
+    if pages_per_sheet != BOOKLET and pages_per_sheet not in LAYOUTS:
         return {
             "success": False,
-            "error": f"Invalid pages_per_sheet: {pages_per_sheet}. Use: {list(LAYOUTS.keys())}",
+            "error": f"Invalid pages_per_sheet: {pages_per_sheet}. "
+            f"Use: {list(LAYOUTS.keys())} or {BOOKLET}",
         }
 
     try:
-        reader = PdfReader(input_path)
-        writer = PdfWriter()
-
-        rows, cols = LAYOUTS[pages_per_sheet]
+        reader = PdfReader(open_input(input_path))
+        if reader.is_encrypted and not reader.decrypt(""):
+            return {"success": False, "error": "PDF is encrypted"}
         total_pages = len(reader.pages)
+        if not total_pages:
+            return {"success": False, "error": "PDF has no pages"}
 
-        # Calculate page dimensions for imposition
-        sheet_width = 8.5 * inch
-        sheet_height = 11 * inch
-        margin = 0.25 * inch
-        spacing = 0.2 * inch
-
-        cell_width = (sheet_width - 2 * margin - (cols - 1) * spacing) / cols
-        cell_height = (sheet_height - 2 * margin - (rows - 1) * spacing) / rows
-
-        # Create imposition pages
-        pages_processed = 0
-
-        while pages_processed < total_pages:
-            # Create a new sheet
-            temp_path = os.path.join(DOWNLOAD_DIR, f"impose_temp_{pages_processed}.pdf")
-            c = canvas.Canvas(temp_path, pagesize=(sheet_width, sheet_height))
-
-            for row in range(rows):
-                for col in range(cols):
-                    page_idx = pages_processed + row * cols + col
-
-                    if page_idx >= total_pages:
-                        break
-
-                    # Calculate position
-                    x = margin + col * (cell_width + spacing)
-                    y = sheet_height - margin - (row + 1) * cell_height - row * spacing
-
-                    # Add page reference (would need PyMuPDF for actual page insertion)
-                    c.saveState()
-                    c.setFillColorRGB(0.9, 0.9, 0.9)
-                    c.rect(x, y, cell_width, cell_height, fill=True)
-                    c.setFillColorRGB(0.3, 0.3, 0.3)
-                    c.setFont("Helvetica", 10)
-                    c.drawString(x + 5, y + 5, f"Page {page_idx + 1}")
-                    c.restoreState()
-
-            c.save()
-
-            # Read temp page and add to writer
-            temp_reader = PdfReader(temp_path)
-            writer.add_page(temp_reader.pages[0])
-
-            # Clean up temp file
-            try:
-                os.remove(temp_path)
-            except:
-                pass
-
-            pages_processed += pages_per_sheet
+        writer = PdfWriter()
+        result = {}
+        if pages_per_sheet == BOOKLET:
+            sheet_size = sheet_size or "auto"
+            _, blank_pages = impose_booklet(reader, writer, sheet_size, creep, signature)
+            result["blankPages"] = blank_pages
+            result["creep"] = creep
+            result["signatureSheets"] = signature
+            suffix = BOOKLET
+        else:
+            sheet_size = sheet_size or "letter"
+            impose_nup(reader, writer, pages_per_sheet, sheet_size)
+            suffix = f"{pages_per_sheet}up"
+
+        # Sources that are themselves merges often carry one copy of a
+        # font per original file; sheets need only one
+        result.update(deduplicate_fonts(writer))
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        output_filename = f"{base_name}_{pages_per_sheet}up_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        base_name = os.path.splitext(input_name(input_path))[0]
+        output_filename = f"{base_name}_{suffix}_{timestamp}.pdf"
+        job = OutputJob("impose")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         return {
             "success": True,
             "output": output_path,
             "pagesPerSheet": pages_per_sheet,
+            "sheetSize": sheet_size,
             "originalPages": total_pages,
             "imposedSheets": len(writer.pages),
+            **result,
         }
 
     except Exception as e:
@@ -136,6 +100,14 @@ if __name__ == "__main__":
         sys.exit(1)
 
     input_path = sys.argv[1]
-    pages_per_sheet = int(sys.argv[2]) if len(sys.argv) > 2 else 4
-    result = impose_pdf(input_path, pages_per_sheet)
+    layout = sys.argv[2] if len(sys.argv) > 2 else "4"
+    try:
+        pages_per_sheet = BOOKLET if layout == BOOKLET else int(layout)
+        creep = float(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] else 0.0
+        signature = int(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] else 0
+    except ValueError as e:
+        print(json.dumps({"success": False, "error": f"Invalid argument: {e}"}))
+        sys.exit(1)
+    sheet_size = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] else None
+    result = impose_pdf(input_path, pages_per_sheet, sheet_size, creep, signature)
     print(json.dumps(result))
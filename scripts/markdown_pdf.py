@@ -16,11 +16,7 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
 
 
 def extract_markdown_from_pdf(pdf_path):
@@ -66,14 +62,13 @@ def convert_pdf_to_markdown(input_path):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(input_path))[0]
         output_filename = f"{base_name}_{timestamp}.md"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("markdown")
+        output_path = job.staged(output_filename)
 
         # Write markdown file
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(markdown)
+        output_path = job.publish(output_path)
 
         return {"success": True, "output": output_path}
 
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Streaming merge engine used by merge_pdf.py.
+Inputs are inspected in parallel worker processes (validation, page count,
+font fingerprints), then each source's pages and the objects they use are
+serialized by a worker into a fragment file that is appended to the output
+in order. At most `workers` source files are open at any time and no more
+than one source's objects are held in memory per worker.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import DictionaryObject
+except ImportError:
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import DictionaryObject
+
+from font_dedup import font_fingerprint, is_embedded, iter_font_refs
+from pipe_io import as_stream, mapped_input
+from pdf_serializer import (
+    EXCLUDED_PAGE_KEYS,
+    EXCLUDED_TYPES,
+    FIRST_SOURCE_NUM,
+    PAGES_NUM,
+    PDF_HEADER,
+    Serializer,
+    last_xref,
+    object_span,
+    write_document_end,
+    write_update_end,
+)
+
+# Maximum number of source files open at once (one per worker)
+MAX_OPEN_FILES = int(os.environ.get("PDF_MERGE_MAX_OPEN_FILES", "8"))
+
+
+class MergeInputError(ValueError):
+    """An input could not be read; carries the timings gathered so far."""
+
+    def __init__(self, path, message, timings):
+        super().__init__(f"Failed to read {path}: {message}")
+        self.path = path
+        self.timings = timings
+
+
+def _open_reader(data):
+    reader = PdfReader(as_stream(data))
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError("File is encrypted")
+    return reader
+
+
+def inspect_source(path):
+    """
+    Validate one input and collect what the merge needs to plan it.
+    Runs in a worker process; returns a picklable dict.
+    """
+    started = time.perf_counter()
+    info = {"path": path, "pages": 0, "objects": 0, "fontRefs": 0, "fonts": {}, "error": None}
+    try:
+        with mapped_input(path) as data:
+            reader = _open_reader(data)
+            pages = reader.pages
+            info["pages"] = len(pages)
+            info["objects"] = object_span(reader)
+            for _, _, ref in iter_font_refs(pages):
+                info["fontRefs"] += 1
+                if ref.idnum not in info["fonts"] and is_embedded(ref):
+                    info["fonts"][ref.idnum] = font_fingerprint(ref)
+    except Exception as e:
+        info["error"] = str(e)
+    info["parseMs"] = round((time.perf_counter() - started) * 1000, 1)
+    return info
+
+
+class _FragmentWriter(Serializer):
+    """Serializes one source's objects with renumbered references."""
+
+    def __init__(self, out, offset, page_nums, external):
+        self.out = out
+        self.offset = offset
+        self.page_nums = page_nums
+        self.external = external
+        self.assigned = set()
+        self.queue = deque()
+        self.objects = []
+
+    def reference(self, ref):
+        """Serialized form of a reference, queueing its target for output."""
+        if ref.idnum in self.external:
+            return b"%d 0 R" % self.external[ref.idnum]
+        if ref.idnum in self.page_nums:
+            return b"%d 0 R" % (self.offset + ref.idnum)
+        target = ref.get_object()
+        if target is None:
+            return b"null"
+        if isinstance(target, DictionaryObject):
+            obj_type = target.get("/Type")
+            if obj_type in EXCLUDED_TYPES or obj_type == "/Page":
+                return b"null"
+        num = self.offset + ref.idnum
+        if num not in self.assigned:
+            self.assigned.add(num)
+            self.queue.append((num, target))
+        return b"%d 0 R" % num
+
+    def write(self, num, obj):
+        self.objects.append((num, self.out.tell()))
+        self.out.write(b"%d 0 obj\n" % num)
+        self.out.write(self.value(obj))
+        self.out.write(b"\nendobj\n")
+
+    def drain(self):
+        while self.queue:
+            self.write(*self.queue.popleft())
+
+
+def copy_source(path, offset, external, fragment_path, parent_num=PAGES_NUM):
+    """
+    Serialize one source's pages and everything they reference into
+    fragment_path, numbering objects from `offset`. `external` maps source
+    object numbers to objects written by an earlier source (shared fonts);
+    pages get `parent_num` as their /Parent.
+    Runs in a worker process; returns the page and object offsets.
+    """
+    started = time.perf_counter()
+    with mapped_input(path) as data, open(fragment_path, "wb") as out:
+        reader = _open_reader(data)
+        page_refs = [page.indirect_reference for page in reader.pages]
+        page_nums = {ref.idnum for ref in page_refs}
+        fragment = _FragmentWriter(out, offset, page_nums, external)
+
+        for ref in page_refs:
+            page = ref.get_object()
+            entries = {k: v for k, v in page.items() if k not in EXCLUDED_PAGE_KEYS}
+            num = offset + ref.idnum
+            fragment.assigned.add(num)
+            fragment.objects.append((num, out.tell()))
+            out.write(b"%d 0 obj\n" % num)
+            out.write(fragment.dictionary(entries, b"/Parent %d 0 R" % parent_num))
+            out.write(b"\nendobj\n")
+            # Flush each page's resources before moving on to the next page
+            fragment.drain()
+
+    return {
+        "pages": [offset + ref.idnum for ref in page_refs],
+        "objects": fragment.objects,
+        "size": os.path.getsize(fragment_path),
+        "copyMs": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _plan(infos, first_num):
+    """Assign object number ranges and pick one canonical copy per font."""
+    offsets = []
+    externals = []
+    canonical = {}
+    examined = 0
+    replaced = 0
+    offset = first_num
+    for info in infos:
+        offsets.append(offset)
+        external = {}
+        examined += info["fontRefs"]
+        for idnum, fingerprint in info["fonts"].items():
+            num = canonical.setdefault(fingerprint, offset + idnum)
+            if num != offset + idnum:
+                external[idnum] = num
+                replaced += 1
+        externals.append(external)
+        offset += info["objects"]
+    font_stats = {
+        "fontsExamined": examined,
+        "uniqueFonts": len(canonical),
+        "fontsDeduplicated": replaced,
+    }
+    return offsets, externals, font_stats
+
+
+def _copy_sources(pool, workers, input_paths, out, first_num, parent_num, work_dir):
+    """
+    Inspect and copy every input into `out`, numbering objects from first_num.
+    Returns (object positions, page numbers, per-input timings, font stats).
+    """
+    infos = list(pool.map(inspect_source, input_paths))
+    timings = [
+        {"path": info["path"], "pages": info["pages"], "parseMs": info["parseMs"]}
+        for info in infos
+    ]
+    for info, timing in zip(infos, timings):
+        if info["error"] is not None:
+            timing["error"] = info["error"]
+    failed = [info for info in infos if info["error"] is not None]
+    if failed:
+        raise MergeInputError(failed[0]["path"], failed[0]["error"], timings)
+
+    offsets, externals, font_stats = _plan(infos, first_num)
+    fragment_dir = tempfile.mkdtemp(prefix="merge_", dir=work_dir)
+    objects = {}
+    page_nums = []
+    try:
+        # Keep a bounded window of fragments in flight so finished
+        # ones do not pile up on disk ahead of the writer
+        pending = deque()
+        for index, path in enumerate(input_paths):
+            fragment_path = os.path.join(fragment_dir, f"{index}.part")
+            future = pool.submit(
+                copy_source, path, offsets[index], externals[index], fragment_path, parent_num
+            )
+            pending.append((index, fragment_path, future))
+            if len(pending) >= 2 * workers:
+                _append_fragment(out, pending.popleft(), timings, objects, page_nums)
+        while pending:
+            _append_fragment(out, pending.popleft(), timings, objects, page_nums)
+    finally:
+        shutil.rmtree(fragment_dir, ignore_errors=True)
+
+    return objects, page_nums, timings, font_stats
+
+
+def _append_fragment(out, job, timings, objects, page_nums):
+    index, fragment_path, future = job
+    try:
+        result = future.result()
+    except Exception as e:
+        raise MergeInputError(timings[index]["path"], str(e), timings)
+    base = out.tell()
+    with open(fragment_path, "rb") as fragment:
+        shutil.copyfileobj(fragment, out)
+    os.remove(fragment_path)
+    for num, position in result["objects"]:
+        objects[num] = base + position
+    page_nums.extend(result["pages"])
+    timings[index]["copyMs"] = result["copyMs"]
+    timings[index]["bytes"] = result["size"]
+
+
+def _worker_count(workers, count):
+    if workers is None:
+        workers = min(MAX_OPEN_FILES, os.cpu_count() or 1)
+    return max(1, min(workers, count))
+
+
+def merge_streaming(input_paths, output_path, workers=None):
+    """
+    Merge input_paths into output_path.
+    Returns (per-input timing list, page count, font stats).
+    Raises MergeInputError naming the first input that failed.
+    """
+    workers = _worker_count(workers, len(input_paths))
+    work_dir = os.path.dirname(os.path.abspath(output_path))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "wb") as out:
+        out.write(PDF_HEADER)
+        objects, page_nums, timings, font_stats = _copy_sources(
+            pool, workers, input_paths, out, FIRST_SOURCE_NUM, PAGES_NUM, work_dir
+        )
+
+        write_document_end(out, objects, page_nums)
+
+    return timings, len(page_nums), font_stats
+
+
+def append_streaming(bundle_path, input_paths, workers=None):
+    """
+    Append the pages of input_paths to bundle_path as an incremental update.
+    Only the new objects, a /Pages node holding the new pages, the rewritten
+    root /Pages object and a new xref section are written; existing bytes
+    are never read beyond the trailer and page tree root.
+    Returns (per-input timing list, pages appended, total pages, bytes
+    appended, font stats).
+    """
+    with mapped_input(bundle_path) as data:
+        prev_xref, xref_is_stream = last_xref(data)
+        reader = PdfReader(as_stream(data))
+        if reader.is_encrypted:
+            raise ValueError("Cannot append to an encrypted PDF")
+        trailer = reader.trailer
+        size = object_span(reader)
+        root_ref = trailer.raw_get("/Root")
+        pages_ref = root_ref.get_object().raw_get("/Pages")
+        pages_root = pages_ref.get_object()
+        root_entries = {
+            k: v for k, v in pages_root.items() if k not in ("/Kids", "/Count")
+        }
+        kids = list(pages_root.raw_get("/Kids").get_object())
+        count = int(pages_root["/Count"])
+
+    serializer = Serializer()
+    node_num = size
+    workers = _worker_count(workers, len(input_paths))
+    work_dir = os.path.dirname(os.path.abspath(bundle_path))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(bundle_path, "r+b") as out:
+        out.seek(0, os.SEEK_END)
+        original_size = out.tell()
+        try:
+            out.seek(original_size - 1)
+            needs_newline = out.read(1) not in b"\r\n"
+            out.seek(0, os.SEEK_END)
+            if needs_newline:
+                out.write(b"\n")
+            objects, page_nums, timings, font_stats = _copy_sources(
+                pool, workers, input_paths, out, size + 1, node_num, work_dir
+            )
+
+            objects[node_num] = out.tell()
+            out.write(
+                b"%d 0 obj\n<< /Type /Pages /Parent %s /Kids [%s] /Count %d >>\nendobj\n"
+                % (
+                    node_num,
+                    serializer.reference(pages_ref),
+                    b" ".join(b"%d 0 R" % num for num in page_nums),
+                    len(page_nums),
+                )
+            )
+
+            objects[pages_ref.idnum] = out.tell()
+            kids_value = b" ".join([serializer.value(kid) for kid in kids] + [b"%d 0 R" % node_num])
+            out.write(b"%d %d obj\n" % (pages_ref.idnum, pages_ref.generation))
+            out.write(
+                serializer.dictionary(
+                    root_entries,
+                    b"/Kids [%s] /Count %d" % (kids_value, count + len(page_nums)),
+                )
+            )
+            out.write(b"\nendobj\n")
+
+            generations = {pages_ref.idnum: pages_ref.generation}
+            write_update_end(out, objects, generations, prev_xref, xref_is_stream, trailer)
+        except BaseException:
+            # Leave the bundle exactly as it was
+            out.truncate(original_size)
+            raise
+        appended = out.tell() - original_size
+
+    return timings, len(page_nums), count + len(page_nums), appended, font_stats
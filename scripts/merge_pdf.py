@@ -2,6 +2,8 @@
 """
 Merge multiple PDF files into one.
 Usage: python merge_pdf.py <input_file1> <input_file2> ... [input_fileN]
+       python merge_pdf.py --append <bundle_pdf> <input_file1> ... [input_fileN]
+--append adds the inputs' pages to bundle_pdf in place as an incremental update.
 Output: JSON with result
 """
 
@@ -13,10 +15,10 @@ from datetime import datetime
 
 # Cross-platform PDF library import
 try:
-    from pypdf import PdfWriter, PdfReader
+    import pypdf  # noqa: F401
 except ImportError:
     try:
-        from PyPDF2 import PdfWriter, PdfReader
+        import PyPDF2  # noqa: F401
     except ImportError:
         print(
             json.dumps(
@@ -28,6 +30,9 @@ except ImportError:
         )
         sys.exit(1)
 
+from merge_engine import MergeInputError, append_streaming, merge_streaming
+from output_manager import OutputJob
+
 
 # Timeout handler
 def timeout_handler(signum, frame):
@@ -40,51 +45,72 @@ if hasattr(signal, "SIGALRM"):
     signal.signal(signal.SIGALRM, timeout_handler)
     signal.alarm(120)  # 2 minute timeout
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
-
 
 def merge_pdfs(input_paths):
     """Merge multiple PDF files into one."""
-    writer = PdfWriter()
-
     for path in input_paths:
         if not os.path.exists(path):
             return {"success": False, "error": f"File not found: {path}"}
 
-        try:
-            reader = PdfReader(path)
-            # Add each page to the writer
-            for page in reader.pages:
-                writer.add_page(page)
-        except Exception as e:
-            return {"success": False, "error": f"Failed to read {path}: {str(e)}"}
-
     # Generate output filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_filename = f"merged_{timestamp}.pdf"
-    output_path = os.path.join(DOWNLOAD_DIR, output_filename)
 
-    # Ensure download directory exists
+    # Create this job's output directory
     try:
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("merge")
     except OSError as e:
         return {
             "success": False,
             "error": f"Failed to create output directory: {str(e)}",
         }
+    output_path = job.staged(output_filename)
 
-    # Write merged PDF
+    # Inputs are validated in parallel and streamed into the output one
+    # source at a time; fonts embedded by several inputs are written once
     try:
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        timings, page_count, font_stats = merge_streaming(input_paths, output_path)
+    except MergeInputError as e:
+        job.discard()
+        return {"success": False, "error": str(e), "inputs": e.timings}
     except Exception as e:
+        job.discard()
         return {"success": False, "error": f"Failed to write output file: {str(e)}"}
+    output_path = job.publish(output_path)
+
+    return {
+        "success": True,
+        "output": output_path,
+        "pageCount": page_count,
+        "fonts": font_stats,
+        "inputs": timings,
+    }
+
+
+def append_pdfs(bundle_path, input_paths):
+    """Append pages to an existing PDF without rewriting what it already holds."""
+    for path in [bundle_path] + input_paths:
+        if not os.path.exists(path):
+            return {"success": False, "error": f"File not found: {path}"}
 
-    return {"success": True, "output": output_path}
+    try:
+        timings, appended, page_count, appended_bytes, font_stats = append_streaming(
+            bundle_path, input_paths
+        )
+    except MergeInputError as e:
+        return {"success": False, "error": str(e), "inputs": e.timings}
+    except Exception as e:
+        return {"success": False, "error": f"Failed to append to {bundle_path}: {str(e)}"}
+
+    return {
+        "success": True,
+        "output": bundle_path,
+        "pagesAppended": appended,
+        "pageCount": page_count,
+        "appendedBytes": appended_bytes,
+        "fonts": font_stats,
+        "inputs": timings,
+    }
 
 
 if __name__ == "__main__":
@@ -94,6 +120,16 @@ if __name__ == "__main__":
         )
         sys.exit(1)
 
-    input_paths = sys.argv[1:]
-    result = merge_pdfs(input_paths)
+    if sys.argv[1] == "--append":
+        if len(sys.argv) < 4:
+            print(
+                json.dumps(
+                    {"success": False, "error": "Bundle and at least one input file required"}
+                )
+            )
+            sys.exit(1)
+        result = append_pdfs(sys.argv[2], sys.argv[3:])
+    else:
+        input_paths = sys.argv[1:]
+        result = merge_pdfs(input_paths)
     print(json.dumps(result))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Page numbering engine used by page_numbers_pdf.py and bates_pdf.py.
+Labels come from a template with {page}, {total}, {bates} and {filename}
+fields, e.g. "Page {page} of {total}" or "{bates}". For a document set the
+first Bates number of every file is planned from page counts read off each
+file's trailer and page tree root (no page is parsed), so the files can
+then be stamped in parallel worker processes, each independent of the
+others. At most `workers` files are open at any time.
+"""
+
+import io
+import os
+import string
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    from PyPDF2 import PdfReader, PdfWriter
+
+from overlay import FormStamper
+from pdf_scan import count_pages
+from pipe_io import input_name, open_input
+from stamp import Stamp
+
+TEMPLATE_FIELDS = ("page", "total", "bates", "filename")
+
+DEFAULT_TEMPLATE = "{page}"
+
+POSITIONS = (
+    "bottom-center",
+    "bottom-left",
+    "bottom-right",
+    "top-center",
+    "top-left",
+    "top-right",
+)
+
+# Distance of the label's baseline and outer edge from the page edges
+MARGIN = 30
+
+FONT = "Helvetica"
+FONT_SIZE = 12
+
+# Digits Bates numbers are zero-padded to
+BATES_DIGITS = 6
+
+# Maximum number of documents open at once (one per worker)
+MAX_OPEN_FILES = int(os.environ.get("PDF_NUMBERING_MAX_OPEN_FILES", "8"))
+
+# Finished documents held in memory ahead of the consumer, per worker
+WINDOW_PER_WORKER = 2
+
+
+class NumberingInputError(ValueError):
+    """A document of the set could not be counted or stamped."""
+
+    def __init__(self, path, message):
+        super().__init__(f"Failed to number {path}: {message}")
+        self.path = path
+
+
+def check_template(template):
+    """Raise ValueError if template uses a field other than TEMPLATE_FIELDS."""
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template)]
+    except ValueError as e:
+        raise ValueError(f"Invalid template: {e}")
+    for field in fields:
+        if field is not None and field not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown template field: {{{field}}}")
+    return template
+
+
+def bates_number(number, prefix="", digits=BATES_DIGITS, suffix=""):
+    """A Bates number: prefix, zero-padded counter, suffix."""
+    return f"{prefix}{number:0{digits}d}{suffix}"
+
+
+def label_stamp(label, position, page_width, page_height, font=FONT, size=FONT_SIZE):
+    """A stamp setting label at one of POSITIONS on a page."""
+    # Position mapping: (x, y, alignment of the text at x)
+    positions = {
+        "bottom-center": (page_width / 2, MARGIN, "center"),
+        "bottom-left": (MARGIN, MARGIN, "left"),
+        "bottom-right": (page_width - MARGIN, MARGIN, "right"),
+        "top-center": (page_width / 2, page_height - MARGIN, "center"),
+        "top-left": (MARGIN, page_height - MARGIN, "left"),
+        "top-right": (page_width - MARGIN, page_height - MARGIN, "right"),
+    }
+
+    x, y, align = positions.get(position, positions["bottom-center"])
+    return Stamp().text(x, y, label, font=font, size=size, align=align)
+
+
+def number_pages(reader, writer, options, first_bates=1, page_start=1, filename=""):
+    """
+    Add every page of reader to writer with its label stamped on.
+    options holds template, position and the Bates prefix, digits and
+    suffix. Returns the last Bates number used.
+    """
+    template = options.get("template") or DEFAULT_TEMPLATE
+    total = page_start + len(reader.pages) - 1
+    stamper = FormStamper(writer, prefix="/PageNum")
+
+    bates = first_bates
+    for i, page in enumerate(reader.pages):
+        bates = first_bates + i
+        label = template.format(
+            page=page_start + i,
+            total=total,
+            bates=bates_number(
+                bates,
+                options.get("prefix", ""),
+                options.get("digits", BATES_DIGITS),
+                options.get("suffix", ""),
+            ),
+            filename=filename,
+        )
+        page = writer.add_page(page)
+        stamper.apply(
+            page,
+            label_stamp(
+                label,
+                options.get("position", "bottom-center"),
+                float(page.mediabox.width),
+                float(page.mediabox.height),
+            ),
+        )
+    return bates
+
+
+def stamp_document(path, output_path, first_bates, pages, options):
+    """
+    Number one document of a set; its labels start at first_bates.
+    pages is the planned page count, checked against the parsed document so
+    a bad plan can never give two pages the same number. With output_path
+    None the document is returned in memory as "data".
+    """
+    started = time.perf_counter()
+    reader = PdfReader(open_input(path))
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError("File is encrypted")
+    if len(reader.pages) != pages:
+        raise ValueError(f"Page tree has {len(reader.pages)} pages, trailer scan found {pages}")
+
+    writer = PdfWriter()
+    filename = os.path.splitext(input_name(path))[0]
+    last = number_pages(reader, writer, options, first_bates, 1, filename)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    out = io.BytesIO() if output_path is None else open(output_path, "wb")
+    with out:
+        writer.write(out)
+        result = {
+            "path": path,
+            "output": output_path,
+            "pages": pages,
+            "batesStart": first_bates,
+            "batesEnd": last,
+            "bytes": out.tell(),
+        }
+        if output_path is None:
+            result["data"] = out.getvalue()
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _count_job(path):
+    try:
+        return count_pages(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _stamp_job(job):
+    try:
+        return stamp_document(*job)
+    except Exception as e:
+        return {"path": job[0], "error": str(e)}
+
+
+def plan_set(paths, counts, start=1):
+    """First Bates number of every document, given their page counts."""
+    firsts = []
+    number = start
+    for path, pages in zip(paths, counts):
+        if not pages:
+            raise NumberingInputError(path, "Document has no pages")
+        firsts.append(number)
+        number += pages
+    return firsts
+
+
+def _worker_count(workers, count):
+    if workers is None:
+        workers = min(MAX_OPEN_FILES, os.cpu_count() or 1)
+    return max(1, min(workers, count))
+
+
+def _windowed_map(pool, fn, jobs, workers):
+    """
+    Like pool.map, in order, but with only a bounded window of jobs
+    submitted ahead of the consumer, so finished results do not pile up
+    in memory. Jobs not started yet are cancelled if the consumer stops.
+    """
+    pending = deque()
+    try:
+        for job in jobs:
+            pending.append(pool.submit(fn, job))
+            if len(pending) >= WINDOW_PER_WORKER * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _run_set(mapper, paths, output_paths, options, start):
+    counted = list(mapper(_count_job, paths))
+    for path, (pages, error) in zip(paths, counted):
+        if error is not None:
+            raise NumberingInputError(path, error)
+    counts = [pages for pages, _ in counted]
+    firsts = plan_set(paths, counts, start)
+
+    jobs = (
+        (path, output_path, first, pages, options)
+        for path, output_path, first, pages in zip(paths, output_paths, firsts, counts)
+    )
+    yield from mapper(_stamp_job, jobs)
+
+
+def number_set(paths, output_paths, options, start=1, workers=None):
+    """
+    Bates-number the documents of a set in order, the first page of the set
+    getting `start`. Page counts are read first (in parallel); any document
+    that cannot be counted fails the whole set, since every later number
+    depends on it. Then documents are stamped in parallel and one result
+    per document is yielded, in order, as soon as it is ready; only a
+    bounded window of documents is stamped ahead of the consumer. A
+    document that fails to stamp gets a result with an "error" instead.
+    """
+    check_template(options.get("template") or DEFAULT_TEMPLATE)
+    workers = _worker_count(workers, len(paths))
+
+    if workers == 1:
+        yield from _run_set(map, paths, output_paths, options, start)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def mapper(fn, jobs):
+            return _windowed_map(pool, fn, jobs, workers)
+
+        yield from _run_set(mapper, paths, output_paths, options, start)
@@ -19,11 +19,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Cross-platform download directory
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def ocr_pdf(input_path, language="eng"):
@@ -31,6 +28,10 @@ def ocr_pdf(input_path, language="eng"):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path, dpi=300)
+    if rejected:
+        return rejected
+
     try:
         # Convert PDF to images
         images = convert_from_path(input_path, dpi=300)
@@ -62,13 +63,12 @@ def ocr_pdf(input_path, language="eng"):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"ocr_result_{timestamp}.docx"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("ocr")
+        output_path = job.staged(output_filename)
 
         # Save document
         doc.save(output_path)
+        output_path = job.publish(output_path)
 
         return {"success": True, "output": output_path, "pages_processed": len(images)}
 
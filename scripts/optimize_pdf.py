@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """
 Optimize PDF for web viewing (linearization).
-Usage: python optimize_pdf.py <input_pdf> [quality]
+Usage: python optimize_pdf.py <input_pdf> [quality] [precision]
 quality: low, medium, high (default: medium)
+precision: decimals kept for content stream coordinates (default depends on quality)
 Output: JSON with result
 """
 
@@ -17,33 +18,40 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from content_stream import CONTENT_SETTINGS, minify_page_contents
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, input_size, open_input
+from resource_guard import preflight
 
 
-def optimize_pdf(input_path, quality="medium"):
+def optimize_pdf(input_path, quality="medium", precision=None):
     """Optimize PDF for web viewing."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         # Set up optimization options based on quality
-        if quality == "low":
-            writer.compress_content_streams = True
-        elif quality == "high":
-            writer.compress_content_streams = True
-        else:  # medium
-            writer.compress_content_streams = True
-
-        # Add pages
+        default_precision, level = CONTENT_SETTINGS.get(
+            quality, CONTENT_SETTINGS["medium"]
+        )
+        if precision is None:
+            precision = default_precision
+
+        # Add pages and minify their content streams
+        content_before = 0
+        content_after = 0
         for page in reader.pages:
-            writer.add_page(page)
+            new_page = writer.add_page(page)
+            before, after = minify_page_contents(new_page, precision, level)
+            content_before += before
+            content_after += after
 
         # Copy metadata
         if reader.metadata:
@@ -51,25 +59,28 @@ def optimize_pdf(input_path, quality="medium"):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_optimized_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("optimize")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
         # Get file sizes
-        original_size = os.path.getsize(input_path)
-        optimized_size = os.path.getsize(output_path)
+        original_size = input_size(input_path)
+        optimized_size = job.output_size
         reduction = (
             ((original_size - optimized_size) / original_size) * 100
             if original_size > 0
             else 0
         )
+        content_reduction = (
+            ((content_before - content_after) / content_before) * 100
+            if content_before > 0
+            else 0
+        )
 
         return {
             "success": True,
@@ -77,6 +88,12 @@ def optimize_pdf(input_path, quality="medium"):
             "originalSize": original_size,
             "optimizedSize": optimized_size,
             "reduction": reduction,
+            "contentStreams": {
+                "originalSize": content_before,
+                "minifiedSize": content_after,
+                "reduction": content_reduction,
+                "precision": precision,
+            },
         }
 
     except Exception as e:
@@ -90,5 +107,6 @@ if __name__ == "__main__":
 
     input_path = sys.argv[1]
     quality = sys.argv[2] if len(sys.argv) > 2 else "medium"
-    result = optimize_pdf(input_path, quality)
+    precision = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    result = optimize_pdf(input_path, quality, precision)
     print(json.dumps(result))
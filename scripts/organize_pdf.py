@@ -7,7 +7,6 @@ Output: JSON with result
 """
 
 import sys
-import os
 import json
 from datetime import datetime
 
@@ -16,11 +15,10 @@ try:
 except ImportError:
     from PyPDF2 import PdfWriter, PdfReader
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from page_selection import parse_pages
+
+from output_manager import OutputJob
+from pipe_io import input_exists, open_input
 
 
 def organize_pdf(input_path, operations):
@@ -28,22 +26,28 @@ def organize_pdf(input_path, operations):
     Organize PDF pages based on operations.
     operations: {
         "order": [1, 3, 2, 4],  # New page order (1-indexed)
-        "rotate": {1: 90, 3: 180},  # Page rotations in degrees
-        "delete": [5, 6]  # Pages to delete (1-indexed)
+        "rotate": {1: 90, "4-6": 180},  # Rotations in degrees by page selection
+        "delete": [5, 6]  # Pages to delete, as a list or page selection ("even")
     }
     """
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         total_pages = len(reader.pages)
         writer = PdfWriter()
 
         # Parse operations
-        order = operations.get("order", list(range(1, total_pages + 1)))
-        rotations = operations.get("rotate", {})
-        delete_pages = set(operations.get("delete", []))
+        order = operations.get("order", range(1, total_pages + 1))
+        try:
+            delete_pages = parse_pages(operations.get("delete", []), total_pages)
+            rotations = [
+                (parse_pages([key] if isinstance(key, int) else key, total_pages), angle)
+                for key, angle in operations.get("rotate", {}).items()
+            ]
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
 
         # Filter out deleted pages from order
         order = [p for p in order if p not in delete_pages]
@@ -59,10 +63,13 @@ def organize_pdf(input_path, operations):
 
             page = reader.pages[page_num - 1]
 
-            # Apply rotation if specified
-            if str(page_num) in rotations or page_num in rotations:
-                rotation = rotations.get(str(page_num), rotations.get(page_num, 0))
-                page.rotate(rotation)
+            # Apply rotation if specified; later selections win
+            rotation = None
+            for selection, angle in rotations:
+                if page_num in selection:
+                    rotation = angle
+            if rotation:
+                page.rotate(int(rotation))
 
             writer.add_page(page)
             processed_pages.add(page_num)
@@ -73,14 +80,12 @@ def organize_pdf(input_path, operations):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"organized_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("organize")
 
         # Write output
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {
             "success": True,
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Job-scoped output directories shared by every tool.
+Each run gets its own directory under DOWNLOAD_DIR, so two jobs started in
+the same second never overwrite each other. Outputs are written under a
+hidden ".part-" name and renamed into place when complete; a reader never
+sees a half-written file.
+
+Every job is appended to a ledger in DOWNLOAD_DIR, oldest first: a
+placeholder when it starts and its size when it publishes. The sweeper
+pops expired (or over-quota) jobs off the head of the ledger and keeps the
+running byte total in a small state file, so cleanup never lists the
+download directory.
+Usage: python output_manager.py sweep
+Output: JSON with result
+"""
+
+import sys
+import os
+import io
+import json
+import secrets
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from pipe_io import output_fd
+
+# Get download directory from environment or use default
+DOWNLOAD_DIR = os.environ.get(
+    "DOWNLOAD_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
+)
+
+# Seconds a job's outputs are kept
+OUTPUT_TTL = float(os.environ.get("PDF_OUTPUT_TTL", "3600"))
+
+# Total bytes of published outputs kept before the oldest jobs are dropped
+OUTPUT_QUOTA = int(float(os.environ.get("PDF_OUTPUT_QUOTA_MB", "2048")) * 1024 * 1024)
+
+# Jobs younger than this are never swept, even over quota; they may still run
+MIN_JOB_AGE = 120
+
+# Seconds between sweeps started by new jobs
+SWEEP_INTERVAL = 60
+
+# Consumed ledger bytes tolerated before the ledger is rewritten
+COMPACT_BYTES = 1024 * 1024
+
+LEDGER_NAME = ".jobs-ledger"
+# Size field of the entry written when a job starts, before it publishes
+PLACEHOLDER = "-"
+STATE_NAME = ".jobs-state"
+PART_PREFIX = ".part-"
+
+# Bytes copied at a time when streaming an output to a descriptor
+COPY_CHUNK = 1024 * 1024
+
+
+def _state_defaults():
+    return {"head": 0, "bytes": 0, "swept": 0.0}
+
+
+@contextmanager
+def _locked_state(download_dir):
+    """
+    Hold the ledger lock and yield the mutable sweep state, which is saved
+    on exit. Without fcntl (Windows) there is no lock and nothing is
+    tracked; the yielded state is None.
+    """
+    if fcntl is None:
+        yield None
+        return
+    os.makedirs(download_dir, exist_ok=True)
+    fd = os.open(os.path.join(download_dir, STATE_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            state = json.loads(f.read() or "{}")
+        except ValueError:
+            state = {}
+        state = {**_state_defaults(), **state}
+        yield state
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state))
+
+
+def _append_ledger(download_dir, created, job_id, size=None):
+    """Append a job's published size, or with size None its placeholder."""
+    with _locked_state(download_dir) as state:
+        if state is None:
+            return
+        with open(os.path.join(download_dir, LEDGER_NAME), "a") as ledger:
+            ledger.write(f"{created:.3f} {job_id} {PLACEHOLDER if size is None else size}\n")
+        state["bytes"] += size or 0
+
+
+def sweep(download_dir=None, now=None):
+    """
+    Drop jobs from the head of the ledger that are past OUTPUT_TTL, or the
+    oldest ones while published bytes exceed OUTPUT_QUOTA. Over quota, a
+    job's directory only goes with its published entry, the last one it
+    writes; the placeholder written when it started only reclaims it once
+    expired, so a running job is never removed for quota.
+    Returns counts of what was removed.
+    """
+    download_dir = download_dir or DOWNLOAD_DIR
+    now = time.time() if now is None else now
+    removed = set()
+    freed = 0
+
+    with _locked_state(download_dir) as state:
+        if state is None:
+            return {"jobsRemoved": 0, "bytesFreed": 0, "bytesKept": 0}
+        state["swept"] = now
+        ledger_path = os.path.join(download_dir, LEDGER_NAME)
+        try:
+            ledger = open(ledger_path, "r+")
+        except FileNotFoundError:
+            return {"jobsRemoved": 0, "bytesFreed": 0, "bytesKept": state["bytes"]}
+
+        with ledger:
+            # Entries deferred below go to the end; they wait for a later sweep
+            end = os.fstat(ledger.fileno()).st_size
+            deferred = []
+            ledger.seek(state["head"])
+            while ledger.tell() < end:
+                line = ledger.readline()
+                if not line.endswith("\n"):
+                    break
+                created, job_id, size = line.split()
+                age = now - float(created)
+                expired = age > OUTPUT_TTL
+                over_quota = state["bytes"] > OUTPUT_QUOTA and age > MIN_JOB_AGE
+                if not (expired or over_quota):
+                    break
+                if size == PLACEHOLDER:
+                    size = 0
+                    if not expired:
+                        # The job may still be running and holds no published
+                        # bytes; keep its entry so the TTL still reclaims it
+                        deferred.append(line)
+                        state["head"] = ledger.tell()
+                        continue
+                # Ledger entries come from our own writes; never follow a path out
+                if job_id not in removed and os.sep not in job_id and job_id[0] != ".":
+                    shutil.rmtree(os.path.join(download_dir, job_id), ignore_errors=True)
+                    removed.add(job_id)
+                state["bytes"] = max(0, state["bytes"] - int(size))
+                freed += int(size)
+                state["head"] = ledger.tell()
+
+            if deferred:
+                ledger.seek(0, os.SEEK_END)
+                ledger.writelines(deferred)
+                ledger.flush()
+
+            if state["head"] > COMPACT_BYTES:
+                ledger.seek(state["head"])
+                rest = ledger.read()
+                tmp_path = ledger_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(rest)
+                os.replace(tmp_path, ledger_path)
+                state["head"] = 0
+
+        return {"jobsRemoved": len(removed), "bytesFreed": freed, "bytesKept": state["bytes"]}
+
+
+def _sweep_due(download_dir):
+    try:
+        with open(os.path.join(download_dir, STATE_NAME)) as f:
+            swept = json.loads(f.read() or "{}").get("swept", 0)
+    except (OSError, ValueError):
+        swept = 0
+    return time.time() - swept > SWEEP_INTERVAL
+
+
+class OutputJob:
+    """
+    The output directory of one tool run.
+
+        job = OutputJob("rotate")
+        with job.open("rotated.pdf") as f:        # staged, then published
+            writer.write(f)
+        output_path = job.output
+
+    Tools that need a path use staged() and publish() instead. Creating a
+    job starts a sweep in a background thread when one is due.
+
+    When PDF_OUTPUT_FD is set (see pipe_io) outputs are streamed to that
+    descriptor: open() buffers in memory, publish() copies the staged file
+    out, and the job directory is only created if a tool asks for a path.
+    """
+
+    def __init__(self, kind="job", download_dir=None):
+        self.kind = kind
+        self.download_dir = download_dir or DOWNLOAD_DIR
+        self.created = time.time()
+        self.directory = None
+        self.output = None
+        self.output_size = None
+        self.fd = output_fd()
+        if self.fd is None:
+            self._create_directory()
+
+    def _create_directory(self):
+        if self.directory is not None:
+            return
+        os.makedirs(self.download_dir, exist_ok=True)
+        while True:
+            stamp = datetime.fromtimestamp(self.created).strftime("%Y%m%d_%H%M%S")
+            self.job_id = f"{self.kind}_{stamp}_{secrets.token_hex(4)}"
+            directory = os.path.join(self.download_dir, self.job_id)
+            try:
+                os.mkdir(directory)
+                break
+            except FileExistsError:
+                continue
+        self.directory = directory
+        _append_ledger(self.download_dir, self.created, self.job_id)
+
+        if fcntl is not None and _sweep_due(self.download_dir):
+            threading.Thread(target=sweep, args=(self.download_dir,)).start()
+
+    def path(self, filename):
+        """Final path of an output in this job."""
+        self._create_directory()
+        return os.path.join(self.directory, os.path.basename(filename))
+
+    def staged(self, filename):
+        """Temporary path to write an output to before it is published."""
+        self._create_directory()
+        return os.path.join(self.directory, PART_PREFIX + os.path.basename(filename))
+
+    def staging_dir(self):
+        """
+        Hidden folder for tools that choose their own output names (e.g.
+        LibreOffice); publish() moves files from it into the job directory.
+        """
+        self._create_directory()
+        path = os.path.join(self.directory, PART_PREFIX + "staging")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def publish(self, staged_path):
+        """
+        Atomically rename a staged output into place; returns its final
+        path (or "fd:N" when streaming, after copying the file out).
+        """
+        if self.fd is not None:
+            with open(staged_path, "rb") as f:
+                size = self._send(f)
+            self.discard()
+            return self._published(f"fd:{self.fd}", size)
+
+        name = os.path.basename(staged_path)
+        if name.startswith(PART_PREFIX):
+            name = name[len(PART_PREFIX) :]
+        final_path = self.path(name)
+        os.replace(staged_path, final_path)
+        size = os.path.getsize(final_path)
+        _append_ledger(self.download_dir, self.created, self.job_id, size)
+        return self._published(final_path, size)
+
+    @contextmanager
+    def open(self, filename):
+        """
+        Binary file object for an output, published when the block exits
+        cleanly and dropped if it raises. Sets output and output_size.
+        """
+        if self.fd is not None:
+            # pypdf needs a seekable stream, so buffer before sending
+            buffer = io.BytesIO()
+            yield buffer
+            buffer.seek(0)
+            self._published(f"fd:{self.fd}", self._send(buffer))
+            # Drop any scratch files the tool staged along the way
+            self.discard()
+            return
+
+        staged_path = self.staged(filename)
+        try:
+            with open(staged_path, "wb") as f:
+                yield f
+        except BaseException:
+            try:
+                os.remove(staged_path)
+            except OSError:
+                pass
+            raise
+        self.publish(staged_path)
+
+    def _send(self, source):
+        with os.fdopen(self.fd, "wb", closefd=False) as out:
+            size = 0
+            while True:
+                chunk = source.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                out.write(chunk)
+                size += len(chunk)
+        return size
+
+    def _published(self, output, size):
+        self.output = output
+        self.output_size = size
+        return output
+
+    def discard(self):
+        """Remove the job directory and everything in it."""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "sweep":
+        print(json.dumps({"success": False, "error": "Usage: output_manager.py sweep"}))
+        sys.exit(1)
+
+    try:
+        result = {"success": True, **sweep()}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    print(json.dumps(result))
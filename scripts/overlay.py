@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Overlays shared by the stamping tools.
+A stamp (see stamp.py) becomes a Form XObject, and each page only gains a
+reference to it plus a shared "q ... cm /Name Do Q" invocation; page
+content is never decoded or re-encoded. Stamps that depend only on the
+page geometry (borders, watermarks) are built once per distinct page size,
+so a long document with three page sizes carries three forms. Fonts,
+opacity states and images are written once per document however many
+stamps use them.
+"""
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+    )
+
+from content_stream import format_number
+from stamp import Stamp, StampObjects
+
+# Decimal places kept in the coordinates of stamp invocations
+INVOCATION_PRECISION = 3
+
+# Form content shorter than this is stored unfiltered
+MIN_DEFLATE_BYTES = 128
+
+
+def page_geometry(page):
+    """(width, height) of a page's media box, rounded for use as a cache key."""
+    box = page.mediabox
+    return round(float(box.width), 2), round(float(box.height), 2)
+
+
+def _content_stream(writer, data):
+    # Invocations are a few bytes; deflating would only make them bigger
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+class FormStamper:
+    """
+    Stamps pages of writer with Form XObjects.
+
+        stamper = FormStamper(writer, draw_watermark, "/Wm")
+        for page in reader.pages:
+            stamper.stamp(writer.add_page(page))
+
+    draw(stamp, width, height, *key) fills a Stamp for a page size; its
+    forms are cached by size and key. apply() places a one-off Stamp
+    instead (e.g. a page number). The page's own content is wrapped in q/Q
+    by shared streams, so whatever graphics state it leaves behind cannot
+    move the stamp.
+    """
+
+    def __init__(self, writer, draw=None, prefix="/Stamp"):
+        self.writer = writer
+        self.draw = draw
+        self.prefix = prefix
+        self.objects = StampObjects(writer)
+        self.forms = {}
+        self.invocations = {}
+        self.save_state = None
+
+    def add_form(self, stamp, width, height):
+        """Write a Stamp as a Form XObject with the given bounding box."""
+        data = stamp.content()
+        form = DecodedStreamObject()
+        form.set_data(data)
+        if len(data) >= MIN_DEFLATE_BYTES:
+            form = form.flate_encode()
+        form[NameObject("/Type")] = NameObject("/XObject")
+        form[NameObject("/Subtype")] = NameObject("/Form")
+        form[NameObject("/BBox")] = ArrayObject(
+            [FloatObject(0), FloatObject(0), FloatObject(width), FloatObject(height)]
+        )
+        form[NameObject("/Resources")] = stamp.resources(self.objects)
+        return self.writer._add_object(form)
+
+    def form(self, width, height, *key):
+        """Indirect reference to the drawn form for a page size, built on first use."""
+        cache_key = (width, height) + key
+        ref = self.forms.get(cache_key)
+        if ref is None:
+            stamp = Stamp()
+            self.draw(stamp, width, height, *key)
+            ref = self.add_form(stamp, width, height)
+            self.forms[cache_key] = ref
+        return ref
+
+    def _resource_name(self, page, ref, private=False):
+        """
+        Name the form is registered under in the page's /XObject resources.
+        private gives the page its own copies of the dictionaries first, so
+        one-off forms do not pile up in resources shared between pages.
+        """
+        resources = page["/Resources"].get_object() if "/Resources" in page else None
+        if resources is None or private:
+            resources = DictionaryObject(resources or {})
+            page[NameObject("/Resources")] = resources
+        xobjects = resources["/XObject"].get_object() if "/XObject" in resources else None
+        if xobjects is None or private:
+            xobjects = DictionaryObject(xobjects or {})
+            resources[NameObject("/XObject")] = xobjects
+        n = 0
+        while True:
+            name = f"{self.prefix}{n}"
+            existing = xobjects.raw_get(name) if name in xobjects else None
+            if existing is None:
+                xobjects[NameObject(name)] = ref
+                return name
+            if existing == ref:
+                return name
+            n += 1
+
+    def _place(self, page, ref, private=False):
+        box = page.mediabox
+        x0, y0 = float(box.left), float(box.bottom)
+        name = self._resource_name(page, ref, private)
+
+        # Keyed without the form, so one-off stamps share their invocation
+        invocation_key = (x0, y0, name)
+        invocation = self.invocations.get(invocation_key)
+        if invocation is None:
+            cm = " ".join(format_number(v, INVOCATION_PRECISION) for v in (x0, y0))
+            invocation = _content_stream(
+                self.writer, f"Q q 1 0 0 1 {cm} cm {name} Do Q".encode("latin-1")
+            )
+            self.invocations[invocation_key] = invocation
+        if self.save_state is None:
+            self.save_state = _content_stream(self.writer, b"q")
+
+        contents = page.raw_get("/Contents") if "/Contents" in page else None
+        existing = contents.get_object() if contents is not None else None
+        if isinstance(existing, ArrayObject):
+            parts = list(existing)
+        elif contents is not None:
+            parts = [contents]
+        else:
+            parts = []
+        page[NameObject("/Contents")] = ArrayObject([self.save_state, *parts, invocation])
+        return page
+
+    def stamp(self, page, *key):
+        """Stamp a page that already belongs to the writer with its size's form."""
+        return self._place(page, self.form(*page_geometry(page), *key))
+
+    def apply(self, page, stamp):
+        """Stamp a writer page with a one-off Stamp."""
+        if not stamp.operations:
+            return page
+        return self._place(page, self.add_form(stamp, *page_geometry(page)), private=True)
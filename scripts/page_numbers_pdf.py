@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 """
 Add page numbers to a PDF file.
-Usage: python page_numbers_pdf.py <input_file> [position] [start_number]
+Usage: python page_numbers_pdf.py <input_file> [position] [start_number] [template]
 Position: bottom-center, bottom-left, bottom-right, top-center, top-left, top-right
+Template: label text with {page}, {total}, {bates} and {filename} fields,
+          e.g. "Page {page} of {total}" (default "{page}")
 Output: JSON with result
 """
 
 import sys
 import os
 import json
-import tempfile
 from datetime import datetime
 
 try:
@@ -18,89 +19,42 @@ except ImportError:
     from PyPDF2 import PdfReader, PdfWriter
 
 try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.colors import black
+    from numbering_engine import DEFAULT_TEMPLATE, check_template, number_pages
 except ImportError:
     print(json.dumps({"success": False, "error": "Missing dependency: reportlab"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
-def create_page_number(num, position, page_width, page_height):
-    """Create a page number PDF."""
-    temp_dir = tempfile.gettempdir()
-    temp_path = os.path.join(temp_dir, f"page_num_{num}.pdf")
-
-    c = canvas.Canvas(temp_path, pagesize=(page_width, page_height))
-    c.setFont("Helvetica", 12)
-    c.setFillColor(black)
-
-    text = str(num)
-    margin = 30
-
-    # Position mapping
-    positions = {
-        "bottom-center": (page_width / 2, margin),
-        "bottom-left": (margin, margin),
-        "bottom-right": (page_width - margin - len(text) * 7, margin),
-        "top-center": (page_width / 2, page_height - margin),
-        "top-left": (margin, page_height - margin),
-        "top-right": (page_width - margin - len(text) * 7, page_height - margin),
-    }
-
-    x, y = positions.get(position, (page_width / 2, margin))
-    c.drawCentredString(x, y, text)
-    c.save()
-
-    return temp_path
-
-
-def add_page_numbers(input_path, position="bottom-center", start_number="1"):
+def add_page_numbers(
+    input_path, position="bottom-center", start_number="1", template=DEFAULT_TEMPLATE
+):
     """Add page numbers to PDF."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
         start_num = int(start_number)
-        reader = PdfReader(input_path)
+        check_template(template)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
-        total_pages = len(reader.pages)
-
-        for i, page in enumerate(reader.pages):
-            page_num = start_num + i
-            page_width = float(page.mediabox.width)
-            page_height = float(page.mediabox.height)
-
-            # Create page number
-            num_path = create_page_number(page_num, position, page_width, page_height)
-            num_reader = PdfReader(num_path)
-
-            # Merge page number onto page
-            page.merge_page(num_reader.pages[0])
-            writer.add_page(page)
-
-            # Clean up
-            os.remove(num_path)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        # Stamp each page's label; {bates} counts from start_number too
+        base_name = os.path.splitext(input_name(input_path))[0]
+        options = {"template": template, "position": position}
+        number_pages(reader, writer, options, start_num, start_num, base_name)
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
         output_filename = f"{base_name}_numbered_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
+        job = OutputJob("page_numbers")
 
         # Write PDF with page numbers
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {"success": True, "output": output_path}
 
@@ -116,6 +70,7 @@ if __name__ == "__main__":
     input_path = sys.argv[1]
     position = sys.argv[2] if len(sys.argv) > 2 else "bottom-center"
     start_number = sys.argv[3] if len(sys.argv) > 3 else "1"
+    template = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else DEFAULT_TEMPLATE
 
-    result = add_page_numbers(input_path, position, start_number)
+    result = add_page_numbers(input_path, position, start_number, template)
     print(json.dumps(result))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Page-selection expressions shared by the page tools.
+Compiles expressions such as "1-3,7,10-", "odd", "last-5-last" or
+"every 3rd" into a handful of ranges, so "1-1000000" costs as little as
+"1" and every tool parses selections the same way.
+
+Grammar (comma separated, case-insensitive, 1-based pages):
+    7            a single page
+    3-9          an inclusive range (reversed ranges are normalized)
+    10- / -4     open ranges to the last / from the first page
+    last, last-2 the last page, or counted back from it; usable anywhere
+                 a number is ("last-5-last")
+    all, odd, even
+    every 3rd    every 3rd page (3, 6, 9, ...); "every 3" also works
+Pages outside 1..total are dropped.
+"""
+
+import re
+from bisect import bisect_right
+from heapq import merge
+from math import lcm
+
+ENDPOINT = r"(?:\d+|last(?:\s*-\s*\d+)?)"
+SINGLE_RE = re.compile(rf"^({ENDPOINT})$")
+RANGE_RE = re.compile(rf"^({ENDPOINT})?\s*-\s*({ENDPOINT})?$")
+EVERY_RE = re.compile(r"^every\s+(\d+)(?:st|nd|rd|th)?(?:\s+pages?)?$")
+
+
+class PageSelection:
+    """
+    A set of 1-based pages stored as ranges. Step-1 ranges are kept sorted
+    and disjoint (binary-searched); stepped ranges from odd/even/every are
+    kept as they are, so membership costs O(log k + s) for k intervals and
+    s stepped ranges.
+    """
+
+    def __init__(self, ranges, total_pages):
+        self.total_pages = total_pages
+        intervals = []
+        self.stepped = []
+        for r in ranges:
+            r = _clip(r, total_pages)
+            if len(r) == 0:
+                continue
+            if r.step == 1 or len(r) == 1:
+                intervals.append((r[0], r[-1] + 1))
+            else:
+                self.stepped.append(r)
+
+        # Merge overlapping and touching intervals
+        intervals.sort()
+        merged = []
+        for start, stop in intervals:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        self.intervals = [range(start, stop) for start, stop in merged]
+        self._starts = [r.start for r in self.intervals]
+
+    def __contains__(self, page):
+        i = bisect_right(self._starts, page) - 1
+        if i >= 0 and page in self.intervals[i]:
+            return True
+        return any(page in r for r in self.stepped)
+
+    def __iter__(self):
+        """Pages in ascending order, each once."""
+        if not self.stepped:
+            for r in self.intervals:
+                yield from r
+            return
+        last = None
+        for page in merge(*self.intervals, *self.stepped):
+            if page != last:
+                yield page
+                last = page
+
+    def __len__(self):
+        if not self.stepped:
+            return sum(len(r) for r in self.intervals)
+        return sum(len(r) for r in self._runs(True))
+
+    def __bool__(self):
+        return bool(self.intervals) or bool(self.stepped)
+
+    def indices(self):
+        """0-based page indices in ascending order."""
+        return (page - 1 for page in self)
+
+    def complement(self):
+        """The pages of the document that are not selected."""
+        return PageSelection(self._runs(False), self.total_pages)
+
+    def _segments(self):
+        """
+        Split 1..total_pages at every range boundary into (start, stop,
+        covered, active): whether an interval covers the whole piece, and
+        the stepped ranges that span it.
+        """
+        bounds = {1, self.total_pages + 1}
+        for r in (*self.intervals, *self.stepped):
+            bounds.update((r.start, r.stop))
+        bounds = sorted(b for b in bounds if 1 <= b <= self.total_pages + 1)
+        for start, stop in zip(bounds, bounds[1:]):
+            i = bisect_right(self._starts, start) - 1
+            covered = i >= 0 and start in self.intervals[i]
+            active = [r for r in self.stepped if r.start <= start and stop <= r.stop]
+            yield start, stop, covered, active
+
+    def _runs(self, selected):
+        """
+        Ranges, stepped where the selection is, holding exactly the
+        selected (or, with selected False, the unselected) pages. Within a
+        segment the selection repeats with the lcm of the active steps, so
+        each segment takes at most one range per page of that period.
+        """
+        for start, stop, covered, active in self._segments():
+            if covered or not active:
+                if covered == selected:
+                    yield range(start, stop)
+                continue
+            period = lcm(*(r.step for r in active))
+            for page in range(start, min(start + period, stop)):
+                if any(page in r for r in active) == selected:
+                    yield range(page, stop, period)
+
+    def __repr__(self):
+        parts = [f"{r.start}-{r.stop - 1}" for r in self.intervals]
+        parts += [f"{r.start}-{r.stop - 1}/{r.step}" for r in self.stepped]
+        return f"PageSelection({', '.join(parts)} of {self.total_pages})"
+
+
+def _clip(r, total_pages):
+    """Restrict an ascending range to pages 1..total_pages."""
+    start = r.start
+    if start < 1:
+        start += -(-(1 - start) // r.step) * r.step
+    return range(start, min(r.stop, total_pages + 1), r.step)
+
+
+def _endpoint(text, total_pages):
+    text = text.replace(" ", "")
+    if text.startswith("last"):
+        back = text[5:] if len(text) > 4 else "0"
+        return total_pages - int(back)
+    return int(text)
+
+
+def _compile_term(term, total_pages):
+    if term == "all":
+        return range(1, total_pages + 1)
+    if term == "odd":
+        return range(1, total_pages + 1, 2)
+    if term == "even":
+        return range(2, total_pages + 1, 2)
+
+    match = EVERY_RE.match(term)
+    if match:
+        step = int(match.group(1))
+        if step < 1:
+            raise ValueError(f"Invalid page selection: {term!r}")
+        return range(step, total_pages + 1, step)
+
+    match = SINGLE_RE.match(term)
+    if match:
+        page = _endpoint(match.group(1), total_pages)
+        return range(page, page + 1)
+
+    match = RANGE_RE.match(term)
+    if match and (match.group(1) or match.group(2)):
+        start = _endpoint(match.group(1), total_pages) if match.group(1) else 1
+        end = _endpoint(match.group(2), total_pages) if match.group(2) else total_pages
+        if start > end:
+            start, end = end, start
+        return range(start, end + 1)
+
+    raise ValueError(f"Invalid page selection: {term!r}")
+
+
+def parse_pages(expression, total_pages):
+    """
+    Compile a page-selection expression for a document of total_pages.
+    Also accepts a JSON-style list ("[1, 3, 5]") or a list of ints.
+    Raises ValueError for terms it does not understand.
+    """
+    if isinstance(expression, (list, tuple)):
+        ranges = [range(int(p), int(p) + 1) for p in expression]
+        return PageSelection(ranges, total_pages)
+
+    text = str(expression).strip().lower().strip("[]")
+    ranges = []
+    for term in text.split(","):
+        term = term.strip()
+        if term:
+            ranges.append(_compile_term(term, total_pages))
+    return PageSelection(ranges, total_pages)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Image XObject helpers shared by the PDF tools.
+Finds the image and form XObjects used by a page and the size they are
+drawn at, decodes 8-bit images into NumPy arrays and writes converted pixels back into the same object.
+"""
+
+import io
+import math
+import zlib
+
+import numpy as np
+from PIL import Image
+
+try:
+    from pypdf.generic import ArrayObject, NameObject, NumberObject
+except ImportError:
+    from PyPDF2.generic import ArrayObject, NameObject, NumberObject
+
+from content_stream import IDENTITY_MATRIX, replace_stream_data, tokenize
+
+# Text encodings wrapped around the real codec
+ASCII_FILTERS = ("/ASCII85Decode", "/A85", "/ASCIIHexDecode", "/AHx")
+
+# Codecs whose pixels we cannot decode to a plain 8-bit buffer
+UNSUPPORTED_FILTERS = ("/JPXDecode", "/JBIG2Decode", "/CCITTFaxDecode", "/CCF")
+
+DCT_FILTERS = ("/DCTDecode", "/DCT")
+
+COMPONENTS = {"gray": 1, "rgb": 3, "cmyk": 4}
+
+DEVICE_SPACES = {
+    "/DeviceGray": "gray",
+    "/G": "gray",
+    "/DeviceRGB": "rgb",
+    "/RGB": "rgb",
+    "/DeviceCMYK": "cmyk",
+    "/CMYK": "cmyk",
+}
+
+FAMILY_SPACES = {
+    "gray": "/DeviceGray",
+    "rgb": "/DeviceRGB",
+    "cmyk": "/DeviceCMYK",
+}
+
+
+def stream_filters(stream):
+    """The stream's filters as a list of names."""
+    filters = stream.get("/Filter")
+    if filters is None:
+        return []
+    filters = filters.get_object()
+    if isinstance(filters, ArrayObject):
+        return [str(f) for f in filters]
+    return [str(filters)]
+
+
+def codec_filter(stream):
+    """The filter that actually compresses the data, skipping ASCII wrappers."""
+    for name in stream_filters(stream):
+        if name not in ASCII_FILTERS:
+            return name
+    return None
+
+
+def colorspace_family(colorspace, resources=None):
+    """
+    Classify a colour space as "gray", "rgb", "cmyk" or "indexed".
+    Names are looked up in the resources' /ColorSpace dictionary.
+    Returns None for spaces that are left alone (Separation, Pattern, Lab...).
+    """
+    if colorspace is None:
+        return None
+    colorspace = colorspace.get_object()
+
+    if isinstance(colorspace, str):
+        name = str(colorspace)
+        if name in DEVICE_SPACES:
+            return DEVICE_SPACES[name]
+        if resources is not None:
+            named = resources.get_object().get("/ColorSpace")
+            if named is not None and name in named.get_object():
+                return colorspace_family(named.get_object()[name])
+        return None
+
+    if isinstance(colorspace, ArrayObject) and colorspace:
+        kind = str(colorspace[0])
+        if kind == "/ICCBased":
+            n = colorspace[1].get_object().get("/N")
+            return {1: "gray", 3: "rgb", 4: "cmyk"}.get(int(n) if n else 0)
+        if kind == "/CalRGB":
+            return "rgb"
+        if kind == "/CalGray":
+            return "gray"
+        if kind in ("/Indexed", "/I"):
+            return "indexed"
+        if kind in DEVICE_SPACES:
+            return DEVICE_SPACES[kind]
+    return None
+
+
+def iter_xobjects(resources, seen):
+    """
+    Yield (name, xobject, resources) for every XObject reachable from a
+    resources dictionary, descending into Form XObjects. Objects already in
+    `seen` (a set of id numbers) are skipped so shared XObjects are visited once.
+    """
+    if resources is None:
+        return
+    resources = resources.get_object()
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in list(xobjects.keys()):
+        ref = xobjects.raw_get(name)
+        key = getattr(ref, "idnum", None)
+        if key is None:
+            key = id(ref)
+        if key in seen:
+            continue
+        seen.add(key)
+        xobject = ref.get_object()
+        yield name, xobject, resources
+        if xobject.get("/Subtype") == "/Form":
+            yield from iter_xobjects(xobject.get("/Resources"), seen)
+
+
+def image_family(image):
+    """Colour family of an image XObject (see colorspace_family)."""
+    if image.get("/ImageMask"):
+        return None
+    return colorspace_family(image.get("/ColorSpace"))
+
+
+def decode_image(image, family):
+    """
+    Decode an 8-bit image XObject into a float32 array of shape (h, w, n)
+    with values in 0..1 after applying its /Decode array.
+    Returns None for images that cannot be decoded losslessly here.
+    """
+    if family not in COMPONENTS:
+        return None
+    bits = image.get("/BitsPerComponent")
+    if bits is not None and int(bits) != 8:
+        return None
+    codec = codec_filter(image)
+    if codec in UNSUPPORTED_FILTERS:
+        return None
+
+    width = int(image["/Width"])
+    height = int(image["/Height"])
+    n = COMPONENTS[family]
+    data = image.get_data()
+
+    if codec in DCT_FILTERS:
+        pil_image = Image.open(io.BytesIO(data))
+        pixels = np.asarray(pil_image, dtype=np.uint8)
+        if pil_image.mode == "CMYK" and "adobe" in pil_image.info:
+            # Pillow un-inverts Adobe CMYK; the PDF /Decode expects raw samples
+            pixels = 255 - pixels
+    else:
+        if len(data) < width * height * n:
+            return None
+        pixels = np.frombuffer(data, dtype=np.uint8, count=width * height * n)
+
+    pixels = pixels.reshape(height, width, -1)
+    if pixels.shape[2] != n:
+        return None
+
+    values = pixels.astype(np.float32) / 255.0
+    decode = image.get("/Decode")
+    if decode is not None:
+        decode = np.array([float(v) for v in decode.get_object()], dtype=np.float32)
+        if decode.size == 2 * n:
+            low = decode[0::2]
+            high = decode[1::2]
+            values = low + values * (high - low)
+    return values
+
+
+def to_uint8(values):
+    """Convert 0..1 float pixels to a contiguous uint8 buffer."""
+    return np.ascontiguousarray(np.clip(values * 255.0 + 0.5, 0, 255).astype(np.uint8))
+
+
+def replace_image(image, pixels, family, jpeg_quality=None, level=6):
+    """
+    Write uint8 pixels (h, w) or (h, w, n) back into an image XObject.
+    JPEG-encoded images stay JPEG at jpeg_quality; others are Flate-encoded.
+    """
+    height, width = pixels.shape[:2]
+    was_jpeg = codec_filter(image) in DCT_FILTERS
+
+    if was_jpeg and jpeg_quality is not None and family in ("gray", "rgb"):
+        if family == "gray":
+            pil_image = Image.fromarray(pixels.reshape(height, width))
+        else:
+            pil_image = Image.fromarray(pixels.reshape(height, width, 3))
+        buffer = io.BytesIO()
+        pil_image.save(buffer, "JPEG", quality=jpeg_quality, optimize=True)
+        replace_stream_data(image, buffer.getvalue(), "/DCTDecode")
+    else:
+        replace_stream_data(image, zlib.compress(pixels.tobytes(), level), "/FlateDecode")
+
+    image[NameObject("/ColorSpace")] = NameObject(FAMILY_SPACES[family])
+    image[NameObject("/BitsPerComponent")] = NumberObject(8)
+    image[NameObject("/Width")] = NumberObject(width)
+    image[NameObject("/Height")] = NumberObject(height)
+    if "/Decode" in image:
+        del image["/Decode"]
+
+
+def _multiply(m, n):
+    """Concatenate two PDF matrices (m applied first, then n)."""
+    return [
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def _walk_placements(data, resources, ctm, sizes, depth):
+    try:
+        operations = tokenize(data)
+    except (ValueError, IndexError):
+        return
+    xobjects = {}
+    if resources is not None:
+        xobjects = resources.get_object().get("/XObject") or {}
+        xobjects = xobjects.get_object() if xobjects else {}
+    stack = []
+
+    for operands, operator in operations:
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            ctm = stack.pop() if stack else ctm
+        elif operator == b"cm" and len(operands) == 6:
+            try:
+                ctm = _multiply([float(t[1]) for t in operands], ctm)
+            except ValueError:
+                continue
+        elif operator == b"Do" and operands and operands[0][0] == "name":
+            name = operands[0][1].decode("latin-1")
+            if name not in xobjects:
+                continue
+            ref = xobjects.raw_get(name)
+            xobject = ref.get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                key = getattr(ref, "idnum", id(xobject))
+                width = math.hypot(ctm[0], ctm[1])
+                height = math.hypot(ctm[2], ctm[3])
+                old = sizes.get(key, (0.0, 0.0))
+                sizes[key] = (max(old[0], width), max(old[1], height))
+            elif subtype == "/Form" and depth < 16:
+                matrix = xobject.get("/Matrix")
+                form_ctm = ctm
+                if matrix is not None:
+                    form_ctm = _multiply([float(v) for v in matrix], ctm)
+                _walk_placements(
+                    xobject.get_data(), xobject.get("/Resources"), form_ctm, sizes, depth + 1
+                )
+
+
+def image_placements(page, sizes=None):
+    """
+    Largest size, in points, at which each image XObject is drawn on a page.
+    Returns {image id number: (width, height)}; pass `sizes` to accumulate
+    across pages. Images drawn only from patterns or annotations are absent.
+    """
+    if sizes is None:
+        sizes = {}
+    if page.get("/Contents") is None:
+        return sizes
+    _walk_placements(
+        page.get_contents().get_data(),
+        page.get("/Resources"),
+        list(IDENTITY_MATRIX),
+        sizes,
+        0,
+    )
+    return sizes
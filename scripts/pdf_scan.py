@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+"""
+Lightweight PDF structure scanner shared by the PDF tools.
+Reads the cross-reference data and object headers of a PDF straight from a
+memory map, without decoding content, image or font streams. Only the
+structural streams (xref streams and object streams) are inflated, because
+modern files keep their page and font dictionaries inside them. Objects
+are parsed from memoryview slices of the map, so scanning never copies
+more than the structural streams it inflates.
+"""
+
+import re
+import zlib
+from contextlib import ExitStack
+
+from pipe_io import mapped_input
+
+WHITESPACE = b" \t\n\r\x0c\x00"
+DELIMITERS = b"()<>[]{}/%"
+
+OBJ_HEADER_RE = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+REF_RE = re.compile(rb"(\d+)\s+(\d+)\s+R(?![A-Za-z0-9])")
+NUMBER_RE = re.compile(rb"^[+-]?(\d+\.?\d*|\.\d+)$")
+
+# How far to look for an object's dictionary before giving up
+MAX_HEADER_BYTES = 1024 * 1024
+
+# Inflated bytes allowed for one xref or object stream
+MAX_STRUCTURAL_BYTES = 64 * 1024 * 1024
+
+# Output produced per decompress call while inflating under a limit
+INFLATE_CHUNK = 1024 * 1024
+
+
+class InflateLimitError(Exception):
+    """A stream inflated past the limit it was decoded under."""
+
+    def __init__(self, limit):
+        super().__init__(f"Stream inflates past {limit} bytes")
+        self.limit = limit
+
+
+class Ref(tuple):
+    """An indirect reference (object number, generation)."""
+
+    __slots__ = ()
+
+    def __new__(cls, num, gen=0):
+        return tuple.__new__(cls, (num, gen))
+
+    @property
+    def num(self):
+        return self[0]
+
+
+def _is_regular(byte):
+    return byte not in WHITESPACE and byte not in DELIMITERS
+
+
+def _skip_whitespace(data, i):
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c in WHITESPACE:
+            i += 1
+        elif c == 0x25:  # %
+            while i < n and data[i] not in b"\r\n":
+                i += 1
+        else:
+            break
+    return i
+
+
+def _read_literal_end(data, i):
+    depth = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c == 0x5C:
+            i += 2
+            continue
+        if c == 0x28:
+            depth += 1
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise ValueError("Unterminated literal string")
+
+
+def parse_object(data, i=0):
+    """
+    Parse one PDF object from data starting at i.
+    Returns (value, next_index). Dictionaries become dicts keyed by name
+    (including the leading slash), arrays become lists, references become
+    Ref, names stay str, strings stay bytes and numbers become int/float.
+    """
+    i = _skip_whitespace(data, i)
+    c = data[i]
+
+    if data[i : i + 2] == b"<<":
+        result = {}
+        i = _skip_whitespace(data, i + 2)
+        while data[i : i + 2] != b">>":
+            key, i = parse_object(data, i)
+            value, i = parse_object(data, i)
+            result[key] = value
+            i = _skip_whitespace(data, i)
+        return result, i + 2
+
+    if c == 0x5B:  # [
+        items = []
+        i = _skip_whitespace(data, i + 1)
+        while data[i] != 0x5D:
+            item, i = parse_object(data, i)
+            items.append(item)
+            i = _skip_whitespace(data, i)
+        return items, i + 1
+
+    if c == 0x2F:  # /
+        end = i + 1
+        while end < len(data) and _is_regular(data[end]):
+            end += 1
+        return bytes(data[i:end]).decode("latin-1"), end
+
+    if c == 0x28:  # (
+        end = _read_literal_end(data, i)
+        return bytes(data[i:end]), end
+
+    if c == 0x3C:  # <
+        # Hex strings are short; scanning also works on memoryviews
+        end = i + 1
+        while data[end] != 0x3E:
+            end += 1
+        return bytes(data[i : end + 1]), end + 1
+
+    end = i
+    while end < len(data) and _is_regular(data[end]):
+        end += 1
+    word = bytes(data[i:end])
+    if not word:
+        raise ValueError(f"Unexpected byte {chr(c)!r} at {i}")
+
+    if NUMBER_RE.match(word):
+        # An integer may start an indirect reference "num gen R"
+        if b"." not in word:
+            match = REF_RE.match(data, i)
+            if match and match.start() == i:
+                return Ref(int(match.group(1)), int(match.group(2))), match.end()
+            return int(word), end
+        return float(word), end
+
+    if word == b"true":
+        return True, end
+    if word == b"false":
+        return False, end
+    if word == b"null":
+        return None, end
+    # Keywords such as "stream", "endobj" or "R"; caller decides
+    return word, end
+
+
+STRING_ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+    ord("("): b"(",
+    ord(")"): b")",
+    ord("\\"): b"\\",
+}
+
+
+def decode_string(raw):
+    """Bytes of a parsed literal "(...)" or hex "<...>" string."""
+    if raw.startswith(b"<"):
+        digits = re.sub(rb"[^0-9A-Fa-f]", b"", raw)
+        if len(digits) % 2:
+            digits += b"0"
+        return bytes.fromhex(digits.decode("ascii"))
+
+    body = raw[1:-1]
+    out = bytearray()
+    i = 0
+    n = len(body)
+    while i < n:
+        c = body[i]
+        if c != 0x5C or i + 1 >= n:
+            out.append(c)
+            i += 1
+            continue
+        nxt = body[i + 1]
+        if nxt in STRING_ESCAPES:
+            out += STRING_ESCAPES[nxt]
+            i += 2
+        elif 0x30 <= nxt <= 0x37:
+            j = i + 1
+            while j < min(i + 4, n) and 0x30 <= body[j] <= 0x37:
+                j += 1
+            out.append(int(body[i + 1 : j], 8) & 0xFF)
+            i = j
+        elif nxt in b"\r\n":
+            # Line continuation
+            i += 2
+            if nxt == 0x0D and i < n and body[i] == 0x0A:
+                i += 1
+        else:
+            out.append(nxt)
+            i += 2
+    return bytes(out)
+
+
+def decode_text(raw):
+    """A parsed text string (outline titles, metadata) as str."""
+    data = decode_string(raw)
+    if data.startswith(b"\xfe\xff"):
+        return data[2:].decode("utf-16-be", errors="replace")
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8", errors="replace")
+    return data.decode("latin-1")
+
+
+def _stream_start(data, i):
+    """Index of the first stream data byte after the 'stream' keyword, or None."""
+    i = _skip_whitespace(data, i)
+    if data[i : i + 6] != b"stream":
+        return None
+    i += 6
+    if data[i : i + 2] == b"\r\n":
+        return i + 2
+    if data[i : i + 1] in (b"\n", b"\r"):
+        return i + 1
+    return i
+
+
+def _png_unpredict(data, columns, colors=1, bits=8):
+    """Undo PNG row predictors, as used by xref and object streams."""
+    bpp = max(1, colors * bits // 8)
+    row_len = (columns * colors * bits + 7) // 8
+    out = bytearray()
+    previous = bytearray(row_len)
+    for start in range(0, len(data), row_len + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1 : start + 1 + row_len])
+        if kind == 1:
+            for j in range(bpp, len(row)):
+                row[j] = (row[j] + row[j - bpp]) & 0xFF
+        elif kind == 2:
+            for j in range(len(row)):
+                row[j] = (row[j] + previous[j]) & 0xFF
+        elif kind == 3:
+            for j in range(len(row)):
+                left = row[j - bpp] if j >= bpp else 0
+                row[j] = (row[j] + ((left + previous[j]) >> 1)) & 0xFF
+        elif kind == 4:
+            for j in range(len(row)):
+                a = row[j - bpp] if j >= bpp else 0
+                b = previous[j]
+                c = previous[j - bpp] if j >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                row[j] = (row[j] + pred) & 0xFF
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def inflate(raw, limit, keep=True):
+    """
+    zlib-inflate raw, raising InflateLimitError as soon as the output passes
+    limit bytes; at most INFLATE_CHUNK more is ever held. With keep=False
+    nothing is kept and the inflated size is returned instead.
+    """
+    decompressor = zlib.decompressobj()
+    out = [] if keep else None
+    size = 0
+    data = raw
+    while True:
+        chunk = decompressor.decompress(data, INFLATE_CHUNK)
+        size += len(chunk)
+        if size > limit:
+            raise InflateLimitError(limit)
+        if keep:
+            out.append(chunk)
+        data = decompressor.unconsumed_tail
+        # A full chunk may leave output pending inside zlib; go round again
+        if decompressor.eof or (not data and len(chunk) < INFLATE_CHUNK):
+            break
+    if keep:
+        return b"".join(out)
+    return size
+
+
+def decode_structural_stream(header, raw):
+    """Decode an xref or object stream (FlateDecode, optional PNG predictor)."""
+    filters = header.get("/Filter")
+    if isinstance(filters, list):
+        filters = filters[0] if len(filters) == 1 else filters
+    if filters is None:
+        data = bytes(raw)
+    elif filters == "/FlateDecode":
+        data = inflate(raw, MAX_STRUCTURAL_BYTES)
+    else:
+        raise ValueError(f"Unsupported structural stream filter: {filters}")
+
+    params = header.get("/DecodeParms") or {}
+    if isinstance(params, list):
+        params = params[0] or {}
+    if params.get("/Predictor", 1) >= 10:
+        data = _png_unpredict(
+            data,
+            params.get("/Columns", 1),
+            params.get("/Colors", 1),
+            params.get("/BitsPerComponent", 8),
+        )
+    return data
+
+
+class PdfScan:
+    """
+    Offsets, sizes and header dictionaries of every object in a PDF.
+
+    objects maps object number to a dict with:
+        offset     byte offset in the file (None for objects in object streams)
+        size       bytes occupied in the file
+        container  object stream number for compressed objects, else None
+        header     parsed dictionary (or other value) of the object
+        stream     (start, length) of the stream data, or None
+
+    A lazy scan reads only the cross-reference data up front and parses
+    objects as get() reaches them; objects then holds just those, and the
+    size of an in-file object is an upper bound.
+    """
+
+    def __init__(self, source, lazy=False):
+        # A path is memory-mapped; bytes and streams (see pipe_io) are used as is
+        self.source = source
+        self._resources = ExitStack()
+        self.data = self._resources.enter_context(mapped_input(source))
+        self.view = memoryview(self.data)
+        self.size = len(self.data)
+        self.trailer = {}
+        self.objects = {}
+        self.xref_offsets = []
+        self._entries = {}
+        # Lazy scans parse objects only when get() first resolves them
+        self.lazy = lazy
+        self._loading = set()
+
+        self._read_xref_chain()
+        if not self._entries:
+            self._reconstruct_xref()
+        if not lazy:
+            self._load_objects()
+
+    def close(self):
+        # The map cannot be closed while a view of it is exported
+        self.view.release()
+        self._resources.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Cross-reference reading
+
+    def _read_xref_chain(self):
+        tail = self.data[max(0, self.size - 1024) :]
+        pos = tail.rfind(b"startxref")
+        if pos < 0:
+            return
+        try:
+            offset, _ = parse_object(tail, pos + len(b"startxref"))
+        except (ValueError, IndexError):
+            return
+
+        visited = set()
+        while isinstance(offset, int) and 0 <= offset < self.size and offset not in visited:
+            visited.add(offset)
+            try:
+                trailer = self._read_xref_section(offset)
+            except (ValueError, IndexError, zlib.error):
+                self._entries = {}
+                return
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            hybrid = trailer.get("/XRefStm")
+            if isinstance(hybrid, int) and hybrid not in visited:
+                visited.add(hybrid)
+                try:
+                    self._read_xref_section(hybrid)
+                except (ValueError, IndexError, zlib.error):
+                    pass
+            offset = trailer.get("/Prev")
+
+    def _read_xref_section(self, offset):
+        data = self.data
+        self.xref_offsets.append(offset)
+        i = _skip_whitespace(data, offset)
+
+        if data[i : i + 4] == b"xref":
+            i += 4
+            while True:
+                i = _skip_whitespace(data, i)
+                if data[i : i + 7] == b"trailer":
+                    trailer, _ = parse_object(data, i + 7)
+                    return trailer
+                start, i = parse_object(data, i)
+                count, i = parse_object(data, i)
+                i = _skip_whitespace(data, i)
+                for k in range(count):
+                    entry = data[i : i + 20]
+                    num = start + k
+                    if num not in self._entries:
+                        if entry[17:18] == b"n":
+                            self._entries[num] = ("n", int(entry[0:10]))
+                        else:
+                            self._entries[num] = ("f", 0)
+                    i += 20
+                    # Tolerate 19-byte entries from sloppy writers
+                    if i < len(data) and data[i - 1] not in WHITESPACE:
+                        i -= 1
+
+        match = OBJ_HEADER_RE.match(data, i)
+        if not match:
+            raise ValueError(f"No xref at offset {offset}")
+        header, j = parse_object(data, match.end())
+        if header.get("/Type") != "/XRef":
+            raise ValueError(f"Object at {offset} is not an xref stream")
+        start = _stream_start(data, j)
+        with self.view[start : start + header["/Length"]] as raw:
+            table = decode_structural_stream(header, raw)
+
+        widths = header["/W"]
+        index = header.get("/Index", [0, header["/Size"]])
+        pos = 0
+        for s in range(0, len(index), 2):
+            first, count = index[s], index[s + 1]
+            for k in range(count):
+                fields = []
+                for w in widths:
+                    fields.append(int.from_bytes(table[pos : pos + w], "big") if w else None)
+                    pos += w
+                kind = fields[0] if fields[0] is not None else 1
+                num = first + k
+                if num in self._entries:
+                    continue
+                if kind == 1:
+                    self._entries[num] = ("n", fields[1])
+                elif kind == 2:
+                    self._entries[num] = ("c", fields[1], fields[2])
+                else:
+                    self._entries[num] = ("f", 0)
+        return header
+
+    def _reconstruct_xref(self):
+        """Rebuild the object table by scanning for 'N G obj' headers."""
+        for match in OBJ_HEADER_RE.finditer(self.data):
+            if match.start() and self.data[match.start() - 1] not in WHITESPACE:
+                continue
+            self._entries[int(match.group(1))] = ("n", match.start())
+        pos = self.data.rfind(b"trailer")
+        if pos >= 0:
+            try:
+                self.trailer, _ = parse_object(self.data, pos + 7)
+            except (ValueError, IndexError):
+                pass
+        if "/Root" not in self.trailer:
+            for num, entry in self._entries.items():
+                header = self._peek_header(entry[1])
+                if isinstance(header, dict) and header.get("/Type") == "/Catalog":
+                    self.trailer["/Root"] = Ref(num)
+                    break
+
+    # Object loading
+
+    def _peek_header(self, offset):
+        try:
+            match = OBJ_HEADER_RE.match(self.data, offset)
+            if not match:
+                return None
+            value, _ = parse_object(self.data, match.end())
+            return value
+        except (ValueError, IndexError):
+            return None
+
+    def _load_objects(self):
+        in_file = sorted(
+            (entry[1], num) for num, entry in self._entries.items() if entry[0] == "n"
+        )
+        boundaries = sorted({offset for offset, _ in in_file} | set(self.xref_offsets))
+        boundaries.append(self.size)
+        next_boundary = {}
+        for a, b in zip(boundaries, boundaries[1:]):
+            next_boundary[a] = b
+
+        containers = {}
+        for offset, num in in_file:
+            size = next_boundary.get(offset, self.size) - offset
+            self.objects[num] = self._read_object(num, offset, size)
+
+        # Resolve indirect /Length values now that every header is known
+        for info in self.objects.values():
+            header = info["header"]
+            if (
+                info["stream"]
+                and isinstance(header, dict)
+                and isinstance(header.get("/Length"), Ref)
+            ):
+                length_obj = self.objects.get(header["/Length"].num)
+                if length_obj and isinstance(length_obj["header"], int):
+                    info["stream"] = (info["stream"][0], length_obj["header"])
+
+        for num, entry in self._entries.items():
+            if entry[0] == "c":
+                containers.setdefault(entry[1], []).append(num)
+
+        for container, members in containers.items():
+            self._load_object_stream(container, set(members))
+
+    def _read_object(self, num, offset, size):
+        info = {
+            "offset": offset,
+            "size": max(0, size),
+            "container": None,
+            "header": None,
+            "stream": None,
+        }
+        with self.view[offset : offset + min(max(size, 0), MAX_HEADER_BYTES)] as chunk:
+            match = OBJ_HEADER_RE.match(chunk)
+            if match and int(match.group(1)) == num:
+                try:
+                    header, j = parse_object(chunk, match.end())
+                    info["header"] = header
+                    start = _stream_start(chunk, j) if isinstance(header, dict) else None
+                    if start is not None:
+                        start += offset
+                        length = header.get("/Length")
+                        if not isinstance(length, int):
+                            end = self.data.find(b"endstream", start, offset + size)
+                            length = (end if end >= 0 else offset + size) - start
+                        info["stream"] = (start, length)
+                except (ValueError, IndexError):
+                    pass
+        return info
+
+    def _load_lazily(self, num):
+        entry = self._entries.get(num)
+        if entry is None or entry[0] == "f" or num in self._loading:
+            return None
+        self._loading.add(num)
+        try:
+            if entry[0] == "n":
+                info = self._read_object(num, entry[1], self.size - entry[1])
+                self.objects[num] = info
+                length = info["header"].get("/Length") if info["stream"] else None
+                if isinstance(length, Ref) and isinstance(self.get(length), int):
+                    info["stream"] = (info["stream"][0], self.get(length))
+            elif self.get(Ref(entry[1])) is not None:
+                self._load_object_stream(entry[1], {num})
+        finally:
+            self._loading.discard(num)
+        return self.objects.get(num)
+
+    def _load_object_stream(self, container, members):
+        info = self.objects.get(container)
+        if not info or not info["stream"] or not isinstance(info["header"], dict):
+            return
+        header = info["header"]
+        start, length = info["stream"]
+        try:
+            with self.view[start : start + length] as raw:
+                data = decode_structural_stream(header, raw)
+            count = header["/N"]
+            first = header["/First"]
+            pairs = []
+            i = 0
+            for _ in range(count):
+                num, i = parse_object(data, i)
+                rel, i = parse_object(data, i)
+                pairs.append((num, rel))
+        except (ValueError, IndexError, KeyError, zlib.error):
+            return
+
+        for k, (num, rel) in enumerate(pairs):
+            if num not in members:
+                continue
+            end = pairs[k + 1][1] if k + 1 < len(pairs) else len(data) - first
+            try:
+                value, _ = parse_object(data, first + rel)
+            except (ValueError, IndexError):
+                value = None
+            self.objects[num] = {
+                "offset": None,
+                "size": max(0, end - rel),
+                "container": container,
+                "header": value,
+                "stream": None,
+            }
+
+    # Queries
+
+    def get(self, value):
+        """Resolve a Ref to its parsed header; other values are returned as-is."""
+        if isinstance(value, Ref):
+            info = self.objects.get(value.num)
+            if info is None and self.lazy:
+                info = self._load_lazily(value.num)
+            return info["header"] if info else None
+        return value
+
+    def object_body(self, num):
+        """Raw bytes of an in-file object excluding any stream data."""
+        info = self.objects.get(num)
+        if not info or info["offset"] is None:
+            return b""
+        end = info["stream"][0] if info["stream"] else info["offset"] + info["size"]
+        return self.data[info["offset"] : end]
+
+    def references(self, num):
+        """Object numbers referenced from the given object's dictionary/body."""
+        info = self.objects.get(num)
+        if not info:
+            return []
+        refs = []
+        collect_refs(info["header"], refs)
+        return refs
+
+    def reachable(self):
+        """Object numbers reachable from the trailer."""
+        seen = set()
+        stack = []
+        collect_refs(self.trailer, stack)
+        while stack:
+            num = stack.pop()
+            if num in seen or num not in self.objects:
+                continue
+            seen.add(num)
+            stack.extend(self.references(num))
+        return seen
+
+    def page_refs(self):
+        """Page object numbers in document order, walking the /Pages tree."""
+        catalog = self.get(self.trailer.get("/Root"))
+        if not isinstance(catalog, dict):
+            return []
+        pages = []
+        seen = set()
+        stack = [catalog.get("/Pages")]
+        while stack:
+            ref = stack.pop()
+            if not isinstance(ref, Ref) or ref.num in seen:
+                continue
+            seen.add(ref.num)
+            node = self.get(ref)
+            if not isinstance(node, dict):
+                continue
+            kids = self.get(node.get("/Kids"))
+            if node.get("/Type") == "/Page" or kids is None:
+                pages.append(ref.num)
+            elif isinstance(kids, list):
+                stack.extend(reversed(kids))
+        return pages
+
+    def page_count(self):
+        catalog = self.get(self.trailer.get("/Root"))
+        if not isinstance(catalog, dict):
+            return 0
+        pages = self.get(catalog.get("/Pages"))
+        if isinstance(pages, dict) and isinstance(self.get(pages.get("/Count")), int):
+            return self.get(pages.get("/Count"))
+        return len(self.page_refs())
+
+
+def count_pages(source):
+    """
+    Page count of a PDF read from its trailer, catalog and page tree root,
+    without scanning the rest of the objects.
+    """
+    with PdfScan(source, lazy=True) as scan:
+        return scan.page_count()
+
+
+def collect_refs(value, out):
+    """Append the object number of every Ref inside a parsed value to out."""
+    if isinstance(value, Ref):
+        out.append(value.num)
+    elif isinstance(value, dict):
+        for item in value.values():
+            collect_refs(item, out)
+    elif isinstance(value, list):
+        for item in value:
+            collect_refs(item, out)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Low-level PDF object serialization shared by the merge, split and signing
+engines. Writes pypdf objects as raw bytes (stream data is copied without
+re-encoding) and emits classic or stream cross-reference sections, either
+for a new document or for an incremental update appended to one.
+"""
+
+import re
+import zlib
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        StreamObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        StreamObject,
+    )
+
+PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+# Object numbers of the catalog and page tree root; copied objects follow
+CATALOG_NUM = 1
+PAGES_NUM = 2
+FIRST_SOURCE_NUM = 3
+
+# Page keys that point back into the source document's structure
+EXCLUDED_PAGE_KEYS = ("/Parent", "/StructParents", "/B")
+
+# Objects never copied from a source: references to them become null
+EXCLUDED_TYPES = ("/Catalog", "/Pages")
+
+# Bytes at the end of a file searched for startxref
+TAIL_BYTES = 2048
+STARTXREF_RE = re.compile(rb"startxref\s+(\d+)\s+%%EOF")
+
+# Trailer entries an incremental update carries over from the previous one
+UPDATE_TRAILER_KEYS = ("/Root", "/Info", "/ID")
+
+
+class Serializer:
+    """Serializes pypdf objects, writing references as they are."""
+
+    def reference(self, ref):
+        return b"%d %d R" % (ref.idnum, ref.generation)
+
+    def value(self, obj):
+        if isinstance(obj, IndirectObject):
+            return self.reference(obj)
+        if isinstance(obj, StreamObject):
+            return self.stream(obj)
+        if isinstance(obj, DictionaryObject):
+            return self.dictionary(obj)
+        if isinstance(obj, ArrayObject):
+            return b"[" + b" ".join(self.value(item) for item in obj) + b"]"
+        if obj is None:
+            return b"null"
+        return plain(obj)
+
+    def stream(self, obj, entries=None):
+        """Serialize a stream with its raw data; `entries` overrides its dictionary."""
+        data = obj._data
+        if entries is None:
+            entries = obj
+        entries = {k: v for k, v in entries.items() if k != "/Length"}
+        return (
+            self.dictionary(entries, b"/Length %d" % len(data))
+            + b"\nstream\n"
+            + data
+            + b"\nendstream"
+        )
+
+    def dictionary(self, entries, extra=b""):
+        parts = [b"<<"]
+        for key, item in entries.items():
+            parts.append(plain(NameObject(key)) + b" " + self.value(item))
+        if extra:
+            parts.append(extra)
+        parts.append(b">>")
+        return b" ".join(parts)
+
+
+def plain(obj):
+    """Serialize a simple object (name, number, string, boolean)."""
+    buffer = _Buffer()
+    obj.write_to_stream(buffer)
+    return bytes(buffer)
+
+
+class _Buffer(bytearray):
+    def write(self, data):
+        self.extend(data)
+
+
+def _runs(entries):
+    """Split sorted (num, ...) entries into runs of consecutive numbers."""
+    i = 0
+    while i < len(entries):
+        j = i
+        while j + 1 < len(entries) and entries[j + 1][0] == entries[j][0] + 1:
+            j += 1
+        yield entries[i : j + 1]
+        i = j + 1
+
+
+def write_xref(out, objects, generations=None):
+    """Write a classic xref table with one subsection per run of numbers."""
+    generations = generations or {}
+    out.write(b"xref\n")
+    if 0 not in objects:
+        out.write(b"0 1\n0000000000 65535 f \n")
+    for run in _runs(sorted(objects.items())):
+        out.write(b"%d %d\n" % (run[0][0], len(run)))
+        for num, position in run:
+            out.write(b"%010d %05d n \n" % (position, generations.get(num, 0)))
+
+
+def write_xref_stream(out, objects, generations, trailer):
+    """Write an xref stream object covering `objects` plus itself."""
+    num = max(objects) + 1
+    objects = dict(objects)
+    objects[num] = out.tell()
+    entries = sorted(objects.items())
+    width = max(4, (max(objects.values()).bit_length() + 7) // 8)
+    index = []
+    rows = bytearray()
+    for run in _runs(entries):
+        index.append(b"%d %d" % (run[0][0], len(run)))
+        for entry_num, position in run:
+            rows += b"\x01" + position.to_bytes(width, "big")
+            rows += generations.get(entry_num, 0).to_bytes(2, "big")
+    data = zlib.compress(bytes(rows))
+    out.write(b"%d 0 obj\n" % num)
+    out.write(
+        b"<< /Type /XRef /Size %d /Index [%s] /W [1 %d 2] /Filter /FlateDecode "
+        b"/Length %d %s >>\nstream\n" % (num + 1, b" ".join(index), width, len(data), trailer)
+    )
+    out.write(data)
+    out.write(b"\nendstream\nendobj\n")
+
+
+def write_document_end(out, objects, page_nums):
+    """
+    Finish a document whose pages were written with /Parent PAGES_NUM:
+    the page tree root, the catalog, the xref table and the trailer.
+    `objects` maps object numbers to positions and is updated in place.
+    """
+    objects[PAGES_NUM] = out.tell()
+    out.write(b"%d 0 obj\n<< /Type /Pages /Kids [" % PAGES_NUM)
+    out.write(b" ".join(b"%d 0 R" % num for num in page_nums))
+    out.write(b"] /Count %d >>\nendobj\n" % len(page_nums))
+    objects[CATALOG_NUM] = out.tell()
+    out.write(
+        b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % (CATALOG_NUM, PAGES_NUM)
+    )
+
+    xref_position = out.tell()
+    write_xref(out, objects)
+    out.write(
+        b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (max(objects) + 1, CATALOG_NUM, xref_position)
+    )
+
+
+def last_xref(data):
+    """
+    Offset of the last xref section of a document's bytes (a buffer from
+    mapped_input) and whether it is an xref stream.
+    """
+    matches = STARTXREF_RE.findall(data[max(0, len(data) - TAIL_BYTES) :])
+    if not matches:
+        raise ValueError("startxref not found")
+    position = int(matches[-1])
+    return position, not bytes(data[position : position + 4]).startswith(b"xref")
+
+
+def object_span(reader):
+    """One more than the highest object number a document uses."""
+    highest = int(reader.trailer.get("/Size", 0))
+    for numbers in reader.xref.values():
+        if numbers:
+            highest = max(highest, max(numbers) + 1)
+    if reader.xref_objStm:
+        highest = max(highest, max(reader.xref_objStm) + 1)
+    return highest
+
+
+def write_update_end(out, objects, generations, prev_xref, xref_is_stream, trailer):
+    """
+    Finish an incremental update: an xref section for `objects` of the
+    same kind as the previous one, chained to it with /Prev, then the
+    trailer. trailer is the document's trailer, whose UPDATE_TRAILER_KEYS
+    entries are carried over.
+    """
+    serializer = Serializer()
+    trailer_entries = b" ".join(
+        plain(NameObject(key)) + b" " + serializer.value(trailer.raw_get(key))
+        for key in UPDATE_TRAILER_KEYS
+        if key in trailer
+    )
+    xref_position = out.tell()
+    if xref_is_stream:
+        write_xref_stream(
+            out, objects, generations, b"/Prev %d %s" % (prev_xref, trailer_entries)
+        )
+    else:
+        write_xref(out, objects, generations)
+        out.write(
+            b"trailer\n<< /Size %d /Prev %d %s >>\n"
+            % (max(objects) + 1, prev_xref, trailer_entries)
+        )
+    out.write(b"startxref\n%d\n%%%%EOF\n" % xref_position)
@@ -18,11 +18,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def pdf_to_excel(input_path):
@@ -30,6 +27,10 @@ def pdf_to_excel(input_path):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
         # Create workbook
         wb = Workbook()
@@ -94,13 +95,12 @@ def pdf_to_excel(input_path):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"pdf_to_excel_{timestamp}.xlsx"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("pdf_to_excel")
+        output_path = job.staged(output_filename)
 
         # Save workbook
         wb.save(output_path)
+        output_path = job.publish(output_path)
 
         return {
             "success": True,
@@ -7,21 +7,20 @@ Output: JSON with result
 
 import sys
 import os
+import io
 import json
 from datetime import datetime
 
 try:
     from pdf2image import convert_from_path
     from PIL import Image
+    from zip_packager import ZipPackager
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def convert_pdf_to_images(input_path, output_format="png"):
@@ -29,6 +28,10 @@ def convert_pdf_to_images(input_path, output_format="png"):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path, dpi=200)
+    if rejected:
+        return rejected
+
     try:
         # Convert PDF to images
         images = convert_from_path(input_path, dpi=200)
@@ -36,35 +39,30 @@ def convert_pdf_to_images(input_path, output_format="png"):
         if not images:
             return {"success": False, "error": "No pages found in PDF"}
 
-        # Generate output folder
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_folder = os.path.join(DOWNLOAD_DIR, f"pdf_images_{timestamp}")
-        os.makedirs(output_folder, exist_ok=True)
-
-        output_files = []
-
-        # Save each page as image
-        for i, image in enumerate(images):
-            output_filename = f"page_{i + 1:03d}.{output_format}"
-            output_path = os.path.join(output_folder, output_filename)
-            image.save(output_path, output_format.upper())
-            output_files.append(output_path)
+        save_format = "JPEG" if output_format.lower() in ("jpg", "jpeg") else output_format.upper()
+        job = OutputJob("pdf_to_image")
 
         # If single page, return the single file
-        if len(output_files) == 1:
-            return {"success": True, "output": output_files[0]}
-
-        # Create a zip file for multiple pages
-        import zipfile
+        if len(images) == 1:
+            output_path = job.staged(f"pdf_images_{timestamp}_page_001.{output_format}")
+            images[0].save(output_path, save_format)
+            output_path = job.publish(output_path)
+            return {"success": True, "output": output_path}
 
+        # Multiple pages are encoded in memory and streamed into a zip
         zip_filename = f"pdf_images_{timestamp}.zip"
-        zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
+        zip_path = job.staged(zip_filename)
 
-        with zipfile.ZipFile(zip_path, "w") as zipf:
-            for file_path in output_files:
-                zipf.write(file_path, os.path.basename(file_path))
+        with ZipPackager(zip_path) as archive:
+            for i, image in enumerate(images):
+                buffer = io.BytesIO()
+                image.save(buffer, save_format)
+                archive.add(f"page_{i + 1:03d}.{output_format}", buffer.getbuffer())
+                images[i] = None  # Release the decoded page
+        zip_path = job.publish(zip_path)
 
-        return {"success": True, "output": zip_path}
+        return {"success": True, "output": zip_path, "count": len(images)}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
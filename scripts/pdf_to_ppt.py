@@ -20,11 +20,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def pdf_to_ppt(input_path):
@@ -32,6 +29,10 @@ def pdf_to_ppt(input_path):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path, dpi=150)
+    if rejected:
+        return rejected
+
     try:
         # Convert PDF to images
         images = convert_from_path(input_path, dpi=150)
@@ -51,8 +52,8 @@ def pdf_to_ppt(input_path):
 
         # Generate output filename for temporary images
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_dir = os.path.join(DOWNLOAD_DIR, f"temp_ppt_{timestamp}")
-        os.makedirs(temp_dir, exist_ok=True)
+        job = OutputJob("pdf_to_ppt")
+        temp_dir = job.staging_dir()
 
         for i, image in enumerate(images):
             # Save image temporarily
@@ -81,13 +82,11 @@ def pdf_to_ppt(input_path):
 
         # Generate output filename
         output_filename = f"pdf_to_ppt_{timestamp}.pptx"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        output_path = job.staged(output_filename)
 
         # Save presentation
         prs.save(output_path)
+        output_path = job.publish(output_path)
 
         # Clean up temporary files
         import shutil
@@ -19,11 +19,8 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from resource_guard import preflight
 
 
 def extract_text_with_formatting(pdf_path):
@@ -47,6 +44,10 @@ def convert_pdf_to_word(input_path):
     if not os.path.exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
         # Extract text from PDF
         paragraphs = extract_text_with_formatting(input_path)
@@ -67,13 +68,12 @@ def convert_pdf_to_word(input_path):
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"converted_{timestamp}.docx"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("pdf_to_word")
+        output_path = job.staged(output_filename)
 
         # Save document
         doc.save(output_path)
+        output_path = job.publish(output_path)
 
         return {"success": True, "output": output_path}
 
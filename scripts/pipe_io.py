@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+In-memory input and output for the tools, so a caller can pipe documents
+through them without a round trip through disk.
+
+Input: wherever a tool takes an input path it also accepts "-" (stdin),
+"fd:N" (an inherited file descriptor), bytes or a binary file object.
+Stream inputs are read into memory once per process. Large files are
+memory-mapped rather than read, so parsers see the page cache directly and
+a multi-GB input does not need multi-GB of private memory.
+
+Output: when PDF_OUTPUT_FD is set, OutputJob writes the finished document
+to that descriptor instead of DOWNLOAD_DIR and reports "fd:N" as the
+output. The JSON result stays on stdout, so use a spare descriptor such as
+3 for the document bytes.
+"""
+
+import io
+import mmap
+import os
+import sys
+from contextlib import contextmanager
+
+STDIN_ARG = "-"
+FD_PREFIX = "fd:"
+
+# Name used for outputs of inputs that have no file name
+STREAM_INPUT_NAME = "input.pdf"
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 8 * 1024 * 1024
+
+# Bytes read from stdin or a descriptor, keyed by the argument
+_STREAM_DATA = {}
+
+
+def is_stream_arg(source):
+    """True for "-" and "fd:N" input arguments."""
+    return isinstance(source, str) and (
+        source == STDIN_ARG or (source.startswith(FD_PREFIX) and source[3:].isdigit())
+    )
+
+
+def _read_stream(arg):
+    if arg not in _STREAM_DATA:
+        if arg == STDIN_ARG:
+            _STREAM_DATA[arg] = sys.stdin.buffer.read()
+        else:
+            with os.fdopen(int(arg[3:]), "rb", closefd=False) as f:
+                _STREAM_DATA[arg] = f.read()
+    return _STREAM_DATA[arg]
+
+
+def input_exists(source):
+    """Whether a tool input is available; streams and buffers always are."""
+    if isinstance(source, str) and not is_stream_arg(source):
+        return os.path.exists(source)
+    return True
+
+
+def map_file(path):
+    """
+    Read-only memory map of a file; b"" for an empty file, which cannot be
+    mapped. The map is file-like (read, seek, tell) and supports find,
+    slicing and regex matching, so it can stand in for both a stream and
+    the file's bytes. Close it when done.
+    """
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""
+
+
+def open_input(source):
+    """
+    Something PdfReader, pdfplumber and Pillow can open: small files are
+    returned as paths, large ones as a memory map and everything else as a
+    seekable binary stream.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if not isinstance(source, str):
+        source.seek(0)
+        return source
+    if is_stream_arg(source):
+        return io.BytesIO(_read_stream(source))
+    if os.path.getsize(source) >= MMAP_THRESHOLD:
+        # pypdf would otherwise read the whole file into a BytesIO
+        return map_file(source)
+    return source
+
+
+@contextmanager
+def mapped_input(source):
+    """
+    The whole input as a buffer, without copying it: a memory map for
+    files, the in-memory bytes for everything else. Take memoryview slices
+    of it rather than slicing it, and release them before the block ends.
+    """
+    if isinstance(source, str) and not is_stream_arg(source):
+        data = map_file(source)
+        try:
+            yield data
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+        return
+    yield input_bytes(source)
+
+
+def as_stream(buffer):
+    """
+    File-like object over a buffer from mapped_input or map_file: a map is
+    already one, in-memory bytes get a BytesIO (which shares them).
+    """
+    if isinstance(buffer, mmap.mmap):
+        buffer.seek(0)
+        return buffer
+    return io.BytesIO(buffer)
+
+
+def input_bytes(source):
+    """The whole input as bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, str) and not is_stream_arg(source):
+        with open(source, "rb") as f:
+            return f.read()
+    return open_input(source).read()
+
+
+def input_name(source):
+    """File name outputs are named after."""
+    if isinstance(source, str) and not is_stream_arg(source):
+        return os.path.basename(source)
+    name = getattr(source, "name", None)
+    if isinstance(name, str):
+        return os.path.basename(name)
+    return STREAM_INPUT_NAME
+
+
+def input_size(source):
+    """Size of the input in bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, str) and not is_stream_arg(source):
+        return os.path.getsize(source)
+    stream = open_input(source)
+    return stream.seek(0, io.SEEK_END)
+
+
+def output_fd():
+    """The descriptor outputs are streamed to, or None to write files."""
+    value = os.environ.get("PDF_OUTPUT_FD", "")
+    return int(value) if value.isdigit() else None
@@ -8,33 +8,204 @@ Output: JSON with result
 
 import sys
 import os
+import io
 import json
+import hashlib
+import tempfile
+import time
 from datetime import datetime
 
 try:
     from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import NameObject, NumberObject
+    from PIL import Image
+    from pdf_images import DCT_FILTERS, codec_filter, image_placements, iter_xobjects
+    from content_stream import replace_stream_data
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import DOWNLOAD_DIR, OUTPUT_TTL, OutputJob
+from pipe_io import input_exists, input_name, input_size, open_input
+from resource_guard import preflight
+
+# Re-encoded images, keyed by source stream hash, quality and decode size.
+# Kept beside the tool outputs, never in the machine-wide temp directory
+CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(DOWNLOAD_DIR, ".image-cache"))
+
+# Cached images unused for longer than this are removed, as outputs are
+CACHE_TTL = OUTPUT_TTL
+
+# Total bytes of cached images kept before the least recently used go
+CACHE_QUOTA = int(float(os.environ.get("PDF_CACHE_QUOTA_MB", "256")) * 1024 * 1024)
+
+# Resolution images are kept at when decoding at a reduced scale
+DRAFT_DPI = 300
+
+# JPEG modes that survive a decode/encode round trip unchanged
+JPEG_MODES = ("L", "RGB")
+
+
+def _cache_path(data, quality, size):
+    key = hashlib.sha256(data).hexdigest()
+    size_key = f"{size[0]}x{size[1]}" if size else "full"
+    return os.path.join(CACHE_DIR, "quality", f"{key}_q{quality}_{size_key}.jpg")
+
+
+def _read_cache(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # A hit counts as a use, so expiry and eviction go least recently used
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def _write_cache(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def prune_cache(now=None):
+    """
+    Remove cached images unused for CACHE_TTL, then the least recently
+    used ones while the cache holds more than CACHE_QUOTA bytes.
+    Returns the number of files removed.
+    """
+    now = time.time() if now is None else now
+    entries = []
+    try:
+        with os.scandir(os.path.join(CACHE_DIR, "quality")) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if now - mtime <= CACHE_TTL and total <= CACHE_QUOTA:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _needed_pixels(placed):
+    """Pixels needed to show an image at DRAFT_DPI at its placed size."""
+    if placed is None:
+        return None
+    width, height = placed
+    if width <= 0 or height <= 0:
+        return None
+    return (
+        max(1, int(width / 72 * DRAFT_DPI + 0.5)),
+        max(1, int(height / 72 * DRAFT_DPI + 0.5)),
+    )
+
+
+def reencode_jpeg(data, quality, needed=None):
+    """
+    Re-encode JPEG data at `quality`, decoding at a reduced scale when the
+    image is larger than `needed` (width, height) pixels.
+    Returns (jpeg bytes, (width, height), from cache), or None if the image
+    is skipped. The encoded result is cached on disk by stream hash.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in JPEG_MODES:
+        return None
+
+    size = None
+    if needed is not None:
+        # draft() only picks a DCT scale (1/2, 1/4, 1/8) that stays >= needed
+        full_size = image.size
+        image.draft(image.mode, needed)
+        if image.size != full_size:
+            size = image.size
+
+    cache_path = _cache_path(data, quality, size)
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        return cached, image.size, True
+
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality, optimize=True)
+    encoded = buffer.getvalue()
+    _write_cache(cache_path, encoded)
+    return encoded, image.size, False
 
 
 def change_quality(input_path, quality_percent=70):
     """Change image quality in PDF."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
+    quality_percent = max(10, min(100, int(quality_percent)))
+
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
-        for page in reader.pages:
-            writer.add_page(page)
+        pages = [writer.add_page(page) for page in reader.pages]
+
+        # Largest placed size of every image across the document
+        placements = {}
+        for page in pages:
+            image_placements(page, placements)
+
+        stats = {"examined": 0, "recompressed": 0, "downscaled": 0, "cacheHits": 0}
+        seen = set()
+        for page in pages:
+            for name, image, resources in iter_xobjects(page.get("/Resources"), seen):
+                if image.get("/Subtype") != "/Image":
+                    continue
+                if codec_filter(image) not in DCT_FILTERS:
+                    continue
+                stats["examined"] += 1
+
+                data = image.get_data()
+                ref = resources["/XObject"].get_object().raw_get(name)
+                placed = placements.get(getattr(ref, "idnum", id(image)))
+                try:
+                    result = reencode_jpeg(data, quality_percent, _needed_pixels(placed))
+                except (OSError, ValueError):
+                    result = None
+                if result is None:
+                    continue
+                encoded, (width, height), cached = result
+                if cached:
+                    stats["cacheHits"] += 1
+                # Images that would not get smaller are left untouched
+                if len(encoded) >= len(data):
+                    continue
+
+                replace_stream_data(image, encoded, "/DCTDecode")
+                if (width, height) != (int(image["/Width"]), int(image["/Height"])):
+                    image[NameObject("/Width")] = NumberObject(width)
+                    image[NameObject("/Height")] = NumberObject(height)
+                    stats["downscaled"] += 1
+                stats["recompressed"] += 1
 
         # Copy metadata
         if reader.metadata:
@@ -42,24 +213,27 @@ def change_quality(input_path, quality_percent=70):
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_quality{quality_percent}_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("quality")
 
         # Write output
-        with open(output_path, "wb") as f:
+        with job.open(output_filename) as f:
             writer.write(f)
+        output_path = job.output
 
-        original_size = os.path.getsize(input_path)
-        new_size = os.path.getsize(output_path)
+        original_size = input_size(input_path)
+        new_size = job.output_size
+        prune_cache()
 
         return {
             "success": True,
             "output": output_path,
             "quality": quality_percent,
+            "imagesExamined": stats["examined"],
+            "imagesRecompressed": stats["recompressed"],
+            "imagesDownscaled": stats["downscaled"],
+            "cacheHits": stats["cacheHits"],
             "originalSize": original_size,
             "newSize": new_size,
         }
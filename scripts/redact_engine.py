@@ -0,0 +1,804 @@
+#!/usr/bin/env python3
+"""
+Redaction engine used by redact_pdf.py.
+All terms and regular expressions are compiled into one pattern that runs
+once over each page's text. That text is rebuilt from the content stream
+glyph by glyph, so every match maps straight back to the glyphs that drew
+it. Those glyphs are cut out of their show-text operators, with a kerning
+offset of the same width so the rest of the line stays where it was, and a
+black box is stamped over the area. Marked-content /ActualText, /Alt and
+/E entries around removed glyphs are dropped as well, and Form XObjects
+are redacted the same way as pages.
+
+Pages are processed in parallel worker processes; the parent only swaps
+in the rewritten streams and stamps the boxes. Images, annotations and
+document metadata are not searched.
+"""
+
+import math
+import os
+import re
+import zlib
+from binascii import unhexlify
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import DecodedStreamObject
+except ImportError:
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import DecodedStreamObject
+
+try:
+    from pypdf._codecs import adobe_glyphs, charset_encoding
+except ImportError:
+    adobe_glyphs, charset_encoding = {}, {}
+
+from content_stream import format_number, replace_stream_data, serialize, tokenize
+from pipe_io import as_stream, is_stream_arg, map_file
+from stamp import STANDARD_FONTS, Stamp, get_font
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# Fallback font extents in text space when a font has no descriptor
+DEFAULT_ASCENT = 0.8
+DEFAULT_DESCENT = -0.2
+
+# Width of glyphs with no known metrics, in thousandths of text space
+DEFAULT_WIDTH = 500
+
+# Glyph gaps (as a fraction of the font size) read as a word space, and
+# baseline shifts read as a new line, when rebuilding page text
+WORD_GAP = 0.2
+LINE_SHIFT = 0.5
+
+# Nesting of Form XObjects followed inside a page
+MAX_FORM_DEPTH = 8
+
+# Codes a single ToUnicode bfrange may expand to
+MAX_RANGE_CODES = 65536
+
+# Marked-content properties that can carry a copy of the text
+TEXT_PROPERTIES = (b"/ActualText", b"/Alt", b"/E")
+
+# Decimal places of the kerning offsets written in place of removed glyphs
+OFFSET_PRECISION = 3
+
+BFCHAR_RE = re.compile(rb"beginbfchar(.*?)endbfchar", re.S)
+BFRANGE_RE = re.compile(rb"beginbfrange(.*?)endbfrange", re.S)
+CODESPACE_RE = re.compile(rb"begincodespacerange\s*<([0-9A-Fa-f]+)>", re.S)
+HEX_PAIR_RE = re.compile(rb"<([0-9A-Fa-f\s]*)>\s*<([0-9A-Fa-f\s]*)>")
+RANGE_RE = re.compile(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])")
+ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+}
+
+# Source opened once per worker process: (path, mmap, pages, fonts, forms)
+_SOURCE = None
+
+
+class RedactionMatcher:
+    """
+    Terms and regular expressions compiled into one case-insensitive
+    pattern. Whitespace inside a term matches any run of whitespace, and
+    longer terms win over their own prefixes.
+    """
+
+    def __init__(self, terms=(), patterns=()):
+        self.terms = sorted({t.strip() for t in terms if t.strip()}, key=len, reverse=True)
+        self.patterns = [p for p in patterns if p]
+        parts = [r"\s+".join(re.escape(word) for word in term.split()) for term in self.terms]
+        for pattern in self.patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid pattern {pattern!r}: {e}")
+            parts.append(f"(?:{pattern})")
+        if not parts:
+            raise ValueError("No terms or patterns to redact")
+        self.regex = re.compile("|".join(parts), re.IGNORECASE)
+
+    def spans(self, text):
+        """(start, end) of every non-empty match in text."""
+        return [m.span() for m in self.regex.finditer(text) if m.end() > m.start()]
+
+
+def _multiply(m, n):
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + b * c2,
+        a * b2 + b * d2,
+        c * a2 + d * c2,
+        c * b2 + d * d2,
+        e * a2 + f * c2 + e2,
+        e * b2 + f * d2 + f2,
+    )
+
+
+def _apply(m, x, y):
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+def _bounds(m, x0, y0, x1, y1):
+    """Axis-aligned (x0, y0, x1, y1) of a rectangle mapped through m."""
+    points = [_apply(m, x, y) for x in (x0, x1) for y in (y0, y1)]
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _number(token):
+    if token[0] != "num":
+        raise ValueError("Expected a number")
+    return float(token[1])
+
+
+def string_bytes(token):
+    """The bytes of a literal or hex string token."""
+    kind, raw = token
+    if kind == "hex":
+        digits = raw[1:-1]
+        if len(digits) % 2:
+            digits += b"0"
+        return unhexlify(digits)
+    data = raw[1:-1]
+    out = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c != 0x5C:
+            out.append(c)
+            i += 1
+            continue
+        i += 1
+        if i >= n:
+            break
+        c = data[i]
+        if c in ESCAPES:
+            out += ESCAPES[c]
+            i += 1
+        elif 0x30 <= c <= 0x37:
+            digits = data[i : i + 3]
+            k = 0
+            while k < len(digits) and 0x30 <= digits[k] <= 0x37:
+                k += 1
+            out.append(int(digits[:k], 8) & 0xFF)
+            i += k
+        elif c in b"\r\n":
+            # Line continuation
+            i += 2 if data[i : i + 2] == b"\r\n" else 1
+        else:
+            out.append(c)
+            i += 1
+    return bytes(out)
+
+
+def _hex_token(data):
+    return ("hex", b"<" + data.hex().encode() + b">")
+
+
+def _utf16(hex_digits):
+    data = unhexlify(re.sub(rb"\s", b"", hex_digits))
+    if len(data) % 2:
+        return data.decode("latin-1")
+    return data.decode("utf-16-be", "replace")
+
+
+def parse_to_unicode(data):
+    """(code -> text, code length in bytes or None) from a ToUnicode CMap."""
+    mapping = {}
+    width = None
+    space = CODESPACE_RE.search(data)
+    if space:
+        width = max(1, len(space.group(1)) // 2)
+    for block in BFCHAR_RE.findall(data):
+        for src, dst in HEX_PAIR_RE.findall(block):
+            src = re.sub(rb"\s", b"", src)
+            if src:
+                mapping[int(src, 16)] = _utf16(dst)
+    for block in BFRANGE_RE.findall(data):
+        for lo, hi, dst in RANGE_RE.findall(block):
+            lo, hi = int(lo, 16), int(hi, 16)
+            if hi < lo or hi - lo >= MAX_RANGE_CODES:
+                continue
+            if dst.startswith(b"["):
+                for k, item in enumerate(re.findall(rb"<([0-9A-Fa-f\s]*)>", dst)):
+                    mapping[lo + k] = _utf16(item)
+                continue
+            text = _utf16(dst[1:-1])
+            if not text:
+                continue
+            for k in range(hi - lo + 1):
+                mapping[lo + k] = text[:-1] + chr(min(0x10FFFF, ord(text[-1]) + k))
+    return mapping, width
+
+
+class FontInfo:
+    """Code lengths, widths and Unicode text of one font resource."""
+
+    def __init__(self, font):
+        font = font.get_object() if font is not None else {}
+        self.subtype = font.get("/Subtype")
+        self.two_byte = self.subtype == "/Type0"
+        self.widths = {}
+        self.default_width = DEFAULT_WIDTH
+        self.scale = 0.001
+        self.ascent = DEFAULT_ASCENT
+        self.descent = DEFAULT_DESCENT
+        self.to_unicode = {}
+        self.encoding = None
+
+        descriptor = font.get("/FontDescriptor")
+        if self.two_byte:
+            descendants = font.get("/DescendantFonts")
+            descendant = descendants.get_object()[0].get_object() if descendants else {}
+            descriptor = descendant.get("/FontDescriptor")
+            self.default_width = float(descendant.get("/DW", 1000))
+            self._read_cid_widths(descendant.get("/W"))
+        else:
+            self._read_simple_widths(font, descriptor)
+            self.encoding = self._simple_encoding(font)
+
+        if self.subtype == "/Type3":
+            matrix = font.get("/FontMatrix")
+            if matrix:
+                self.scale = float(matrix[0])
+        elif descriptor is not None:
+            descriptor = descriptor.get_object()
+            ascent = float(descriptor.get("/Ascent", 0) or 0)
+            descent = float(descriptor.get("/Descent", 0) or 0)
+            if ascent > descent:
+                self.ascent, self.descent = ascent / 1000, min(descent, 0) / 1000
+
+        to_unicode = font.get("/ToUnicode")
+        if to_unicode is not None and hasattr(to_unicode.get_object(), "get_data"):
+            self.to_unicode, width = parse_to_unicode(to_unicode.get_object().get_data())
+            if self.two_byte and width == 1:
+                self.two_byte = False
+
+    def _read_simple_widths(self, font, descriptor):
+        widths = font.get("/Widths")
+        if widths is not None:
+            first = int(font.get("/FirstChar", 0))
+            for k, width in enumerate(widths.get_object()):
+                self.widths[first + k] = float(width)
+            if descriptor is not None:
+                self.default_width = float(descriptor.get_object().get("/MissingWidth", 0))
+            return
+        # Standard 14 fonts may leave their widths out
+        name = str(font.get("/BaseFont", ""))[1:].split("+")[-1]
+        if name in STANDARD_FONTS:
+            for code, width in enumerate(get_font(name).widths):
+                self.widths[code] = float(width)
+
+    def _read_cid_widths(self, w):
+        if w is None:
+            return
+        items = list(w.get_object())
+        i = 0
+        while i + 1 < len(items):
+            first = int(items[i])
+            second = items[i + 1].get_object()
+            if isinstance(second, list):
+                for k, width in enumerate(second):
+                    self.widths[first + k] = float(width)
+                i += 2
+            elif i + 2 < len(items):
+                last = int(second)
+                width = float(items[i + 2])
+                if last - first < MAX_RANGE_CODES:
+                    for code in range(first, last + 1):
+                        self.widths[code] = width
+                i += 3
+            else:
+                break
+
+    @staticmethod
+    def _simple_encoding(font):
+        encoding = font.get("/Encoding")
+        encoding = encoding.get_object() if encoding is not None else None
+        base = "/StandardEncoding"
+        differences = None
+        if isinstance(encoding, str):
+            base = encoding
+        elif encoding is not None:
+            base = encoding.get("/BaseEncoding", base)
+            differences = encoding.get("/Differences")
+        table = list(charset_encoding.get(base, [chr(c) for c in range(256)]))
+        if differences is not None:
+            code = 0
+            for item in differences.get_object():
+                item = item.get_object()
+                if isinstance(item, (int, float)) and not isinstance(item, str):
+                    code = int(item)
+                elif 0 <= code < 256:
+                    table[code] = _glyph_text(str(item))
+                    code += 1
+        return table
+
+    def codes(self, data):
+        """Character codes in a shown string."""
+        if self.two_byte:
+            return [int.from_bytes(data[i : i + 2], "big") for i in range(0, len(data) - 1, 2)]
+        return list(data)
+
+    def encode(self, codes):
+        """Bytes of a run of character codes."""
+        if self.two_byte:
+            return b"".join(code.to_bytes(2, "big") for code in codes)
+        return bytes(codes)
+
+    def text(self, code):
+        """Unicode text a code stands for ("" if unknown)."""
+        text = self.to_unicode.get(code)
+        if text is not None:
+            return text
+        if self.encoding is not None and 0 <= code < 256:
+            return self.encoding[code] or ""
+        return ""
+
+    def width(self, code):
+        """Advance width of a code in text space units (before font size)."""
+        return self.widths.get(code, self.default_width) * self.scale
+
+
+def _glyph_text(name):
+    text = adobe_glyphs.get(name)
+    if text:
+        return text
+    glyph = name[1:]
+    if glyph.startswith("uni") and len(glyph) >= 7:
+        try:
+            return chr(int(glyph[3:7], 16))
+        except ValueError:
+            pass
+    return glyph if len(glyph) == 1 else ""
+
+
+class _State:
+    """Graphics and text state that q/Q save and restore."""
+
+    __slots__ = ("ctm", "font", "size", "tc", "tw", "th", "tl", "rise")
+
+    def __init__(self, ctm):
+        self.ctm = ctm
+        self.font = None
+        self.size = 0.0
+        self.tc = 0.0
+        self.tw = 0.0
+        self.th = 1.0
+        self.tl = 0.0
+        self.rise = 0.0
+
+    def copy(self):
+        other = _State(self.ctm)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+
+class _Glyph:
+    __slots__ = ("op", "item", "index", "box", "offset", "marks")
+
+    def __init__(self, op, item, index, box, offset, marks):
+        self.op = op
+        self.item = item
+        self.index = index
+        self.box = box
+        # Kerning offset (TJ units) that moves the pen as far as the glyph did
+        self.offset = offset
+        self.marks = marks
+
+
+class StreamRedactor:
+    """
+    Redacts one content stream. Glyphs are collected in stream order with
+    their boxes in the stream's own space; text is rebuilt from them, and
+    the matched glyphs are removed on rewrite.
+    """
+
+    def __init__(self, matcher, fonts, forms):
+        self.matcher = matcher
+        self.fonts = fonts
+        self.forms = forms
+
+    def _font(self, resources, name):
+        fonts = resources.get("/Font") if resources is not None else None
+        fonts = fonts.get_object() if fonts is not None else {}
+        ref = fonts.raw_get(name) if name in fonts else None
+        if ref is None:
+            return None
+        # Only indirect fonts are shared, and so worth caching
+        key = getattr(ref, "idnum", None)
+        info = self.fonts.get(key) if key is not None else None
+        if info is None:
+            info = FontInfo(ref)
+            if key is not None:
+                self.fonts[key] = info
+        return info
+
+    def redact(self, data, resources, depth=0):
+        """
+        Redact decoded content stream bytes. Returns a dict with the new
+        content (None if unchanged), the boxes of removed glyphs, rewritten
+        forms keyed by their path of /XObject names from this stream's
+        resources, and match and glyph counts.
+        """
+        operations = tokenize(data)
+        op_fonts = {}
+        glyphs = []
+        chars = []
+        owners = []
+        form_results = []
+        marks = []
+        state = _State(IDENTITY)
+        stack = []
+        tm = tlm = IDENTITY
+        pen = None
+
+        def separate(start, unit, direction):
+            nonlocal pen
+            if pen is None:
+                return
+            dx, dy = start[0] - pen[0], start[1] - pen[1]
+            along = dx * direction[0] + dy * direction[1]
+            across = -dx * direction[1] + dy * direction[0]
+            if abs(across) > LINE_SHIFT * unit:
+                chars.append("\n")
+                owners.append(None)
+            elif along > WORD_GAP * unit or along < -unit:
+                chars.append(" ")
+                owners.append(None)
+
+        def show(op_index, item_index, raw):
+            nonlocal tm, pen
+            font = state.font
+            if font is None:
+                return
+            size = state.size
+            trm_base = (size * state.th, 0, 0, size, 0, state.rise)
+            op_fonts[op_index] = font
+            for k, code in enumerate(font.codes(raw)):
+                trm = _multiply(_multiply(trm_base, tm), state.ctm)
+                width = font.width(code)
+                origin = _apply(trm, 0, 0)
+                end = _apply(trm, width, 0)
+                unit = math.hypot(trm[2], trm[3]) or 1.0
+                length = math.hypot(end[0] - origin[0], end[1] - origin[1])
+                direction = (
+                    ((end[0] - origin[0]) / length, (end[1] - origin[1]) / length)
+                    if length
+                    else (1.0, 0.0)
+                )
+                separate(origin, unit, direction)
+                spacing = state.tc + (state.tw if not font.two_byte and code == 32 else 0)
+                offset = -(width * 1000 + (spacing * 1000 / size if size else 0))
+                glyph_id = len(glyphs)
+                glyphs.append(
+                    _Glyph(
+                        op_index,
+                        item_index,
+                        k,
+                        _bounds(trm, 0, font.descent, width, font.ascent),
+                        offset,
+                        list(marks),
+                    )
+                )
+                for char in font.text(code):
+                    chars.append(char)
+                    owners.append(glyph_id)
+                advance = (width * size + spacing) * state.th
+                tm = _multiply((1, 0, 0, 1, advance, 0), tm)
+                pen = _apply(_multiply(_multiply(trm_base, tm), state.ctm), 0, 0)
+
+        for op_index, (operands, operator) in enumerate(operations):
+            try:
+                if operator == b"q":
+                    stack.append(state.copy())
+                elif operator == b"Q":
+                    if stack:
+                        state = stack.pop()
+                elif operator == b"cm":
+                    state.ctm = _multiply(tuple(_number(t) for t in operands[:6]), state.ctm)
+                elif operator == b"BT":
+                    tm = tlm = IDENTITY
+                elif operator == b"Tf":
+                    state.font = self._font(resources, operands[0][1].decode("latin-1"))
+                    state.size = _number(operands[1])
+                elif operator == b"Tc":
+                    state.tc = _number(operands[0])
+                elif operator == b"Tw":
+                    state.tw = _number(operands[0])
+                elif operator == b"Tz":
+                    state.th = _number(operands[0]) / 100
+                elif operator == b"TL":
+                    state.tl = _number(operands[0])
+                elif operator == b"Ts":
+                    state.rise = _number(operands[0])
+                elif operator in (b"Td", b"TD"):
+                    tx, ty = _number(operands[0]), _number(operands[1])
+                    if operator == b"TD":
+                        state.tl = -ty
+                    tm = tlm = _multiply((1, 0, 0, 1, tx, ty), tlm)
+                elif operator == b"Tm":
+                    tm = tlm = tuple(_number(t) for t in operands[:6])
+                elif operator in (b"T*", b"'", b'"'):
+                    if operator == b'"':
+                        state.tw, state.tc = _number(operands[0]), _number(operands[1])
+                    tm = tlm = _multiply((1, 0, 0, 1, 0, -state.tl), tlm)
+                    if operator != b"T*":
+                        show(op_index, 0, string_bytes(operands[-1]))
+                elif operator == b"Tj":
+                    show(op_index, 0, string_bytes(operands[0]))
+                elif operator == b"TJ":
+                    for item_index, item in enumerate(operands[0][1]):
+                        if item[0] in ("str", "hex"):
+                            show(op_index, item_index, string_bytes(item))
+                        elif item[0] == "num":
+                            shift = -float(item[1]) / 1000 * state.size * state.th
+                            tm = _multiply((1, 0, 0, 1, shift, 0), tm)
+                elif operator in (b"BDC", b"BMC"):
+                    props = operands[1][1] if operator == b"BDC" and len(operands) > 1 else b""
+                    carries = props.startswith(b"<<") and any(k in props for k in TEXT_PROPERTIES)
+                    marks.append(op_index if carries else None)
+                elif operator == b"EMC":
+                    if marks:
+                        marks.pop()
+                elif operator == b"Do" and depth < MAX_FORM_DEPTH:
+                    name = operands[0][1].decode("latin-1")
+                    form = self._form(resources, name, depth)
+                    if form is not None:
+                        form_results.append((name, state.ctm, form))
+            except (ValueError, IndexError, TypeError, AttributeError, KeyError):
+                # An operator we cannot follow leaves its text unmatched
+                continue
+
+        removed = set()
+        spans = self.matcher.spans("".join(chars))
+        for start, end in spans:
+            for owner in owners[start:end]:
+                if owner is not None:
+                    removed.add(owner)
+
+        result = {"content": None, "boxes": [], "forms": {}, "matches": len(spans), "glyphs": len(removed)}
+        if removed:
+            result["content"] = self._rewrite(operations, glyphs, removed, op_fonts)
+            result["boxes"] = merge_boxes([glyphs[g].box for g in sorted(removed)])
+
+        for name, ctm, (matrix, form_result) in form_results:
+            result["matches"] += form_result["matches"]
+            result["glyphs"] += form_result["glyphs"]
+            if form_result["content"] is not None:
+                result["forms"][(name,)] = form_result["content"]
+            for form_path, content in form_result["forms"].items():
+                result["forms"][(name,) + form_path] = content
+            placement = _multiply(matrix, ctm)
+            for box in form_result["boxes"]:
+                result["boxes"].append(_bounds(placement, *box))
+        return result
+
+    def _form(self, resources, name, depth):
+        xobjects = resources.get("/XObject") if resources is not None else None
+        if xobjects is None or name not in xobjects.get_object():
+            return None
+        ref = xobjects.get_object().raw_get(name)
+        form = ref.get_object()
+        if form.get("/Subtype") != "/Form":
+            return None
+        # A form used by many pages is redacted once
+        key = getattr(ref, "idnum", None)
+        result = self.forms.get(key) if key is not None else None
+        if result is None:
+            form_resources = form.get("/Resources")
+            form_resources = form_resources.get_object() if form_resources is not None else resources
+            result = self.redact(form.get_data(), form_resources, depth + 1)
+            if key is not None:
+                self.forms[key] = result
+        matrix = tuple(float(v) for v in form.get("/Matrix", IDENTITY))
+        return matrix, result
+
+    def _rewrite(self, operations, glyphs, removed, op_fonts):
+        by_op = {}
+        stripped = set()
+        for glyph_id in removed:
+            glyph = glyphs[glyph_id]
+            by_op.setdefault(glyph.op, {})[(glyph.item, glyph.index)] = glyph.offset
+            stripped.update(m for m in glyph.marks if m is not None)
+
+        out = []
+        for op_index, (operands, operator) in enumerate(operations):
+            if op_index in stripped:
+                # Keep the tag, drop the properties that repeat the text
+                out.append((operands[:1], b"BMC"))
+                continue
+            cut = by_op.get(op_index)
+            if cut is None:
+                out.append((operands, operator))
+                continue
+            if operator == b"TJ":
+                items = operands[0][1]
+            else:
+                items = [operands[-1]]
+                if operator == b'"':
+                    out.append((operands[:1], b"Tw"))
+                    out.append((operands[1:2], b"Tc"))
+                if operator != b"Tj":
+                    out.append(([], b"T*"))
+            out.append(([("array", _cut_items(items, op_fonts[op_index], cut))], b"TJ"))
+        return serialize(out)
+
+
+def _cut_items(items, font, cut):
+    """
+    TJ items with the glyphs in cut removed; cut maps (item, code index)
+    to the offset that replaces each one.
+    """
+    new_items = []
+    pending = 0.0
+
+    def flush_offset():
+        nonlocal pending
+        if pending:
+            new_items.append(("num", format_number(pending, OFFSET_PRECISION).encode()))
+            pending = 0.0
+
+    for item_index, item in enumerate(items):
+        if item[0] == "num":
+            pending += float(item[1])
+            continue
+        if item[0] not in ("str", "hex"):
+            flush_offset()
+            new_items.append(item)
+            continue
+        codes = font.codes(string_bytes(item))
+        run = []
+        for k, code in enumerate(codes):
+            offset = cut.get((item_index, k))
+            if offset is None:
+                if pending and not run:
+                    flush_offset()
+                run.append(code)
+                continue
+            if run:
+                flush_offset()
+                new_items.append(_hex_token(font.encode(run)))
+                run = []
+            pending += offset
+        if run:
+            flush_offset()
+            new_items.append(_hex_token(font.encode(run)))
+    flush_offset()
+    return new_items
+
+
+def merge_boxes(boxes):
+    """Join boxes of consecutive glyphs on the same line into one box each."""
+    merged = []
+    for box in boxes:
+        if merged:
+            x0, y0, x1, y1 = merged[-1]
+            height = min(y1 - y0, box[3] - box[1])
+            overlap = min(y1, box[3]) - max(y0, box[1])
+            if height > 0 and overlap >= height / 2 and box[0] <= x1 + height / 2 and box[2] >= x0 - height / 2:
+                merged[-1] = (min(x0, box[0]), min(y0, box[1]), max(x1, box[2]), max(y1, box[3]))
+                continue
+        merged.append(tuple(box))
+    return merged
+
+
+def _empty_result():
+    return {"content": None, "boxes": [], "forms": {}, "matches": 0, "glyphs": 0}
+
+
+def redact_page(page, matcher, fonts=None, forms=None):
+    """
+    Redact one page (see StreamRedactor.redact for the result). fonts and
+    forms are caches shared by the pages of one document. A page whose
+    content cannot be parsed gets an "error" instead.
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return _empty_result()
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else None
+    redactor = StreamRedactor(matcher, {} if fonts is None else fonts, {} if forms is None else forms)
+    try:
+        return redactor.redact(contents.get_data(), resources)
+    except ValueError as e:
+        result = _empty_result()
+        result["error"] = str(e)
+        return result
+
+
+def _source_pages(path):
+    """The worker's pages and caches for path, mapping the file on first use."""
+    global _SOURCE
+    if _SOURCE is None or _SOURCE[0] != path:
+        data = map_file(path)
+        reader = PdfReader(as_stream(data))
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ValueError("File is encrypted")
+        _SOURCE = (path, data, list(reader.pages), {}, {})
+    return _SOURCE[2:]
+
+
+def _redact_pages_job(job):
+    path, indices, terms, patterns = job
+    matcher = RedactionMatcher(terms, patterns)
+    pages, fonts, forms = _source_pages(path)
+    return [(index, redact_page(pages[index], matcher, fonts, forms)) for index in indices]
+
+
+def iter_redactions(source, reader, terms, patterns=(), workers=None):
+    """
+    Redact every page of reader (opened from source), in parallel across
+    worker processes when source is a file with more than one page.
+    Yields (page index, result) in page order as soon as each is ready.
+    """
+    matcher = RedactionMatcher(terms, patterns)
+    count = len(reader.pages)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, count))
+
+    if workers == 1 or not isinstance(source, str) or is_stream_arg(source):
+        fonts, forms = {}, {}
+        for index, page in enumerate(reader.pages):
+            yield index, redact_page(page, matcher, fonts, forms)
+        return
+
+    # Contiguous chunks keep a worker's font and form caches useful
+    size = max(1, count // (workers * 4))
+    jobs = [
+        (source, range(start, min(start + size, count)), matcher.terms, matcher.patterns)
+        for start in range(0, count, size)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(_redact_pages_job, jobs):
+            yield from results
+
+
+def _form_at(page, path):
+    resources = page.get("/Resources")
+    form = None
+    for name in path:
+        resources = resources.get_object() if resources is not None else {}
+        form = resources["/XObject"].get_object()[name].get_object()
+        resources = form.get("/Resources", resources)
+    return form
+
+
+def apply_redaction(page, result, stamper, rewritten=None):
+    """
+    Apply a page's redaction result to the same page of a writer: swap in
+    the rewritten content and forms, then stamp boxes over the removed
+    text. rewritten collects forms already replaced by earlier pages.
+    """
+    if result["content"] is not None:
+        stream = DecodedStreamObject()
+        stream.set_data(result["content"])
+        page.replace_contents(stream.flate_encode())
+
+    rewritten = set() if rewritten is None else rewritten
+    for path, content in result["forms"].items():
+        form = _form_at(page, path)
+        key = form.indirect_reference.idnum if form.indirect_reference else id(form)
+        if key in rewritten:
+            continue
+        replace_stream_data(form, zlib.compress(content), "/FlateDecode")
+        rewritten.add(key)
+
+    if result["boxes"]:
+        box = page.mediabox
+        left, bottom = float(box.left), float(box.bottom)
+        stamp = Stamp()
+        for x0, y0, x1, y1 in result["boxes"]:
+            stamp.rect(x0 - left, y0 - bottom, x1 - x0, y1 - y0, fill=(0, 0, 0))
+        stamper.apply(page, stamp)
+    return page
@@ -1,108 +1,88 @@
 #!/usr/bin/env python3
 """
 Redact sensitive information from PDF.
-Usage: python redact_pdf.py <input_pdf> <words_to_redact>
-       words_to_redact: comma-separated words to redact
+Matched text is removed from the page content itself, not just covered,
+so it can no longer be extracted or copied (see redact_engine.py).
+Usage: python redact_pdf.py <input_pdf> <words_to_redact> [patterns_json]
+       words_to_redact: comma-separated words or phrases to redact
+       patterns_json: optional JSON array of regular expressions to redact
 Output: JSON with result
 """
 
 import sys
-import os
 import json
 from datetime import datetime
-import re
 
 try:
     from pypdf import PdfWriter, PdfReader
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.colors import black
-    from reportlab.lib.utils import simpleSplit
-    import pdfplumber
+    from overlay import FormStamper
+    from redact_engine import apply_redaction, iter_redactions
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, open_input
+from resource_guard import preflight
 
 
-def redact_pdf(input_path, words_to_redact):
-    """Redact specified words from PDF."""
-    if not os.path.exists(input_path):
+def redact_pdf(input_path, words_to_redact, patterns=None):
+    """Redact specified words and patterns from PDF."""
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
+    rejected = preflight(input_path)
+    if rejected:
+        return rejected
+
     try:
         words = [w.strip() for w in words_to_redact.split(",") if w.strip()]
+        patterns = [p for p in (patterns or []) if p]
 
-        if not words:
+        if not words and not patterns:
             return {"success": False, "error": "No words specified for redaction"}
 
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
+        if reader.is_encrypted and not reader.decrypt(""):
+            return {"success": False, "error": "PDF is encrypted"}
         writer = PdfWriter()
 
         redactions_made = 0
-
-        with pdfplumber.open(input_path) as pdf:
-            for page_num, (pdf_page, plumber_page) in enumerate(
-                zip(reader.pages, pdf.pages)
-            ):
-                # Get page dimensions
-                page_width = float(pdf_page.mediabox.width)
-                page_height = float(pdf_page.mediabox.height)
-
-                # Create overlay for redactions
-                overlay_path = os.path.join(DOWNLOAD_DIR, f"temp_redact_{page_num}.pdf")
-                c = canvas.Canvas(overlay_path, pagesize=(page_width, page_height))
-
-                # Find words and their positions
-                words_found = plumber_page.extract_words()
-
-                for word_info in words_found:
-                    word_text = word_info["text"]
-                    x0 = word_info["x0"]
-                    y0 = page_height - word_info["bottom"]  # Convert coordinates
-                    x1 = word_info["x1"]
-                    y1 = page_height - word_info["top"]
-
-                    # Check if word matches any redaction word (case-insensitive)
-                    for redact_word in words:
-                        if redact_word.lower() in word_text.lower():
-                            # Draw black rectangle over the word
-                            c.setFillColor(black)
-                            c.rect(x0, y0, x1 - x0, y1 - y0, fill=1, stroke=0)
-                            redactions_made += 1
-                            break
-
-                c.save()
-
-                # Merge overlay with original page
-                overlay_reader = PdfReader(overlay_path)
-                pdf_page.merge_page(overlay_reader.pages[0])
-                writer.add_page(pdf_page)
-
-                # Clean up temp file
-                os.remove(overlay_path)
+        glyphs_removed = 0
+        pages_redacted = 0
+        stamper = FormStamper(writer, prefix="/Redact")
+        rewritten_forms = set()
+
+        for page_num, result in iter_redactions(input_path, reader, words, patterns):
+            # Text that cannot be read cannot be shown to be gone
+            if "error" in result:
+                return {
+                    "success": False,
+                    "error": f"Could not parse page {page_num + 1}: {result['error']}",
+                }
+            page = writer.add_page(reader.pages[page_num])
+            apply_redaction(page, result, stamper, rewritten_forms)
+            redactions_made += result["matches"]
+            glyphs_removed += result["glyphs"]
+            if result["glyphs"]:
+                pages_redacted += 1
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"redacted_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        job = OutputJob("redact")
 
         # Write output
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {
             "success": True,
             "output": output_path,
             "redactions_made": redactions_made,
+            "glyphsRemoved": glyphs_removed,
+            "pagesRedacted": pages_redacted,
         }
 
     except Exception as e:
@@ -120,5 +100,10 @@ if __name__ == "__main__":
 
     input_path = sys.argv[1]
     words_to_redact = sys.argv[2]
-    result = redact_pdf(input_path, words_to_redact)
+    try:
+        patterns = json.loads(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] else []
+    except ValueError:
+        print(json.dumps({"success": False, "error": "Patterns must be a JSON array"}))
+        sys.exit(1)
+    result = redact_pdf(input_path, words_to_redact, patterns)
     print(json.dumps(result))
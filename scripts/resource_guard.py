@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Resource limits shared by the PDF tools.
+preflight() checks a document before any decoder, renderer or worker sees
+it: object and page counts, declared image dimensions, the decoded size
+and compression ratio implied by each stream dictionary, and the pixel
+size pages render at. Flate streams big enough to be a bomb are inflated
+under a cap, never in full. It works from the structure scanner, so the
+check costs a pass over the object headers.
+
+Importing this module also caps decoding inside pypdf and Pillow, so a
+stream or image that slips past the pre-flight still stops at the limit.
+
+All limits can be tuned from the environment (PDF_MAX_*).
+Usage: python resource_guard.py <input_pdf> [dpi]
+Output: JSON with result
+"""
+
+import sys
+import os
+import json
+
+from pdf_scan import InflateLimitError, PdfScan, Ref, inflate
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Objects in the cross-reference table
+MAX_OBJECTS = int(os.environ.get("PDF_MAX_OBJECTS", "1000000"))
+
+MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "20000"))
+
+# Pixels in one image, declared or rendered; the default is the size at
+# which Pillow itself raises DecompressionBombError
+MAX_IMAGE_PIXELS = int(os.environ.get("PDF_MAX_IMAGE_PIXELS", "178956970"))
+
+# Decoded bytes of any one stream
+MAX_STREAM_BYTES = int(float(os.environ.get("PDF_MAX_STREAM_MB", "256")) * 1024 * 1024)
+
+# Decoded-to-encoded ratio a stream may reach once past RATIO_FLOOR
+MAX_COMPRESSION_RATIO = float(os.environ.get("PDF_MAX_COMPRESSION_RATIO", "200"))
+
+# Streams that decode to less than this are never judged by their ratio
+RATIO_FLOOR = 16 * 1024 * 1024
+
+FLATE_FILTERS = ("/FlateDecode", "/Fl")
+
+# Filters undone by pypdf when they are layered with Flate; decoding stops
+# at any other filter (image codecs cannot hide a Flate layer)
+LAYER_FILTERS = {
+    "/ASCII85Decode": "ASCII85Decode",
+    "/A85": "ASCII85Decode",
+    "/ASCIIHexDecode": "ASCIIHexDecode",
+    "/AHx": "ASCIIHexDecode",
+    "/RunLengthDecode": "RunLengthDecode",
+    "/RL": "RunLengthDecode",
+    "/LZWDecode": "LZWDecode",
+    "/LZW": "LZWDecode",
+}
+
+# Colour components of the device and CIE spaces; anything else counts as 4
+COMPONENTS = {
+    "/DeviceGray": 1,
+    "/G": 1,
+    "/CalGray": 1,
+    "/Indexed": 1,
+    "/I": 1,
+    "/Separation": 1,
+    "/DeviceRGB": 3,
+    "/RGB": 3,
+    "/CalRGB": 3,
+    "/Lab": 3,
+    "/DeviceCMYK": 4,
+    "/CMYK": 4,
+}
+
+# Levels of /Parent followed to find an inherited /MediaBox
+MAX_TREE_DEPTH = 64
+
+DEFAULT_MEDIABOX = [0, 0, 612, 792]
+
+
+class ResourceLimitError(ValueError):
+    """A document exceeds one of the limits; result() is the tool response."""
+
+    def __init__(self, limit, message, value, maximum, obj=None):
+        super().__init__(message)
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+        self.obj = obj
+
+    def result(self):
+        result = {
+            "success": False,
+            "error": str(self),
+            "errorCode": "RESOURCE_LIMIT",
+            "limit": self.limit,
+            "value": self.value,
+            "maximum": self.maximum,
+        }
+        if self.obj is not None:
+            result["object"] = self.obj
+        return result
+
+
+def apply_decoder_limits():
+    """Cap inflated stream and image sizes inside pypdf and Pillow."""
+    if pypdf is not None and hasattr(pypdf, "overwrite_configuration"):
+        pypdf.overwrite_configuration(
+            maximum_declared_stream_length=MAX_STREAM_BYTES,
+            array_based_stream_maximum_output_length=MAX_STREAM_BYTES,
+            zlib_maximum_output_length=MAX_STREAM_BYTES,
+            lzw_maximum_output_length=MAX_STREAM_BYTES,
+            run_length_maximum_output_length=MAX_STREAM_BYTES,
+            jbig2_maximum_output_length=MAX_STREAM_BYTES,
+            image_maximum_buffer_size=MAX_STREAM_BYTES,
+        )
+    elif pypdf is not None:
+        # Older pypdf reads these module constants at decode time
+        from pypdf import filters
+
+        for name in ("ZLIB_MAX_OUTPUT_LENGTH", "LZW_MAX_OUTPUT_LENGTH", "MAX_DECLARED_STREAM_LENGTH"):
+            if hasattr(filters, name):
+                setattr(filters, name, MAX_STREAM_BYTES)
+    if Image is not None:
+        # Pillow only raises past twice its limit (it warns past the limit)
+        Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS // 2
+
+
+def _number(scan, value, default=0):
+    value = scan.get(value)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+def _filters(scan, header):
+    filters = scan.get(header.get("/Filter"))
+    if not isinstance(filters, list):
+        filters = [filters] if filters else []
+    return [scan.get(name) for name in filters]
+
+
+def _components(scan, colorspace):
+    colorspace = scan.get(colorspace)
+    if isinstance(colorspace, list) and colorspace:
+        family = scan.get(colorspace[0])
+        if family == "/ICCBased" and len(colorspace) > 1:
+            profile = scan.get(colorspace[1])
+            if isinstance(profile, dict):
+                return int(_number(scan, profile.get("/N"), 4))
+        if family == "/DeviceN" and len(colorspace) > 1:
+            names = scan.get(colorspace[1])
+            return len(names) if isinstance(names, list) else 4
+        return COMPONENTS.get(family, 4)
+    return COMPONENTS.get(colorspace, 4)
+
+
+def _check_image(scan, num, header, length):
+    width = int(_number(scan, header.get("/Width")))
+    height = int(_number(scan, header.get("/Height")))
+    pixels = width * height
+    if pixels > MAX_IMAGE_PIXELS:
+        raise ResourceLimitError(
+            "imagePixels",
+            f"Image in object {num} is {width}x{height} pixels (limit {MAX_IMAGE_PIXELS})",
+            pixels, MAX_IMAGE_PIXELS, num,
+        )
+
+    if scan.get(header.get("/ImageMask")) is True:
+        components, bits = 1, 1
+    else:
+        components = _components(scan, header.get("/ColorSpace", "/DeviceRGB"))
+        bits = int(_number(scan, header.get("/BitsPerComponent"), 8))
+    decoded = (width * components * bits + 7) // 8 * height
+    _check_decoded(num, decoded, length)
+
+
+def _check_decoded(num, decoded, length):
+    if decoded > MAX_STREAM_BYTES:
+        raise ResourceLimitError(
+            "streamBytes",
+            f"Stream in object {num} decodes to {decoded} bytes (limit {MAX_STREAM_BYTES})",
+            decoded, MAX_STREAM_BYTES, num,
+        )
+    ratio = decoded / max(length, 1)
+    if decoded > RATIO_FLOOR and ratio > MAX_COMPRESSION_RATIO:
+        raise ResourceLimitError(
+            "compressionRatio",
+            f"Stream in object {num} expands {ratio:.0f}:1 (limit {MAX_COMPRESSION_RATIO:.0f}:1)",
+            round(ratio), MAX_COMPRESSION_RATIO, num,
+        )
+
+
+def _undo_filter(name, data, limit, keep):
+    """
+    One layer of a filter chain decoded, or None when the pre-flight
+    cannot undo it. Raises InflateLimitError once the output passes limit.
+    """
+    if name in FLATE_FILTERS:
+        return inflate(data, limit, keep)
+    if name not in LAYER_FILTERS or pypdf is None:
+        return None
+    from pypdf import filters
+    from pypdf.errors import LimitReachedError
+
+    try:
+        decoded = getattr(filters, LAYER_FILTERS[name]).decode(bytes(data))
+    except LimitReachedError:
+        raise InflateLimitError(limit)
+    if len(decoded) > limit:
+        raise InflateLimitError(limit)
+    return decoded
+
+
+def _probe_chain(scan, num, start, length, filters):
+    """
+    Decode a stream's whole filter chain under the ratio and size caps,
+    keeping only what the next layer needs.
+    """
+    limit = min(MAX_STREAM_BYTES, max(RATIO_FLOOR, int(length * MAX_COMPRESSION_RATIO)))
+    # Nothing after the last Flate layer can expand the data enough to matter
+    last_flate = max(i for i, name in enumerate(filters) if name in FLATE_FILTERS)
+    try:
+        with scan.view[start : start + length] as raw:
+            data = raw
+            for i, name in enumerate(filters[: last_flate + 1]):
+                data = _undo_filter(name, data, limit, keep=i < last_flate)
+                if data is None:
+                    break
+    except InflateLimitError:
+        # Report the limit that was actually crossed
+        if limit == MAX_STREAM_BYTES:
+            _check_decoded(num, limit + 1, length)
+        ratio = limit / max(length, 1)
+        raise ResourceLimitError(
+            "compressionRatio",
+            f"Stream in object {num} expands more than {ratio:.0f}:1 "
+            f"(limit {MAX_COMPRESSION_RATIO:.0f}:1)",
+            round(ratio), MAX_COMPRESSION_RATIO, num,
+        )
+    except Exception:
+        # Corrupt data is the decoder's problem, not a resource one
+        pass
+
+
+def _media_box(scan, num):
+    node = scan.get(Ref(num))
+    for _ in range(MAX_TREE_DEPTH):
+        if not isinstance(node, dict):
+            break
+        box = scan.get(node.get("/MediaBox"))
+        if isinstance(box, list) and len(box) == 4:
+            return [_number(scan, v) for v in box]
+        node = scan.get(node.get("/Parent"))
+    return DEFAULT_MEDIABOX
+
+
+def _check_render(scan, dpi):
+    for num in scan.page_refs():
+        x0, y0, x1, y1 = _media_box(scan, num)
+        unit = _number(scan, scan.get(Ref(num)).get("/UserUnit"), 1)
+        scale = dpi * unit / 72
+        pixels = int(abs(x1 - x0) * scale) * int(abs(y1 - y0) * scale)
+        if pixels > MAX_IMAGE_PIXELS:
+            raise ResourceLimitError(
+                "renderPixels",
+                f"Page object {num} renders to {pixels} pixels at {dpi} dpi "
+                f"(limit {MAX_IMAGE_PIXELS})",
+                pixels, MAX_IMAGE_PIXELS, num,
+            )
+
+
+def check_document(scan, dpi=None):
+    """Raise ResourceLimitError for the first limit a scanned document breaks."""
+    declared = _number(scan, scan.trailer.get("/Size"))
+    objects = max(len(scan.objects), int(declared))
+    if objects > MAX_OBJECTS:
+        raise ResourceLimitError(
+            "objects", f"Document has {objects} objects (limit {MAX_OBJECTS})", objects, MAX_OBJECTS
+        )
+    pages = scan.page_count()
+    if not isinstance(pages, int) or pages > MAX_PAGES:
+        raise ResourceLimitError(
+            "pages", f"Document has {pages} pages (limit {MAX_PAGES})", pages, MAX_PAGES
+        )
+
+    for num, info in scan.objects.items():
+        header = info["header"]
+        if not info["stream"] or not isinstance(header, dict):
+            continue
+        start, length = info["stream"]
+        if scan.get(header.get("/Subtype")) == "/Image":
+            _check_image(scan, num, header, length)
+            continue
+        declared = _number(scan, header.get("/DL"))
+        if declared:
+            _check_decoded(num, int(declared), length)
+        filters = _filters(scan, header)
+        if any(name in FLATE_FILTERS for name in filters):
+            _probe_chain(scan, num, start, length, filters)
+
+    if dpi:
+        _check_render(scan, dpi)
+
+
+def preflight(source, dpi=None):
+    """
+    Check an input (a path or anything pipe_io accepts) against the limits.
+    Returns None when it may be processed, else the structured error result
+    to return from the tool. dpi adds a check on rendered page size.
+    A file the scanner cannot read is rejected too, since it cannot be
+    shown to be within the limits.
+    """
+    try:
+        with PdfScan(source) as scan:
+            check_document(scan, dpi)
+    except ResourceLimitError as e:
+        return e.result()
+    except InflateLimitError as e:
+        return ResourceLimitError(
+            "streamBytes",
+            f"Cross-reference or object stream inflates past {e.limit} bytes",
+            e.limit + 1, e.limit,
+        ).result()
+    except Exception as e:
+        print(f"preflight: could not scan the document: {e!r}", file=sys.stderr)
+        return {
+            "success": False,
+            "error": f"Could not check the document's structure: {e}",
+            "errorCode": "PREFLIGHT_FAILED",
+        }
+    return None
+
+
+apply_decoder_limits()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({"success": False, "error": "Input PDF file required"}))
+        sys.exit(1)
+
+    dpi = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    result = preflight(sys.argv[1], dpi) or {"success": True}
+    print(json.dumps(result))
@@ -16,16 +16,13 @@ try:
 except ImportError:
     from PyPDF2 import PdfReader, PdfWriter
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
 def rotate_pdf(input_path, rotation="90"):
     """Rotate PDF pages."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
@@ -36,7 +33,7 @@ def rotate_pdf(input_path, rotation="90"):
                 "error": "Rotation must be 90, 180, or 270 degrees",
             }
 
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
         # Rotate each page
@@ -44,18 +41,16 @@ def rotate_pdf(input_path, rotation="90"):
             page.rotate(rotation)
             writer.add_page(page)
 
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_rotated_{rotation}_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
+        job = OutputJob("rotate")
 
         # Write rotated PDF
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {"success": True, "output": output_path}
 
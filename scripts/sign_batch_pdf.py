@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Digitally sign a batch of PDFs.
+Every worker process loads the key and certificates, the signature image
+and the font metrics once, then signs one document after another (see
+signing_engine.py); at most `workers` documents are open at once. Signed
+documents are streamed into a ZIP as they finish, followed by
+manifest.json, which records for every document of the manifest, in
+order, what was signed or why it failed.
+Usage: python sign_batch_pdf.py <manifest> <signature_text_or_image> <key_file> [cert_file] [reason] [location]
+manifest: JSON array, inline or in a .json file, of file paths or of objects
+          {"file", "page", "x", "y", "width", "height", "reason", "location"};
+          the signature goes on the last page at the bottom right by default
+key_file, cert_file, reason, location: as for sign_pdf.py; the key's password
+          is read from PDF_SIGNING_PASSWORD
+Output: JSON with result
+"""
+
+import sys
+import os
+import io
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+try:
+    from signing_engine import Signer, sign_document
+    from sign_pdf import signature_appearance, signature_image_ok
+    from stamp import get_font
+    from zip_packager import ZipPackager
+except ImportError as e:
+    print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
+    sys.exit(1)
+
+from output_manager import OutputJob
+
+# Maximum number of documents open at once (one per worker)
+MAX_OPEN_FILES = int(os.environ.get("PDF_SIGN_MAX_OPEN_FILES", "8"))
+
+# Signed documents held in memory ahead of the ZIP writer, per worker
+WINDOW_PER_WORKER = 2
+
+MANIFEST_NAME = "manifest.json"
+
+# Fonts the drawn signature uses, loaded when a worker starts
+SIGNATURE_FONTS = ("Helvetica", "Helvetica-Bold")
+
+# Entry fields that override the defaults for one document
+ENTRY_FIELDS = ("page", "x", "y", "width", "height", "reason", "location")
+
+DEFAULTS = {"page": 0, "x": None, "y": None, "width": 200, "height": 50}
+
+# Signer and signature loaded once per worker process
+_SIGNER = None
+_SIGNATURE = None
+
+
+def load_manifest(manifest):
+    """Entries of a manifest given inline or as a path to a JSON file."""
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        entries = json.loads(manifest)
+    if not isinstance(entries, list):
+        raise ValueError("Manifest must be a JSON array")
+
+    documents = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"file": entry}
+        if not isinstance(entry, dict) or not entry.get("file"):
+            raise ValueError(f"Manifest entry without a file: {entry!r}")
+        unknown = set(entry) - {"file", *ENTRY_FIELDS}
+        if unknown:
+            raise ValueError(f"Unknown manifest field: {sorted(unknown)[0]}")
+        documents.append(entry)
+    return documents
+
+
+def _init_worker(key_path, cert_path, password, signature_path, defaults):
+    global _SIGNER, _SIGNATURE
+    _SIGNER = Signer.load(key_path, cert_path, password)
+    is_image = bool(signature_path) and os.path.exists(signature_path)
+    if is_image:
+        signature_image_ok(signature_path)
+    for font in SIGNATURE_FONTS:
+        get_font(font)
+    _SIGNATURE = (signature_path, is_image, defaults)
+
+
+def _sign_job(job):
+    index, entry = job
+    started = time.perf_counter()
+    signature_path, is_image, defaults = _SIGNATURE
+    options = {**defaults, **{k: entry[k] for k in ENTRY_FIELDS if k in entry}}
+    result = {"index": index, "file": entry["file"]}
+    try:
+        if not os.path.exists(entry["file"]):
+            raise ValueError("File not found")
+        appearance = signature_appearance(
+            signature_path,
+            is_image,
+            options["x"],
+            options["y"],
+            float(options["width"]),
+            float(options["height"]),
+        )
+        out = io.BytesIO()
+        details = sign_document(
+            entry["file"],
+            out,
+            _SIGNER,
+            int(options["page"]) - 1,
+            appearance,
+            options.get("reason"),
+            options.get("location"),
+        )
+        result.update(details, data=out.getvalue())
+    except Exception as e:
+        result["error"] = str(e)
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def iter_signed(documents, init_args, workers=None):
+    """
+    Sign documents across worker processes, yielding one result per
+    document in the order they finish. Only a bounded window of documents
+    is submitted ahead of the consumer, so finished ones do not pile up in
+    memory.
+    """
+    if workers is None:
+        workers = min(MAX_OPEN_FILES, os.cpu_count() or 1)
+    workers = max(1, min(workers, len(documents)))
+    jobs = iter(enumerate(documents))
+
+    if workers == 1:
+        _init_worker(*init_args)
+        for job in jobs:
+            yield _sign_job(job)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=init_args
+    ) as pool:
+        running = set()
+        while True:
+            for job in jobs:
+                running.add(pool.submit(_sign_job, job))
+                if len(running) >= WINDOW_PER_WORKER * workers:
+                    break
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def sign_batch(
+    manifest,
+    signature_path,
+    key_path,
+    cert_path=None,
+    reason=None,
+    location=None,
+    workers=None,
+):
+    """Digitally sign every document of a manifest."""
+    try:
+        documents = load_manifest(manifest)
+        if not documents:
+            return {"success": False, "error": "No files provided"}
+        if not os.path.exists(key_path):
+            return {"success": False, "error": f"Key file not found: {key_path}"}
+
+        password = os.environ.get("PDF_SIGNING_PASSWORD")
+        password = password.encode() if password else None
+        # Fails here, once, on a bad key, password or certificate
+        Signer.load(key_path, cert_path or None, password)
+
+        defaults = {**DEFAULTS, "reason": reason, "location": location}
+        init_args = (key_path, cert_path or None, password, signature_path, defaults)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job = OutputJob("sign_batch")
+        zip_path = job.staged(f"signed_pdfs_{timestamp}.zip")
+        records = [None] * len(documents)
+
+        with ZipPackager(zip_path) as archive:
+            for result in iter_signed(documents, init_args, workers):
+                record = {"file": result["file"], "success": "error" not in result}
+                if "error" in result:
+                    record["error"] = result["error"]
+                else:
+                    base_name = os.path.splitext(os.path.basename(result["file"]))[0]
+                    record["name"] = archive.add(f"{base_name}_signed.pdf", result["data"])
+                    record["bytes"] = len(result["data"])
+                    for key in ("field", "signer", "byteRange", "signatureBytes"):
+                        record[key] = result[key]
+                record["ms"] = result["ms"]
+                records[result["index"]] = record
+
+            signed = sum(1 for record in records if record["success"])
+            summary = {
+                "signedAt": datetime.now().isoformat(timespec="seconds"),
+                "signedCount": signed,
+                "failedCount": len(records) - signed,
+                "documents": records,
+            }
+            archive.add(MANIFEST_NAME, json.dumps(summary, indent=2).encode("utf-8"))
+
+        output_path = job.publish(zip_path)
+
+        return {
+            "success": signed > 0,
+            "output": output_path,
+            "manifest": MANIFEST_NAME,
+            "signedCount": signed,
+            "failedCount": len(records) - signed,
+            "failed": [
+                {"file": record["file"], "error": record["error"]}
+                for record in records
+                if not record["success"]
+            ],
+        }
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(
+            json.dumps(
+                {
+                    "success": False,
+                    "error": "Manifest, signature and key file required",
+                }
+            )
+        )
+        sys.exit(1)
+
+    manifest = sys.argv[1]
+    signature = sys.argv[2]
+    key_path = sys.argv[3]
+    cert_path = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else None
+    reason = sys.argv[5] if len(sys.argv) > 5 and sys.argv[5] else None
+    location = sys.argv[6] if len(sys.argv) > 6 and sys.argv[6] else None
+
+    result = sign_batch(manifest, signature, key_path, cert_path, reason, location)
+    print(json.dumps(result))
@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 """
 Sign PDF document.
+Without a key the signature is drawn onto the page. With one the document
+is digitally signed: a PKCS#7 signature showing the drawn signature is
+appended as an incremental update (see signing_engine.py), leaving the
+original bytes, and any earlier signatures, intact.
 Usage: python sign_pdf.py <input_pdf> <signature_text_or_image> <page> <x> <y> <width> <height>
+                          [key_file] [cert_file] [reason] [location]
        - signature_text_or_image: Path to signature image OR text for text signature
        - page: Page number (default: 1)
        - x, y: Position coordinates (optional, defaults to bottom-right)
        - width, height: Size of signature (optional)
+       - key_file: PEM/DER private key, or a PKCS#12 (.p12/.pfx) bundle with
+         key and certificates; its password is read from PDF_SIGNING_PASSWORD
+       - cert_file: PEM/DER certificate, optionally followed by its chain
+         (leave empty for a PKCS#12 bundle)
+       - reason, location: Recorded in the signature (optional)
 Output: JSON with result
 """
 
@@ -13,110 +23,163 @@ import sys
 import os
 import json
 from datetime import datetime
+from functools import lru_cache
 
 try:
     from pypdf import PdfWriter, PdfReader
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.utils import ImageReader
     from PIL import Image
+    from overlay import FormStamper
+    from stamp import Stamp
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+try:
+    from signing_engine import Signer, sign_document
+except ImportError:
+    Signer = None
+
+from output_manager import OutputJob
+from pipe_io import input_exists, open_input
+
+# Gap between the signature box and the signing date below it
+DATE_OFFSET = 20
+
+
+def _date_y(y):
+    return max(y - DATE_OFFSET, 10)
+
+
+def signature_box(x, y, width, height):
+    """(x0, y0, x1, y1) around a drawn signature and its date."""
+    return (x, min(y, _date_y(y)) - 4, x + width, y + height)
+
+
+@lru_cache(maxsize=None)
+def signature_image_ok(path):
+    """Whether a signature image can be read; checked once per process."""
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+def draw_signature(signature_path, is_image_signature, x, y, width, height):
+    """Build a stamp with a text or image signature and the signing date."""
+    stamp = Stamp()
+    if is_image_signature:
+        if signature_image_ok(signature_path):
+            # Draw signature image
+            stamp.image(x, y, width, height, signature_path)
+        else:
+            # If image fails, draw text signature instead
+            stamp.text(x, y + height / 2 - 6, signature_path[:50], font="Helvetica-Bold", size=12)
+    else:
+        # Draw a line for the signature
+        stamp.line(x, y + height / 2, x + width, y + height / 2)
+        # Draw the signature text
+        stamp.text(
+            x,
+            y + height / 2 - 15,
+            signature_path[:50] if signature_path else "Signed",
+            font="Helvetica",
+            size=10,
+        )
+
+    # Add date below signature
+    stamp.text(
+        x,
+        _date_y(y),
+        f"Signed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        font="Helvetica",
+        size=8,
+    )
+    return stamp
+
+
+def signature_appearance(signature_path, is_image_signature, x=None, y=None, width=200, height=50):
+    """
+    Function of a page's width and height giving the drawn signature and
+    its box there, placed at x, y or by default at the bottom right.
+    """
+
+    def appearance(page_width, page_height):
+        left = page_width - width - 50 if x is None else x
+        bottom = 50 if y is None else y
+        stamp = draw_signature(signature_path, is_image_signature, left, bottom, width, height)
+        return stamp, signature_box(left, bottom, width, height)
+
+    return appearance
 
 
 def sign_pdf(
-    input_path, signature_path, page_num=1, x=None, y=None, width=200, height=50
+    input_path,
+    signature_path,
+    page_num=1,
+    x=None,
+    y=None,
+    width=200,
+    height=50,
+    key_path=None,
+    cert_path=None,
+    reason=None,
+    location=None,
 ):
-    """Add signature (text or image) to PDF."""
-    if not os.path.exists(input_path):
+    """Add signature (text or image) to PDF, digitally signed when given a key."""
+    if not input_exists(input_path):
         return {"success": False, "error": f"PDF file not found: {input_path}"}
+    if key_path and Signer is None:
+        return {"success": False, "error": "Missing dependency: cryptography"}
+    if key_path and not os.path.exists(key_path):
+        return {"success": False, "error": f"Key file not found: {key_path}"}
 
     # Check if signature_path is a valid file or just text
     is_image_signature = os.path.exists(signature_path) and signature_path.strip() != ""
 
     try:
-        reader = PdfReader(input_path)
-        total_pages = len(reader.pages)
-
-        if page_num < 1 or page_num > total_pages:
-            page_num = total_pages  # Default to last page
-
-        # Get page dimensions
-        page = reader.pages[page_num - 1]
-        page_width = float(page.mediabox.width)
-        page_height = float(page.mediabox.height)
-
-        # Default position: bottom right
-        if x is None:
-            x = page_width - width - 50
-        if y is None:
-            y = 50
-
-        # Create signature overlay PDF
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        overlay_path = os.path.join(DOWNLOAD_DIR, f"sig_overlay_{timestamp}.pdf")
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-        c = canvas.Canvas(overlay_path, pagesize=(page_width, page_height))
+        job = OutputJob("sign")
+        appearance = signature_appearance(
+            signature_path, is_image_signature, x, y, width, height
+        )
 
-        if is_image_signature:
-            # Draw signature image
-            try:
-                img = ImageReader(signature_path)
-                c.drawImage(img, x, y, width=width, height=height, mask="auto")
-            except Exception as e:
-                # If image fails, draw text signature instead
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(x, y + height / 2 - 6, signature_path[:50])
-        else:
-            # Draw text signature
-            c.setFont("Helvetica-Bold", 12)
-            # Draw a line for the signature
-            c.line(x, y + height / 2, x + width, y + height / 2)
-            # Draw the signature text
-            c.setFont("Helvetica", 10)
-            c.drawString(
-                x,
-                y + height / 2 - 15,
-                signature_path[:50] if signature_path else "Signed",
+        if key_path:
+            password = os.environ.get("PDF_SIGNING_PASSWORD")
+            signer = Signer.load(
+                key_path, cert_path or None, password.encode() if password else None
             )
+            with job.open(f"signed_{timestamp}.pdf") as output_file:
+                details = sign_document(
+                    input_path, output_file, signer, page_num - 1, appearance, reason, location
+                )
+            return {"success": True, "output": job.output, "digital": True, **details}
 
-        # Add date below signature
-        c.setFont("Helvetica", 8)
-        c.drawString(
-            x,
-            max(y - 20, 10),
-            f"Signed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        )
+        reader = PdfReader(open_input(input_path))
+        total_pages = len(reader.pages)
 
-        c.save()
+        if page_num < 1 or page_num > total_pages:
+            page_num = total_pages  # Default to last page
 
-        # Merge overlay with original PDF
-        overlay_reader = PdfReader(overlay_path)
+        # Create signature stamp
+        page = reader.pages[page_num - 1]
+        signature, _ = appearance(float(page.mediabox.width), float(page.mediabox.height))
         writer = PdfWriter()
+        stamper = FormStamper(writer, prefix="/Sig")
 
         for i, page in enumerate(reader.pages):
+            page = writer.add_page(page)
             if i == page_num - 1:
-                page.merge_page(overlay_reader.pages[0])
-            writer.add_page(page)
+                stamper.apply(page, signature)
 
         # Generate output filename
         output_filename = f"signed_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
 
         # Write signed PDF
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
-
-        # Clean up overlay
-        os.remove(overlay_path)
+        output_path = job.output
 
         return {"success": True, "output": output_path}
 
@@ -136,6 +199,12 @@ if __name__ == "__main__":
     y = float(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] else None
     width = float(sys.argv[6]) if len(sys.argv) > 6 else 200
     height = float(sys.argv[7]) if len(sys.argv) > 7 else 50
-
-    result = sign_pdf(input_path, signature, page_num, x, y, width, height)
+    key_path = sys.argv[8] if len(sys.argv) > 8 and sys.argv[8] else None
+    cert_path = sys.argv[9] if len(sys.argv) > 9 and sys.argv[9] else None
+    reason = sys.argv[10] if len(sys.argv) > 10 and sys.argv[10] else None
+    location = sys.argv[11] if len(sys.argv) > 11 and sys.argv[11] else None
+
+    result = sign_pdf(
+        input_path, signature, page_num, x, y, width, height, key_path, cert_path, reason, location
+    )
     print(json.dumps(result))
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Digital signature engine used by sign_pdf.py.
+A signature is appended to the original bytes as an incremental update,
+so earlier signatures keep covering exactly what they signed: a
+signature dictionary with a /ByteRange and a zero-filled /Contents
+placeholder, a signature field (its widget showing an optional
+appearance), and new revisions of the page and the form that hold the
+field. The original document is hashed while it is copied to the
+output, and the update is built in memory, so signing costs one pass
+over the file however large it is.
+
+/Contents holds a detached CMS (PKCS#7) SignedData over the byte range,
+SHA-256 with signed content type, signing time and message digest
+attributes, and the signer's certificate chain. Key and certificates are
+loaded through `cryptography`; the CMS structure is DER-encoded here,
+since `cryptography` cannot sign a digest computed elsewhere.
+"""
+
+import hashlib
+import io
+from datetime import datetime, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        NumberObject,
+    )
+except ImportError:
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        NumberObject,
+    )
+
+from content_stream import format_number
+from pdf_serializer import Serializer, last_xref, object_span, write_update_end
+from pipe_io import as_stream, mapped_input
+from stamp import StampObjects
+
+# Bytes copied and hashed at a time
+HASH_CHUNK = 1024 * 1024
+
+# Room left in /Contents beyond the certificates and the signature value
+# for the rest of the CMS structure
+CMS_OVERHEAD = 2048
+
+# Annotation flags of the signature widget: Print and Locked
+WIDGET_FLAGS = 132
+
+# AcroForm /SigFlags: SignaturesExist and AppendOnly
+SIG_FLAGS = 3
+
+FIELD_PREFIX = "Signature"
+
+# Decimal places kept in the widget's rectangle and appearance box
+NUMBER_PRECISION = 3
+
+# Width of each number in the /ByteRange placeholder
+BYTE_RANGE_DIGITS = 10
+
+# Object identifiers
+OID_DATA = "1.2.840.113549.1.7.1"
+OID_SIGNED_DATA = "1.2.840.113549.1.7.2"
+OID_CONTENT_TYPE = "1.2.840.113549.1.9.3"
+OID_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+OID_SIGNING_TIME = "1.2.840.113549.1.9.5"
+OID_SHA256 = "2.16.840.1.101.3.4.2.1"
+OID_RSA = "1.2.840.113549.1.1.1"
+OID_ECDSA_SHA256 = "1.2.840.10045.4.3.2"
+
+
+# DER encoding, just what SignedData needs
+
+
+def _der(tag, content):
+    length = len(content)
+    if length < 0x80:
+        header = bytes([tag, length])
+    else:
+        size = (length.bit_length() + 7) // 8
+        header = bytes([tag, 0x80 | size]) + length.to_bytes(size, "big")
+    return header + content
+
+
+def _sequence(*items):
+    return _der(0x30, b"".join(items))
+
+
+def _set(*items):
+    # DER orders the members of a SET OF by their encodings
+    return _der(0x31, b"".join(sorted(items)))
+
+
+def _integer(value):
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def _octets(data):
+    return _der(0x04, data)
+
+
+def _oid(dotted):
+    first, second, *rest = (int(part) for part in dotted.split("."))
+    body = bytearray([40 * first + second])
+    for value in rest:
+        chunk = [value & 0x7F]
+        value >>= 7
+        while value:
+            chunk.append(0x80 | (value & 0x7F))
+            value >>= 7
+        body += bytes(reversed(chunk))
+    return _der(0x06, bytes(body))
+
+
+def _algorithm(dotted, null_parameters=True):
+    return _sequence(_oid(dotted), b"\x05\x00" if null_parameters else b"")
+
+
+def _utc_time(moment):
+    return _der(0x17, moment.strftime("%y%m%d%H%M%SZ").encode("ascii"))
+
+
+def _attribute(dotted, value):
+    return _sequence(_oid(dotted), _set(value))
+
+
+class Signer:
+    """
+    A private key and its certificate chain, loaded once and used for any
+    number of signatures.
+
+        signer = Signer.load("key.pem", "cert.pem")
+        signer = Signer.load("bundle.p12", password=b"secret")
+    """
+
+    def __init__(self, key, certificate, chain=()):
+        if not isinstance(key, (rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey)):
+            raise ValueError("Only RSA and EC signing keys are supported")
+        if key.public_key().public_numbers() != certificate.public_key().public_numbers():
+            raise ValueError("Certificate does not match the signing key")
+        self.key = key
+        self.certificate = certificate
+        self.chain = [cert for cert in chain if cert != certificate]
+
+    @classmethod
+    def load(cls, key_path, cert_path=None, password=None):
+        """
+        Load a PEM or DER private key and certificate file (which may hold
+        the rest of the chain), or a PKCS#12 bundle when cert_path is None.
+        """
+        with open(key_path, "rb") as f:
+            key_data = f.read()
+        if cert_path is None:
+            key, certificate, chain = pkcs12.load_key_and_certificates(key_data, password)
+            if key is None or certificate is None:
+                raise ValueError("PKCS#12 bundle must hold a key and a certificate")
+            return cls(key, certificate, chain)
+
+        if b"-----BEGIN" in key_data:
+            key = serialization.load_pem_private_key(key_data, password)
+        else:
+            key = serialization.load_der_private_key(key_data, password)
+        with open(cert_path, "rb") as f:
+            cert_data = f.read()
+        if b"-----BEGIN" in cert_data:
+            certificates = x509.load_pem_x509_certificates(cert_data)
+        else:
+            certificates = [x509.load_der_x509_certificate(cert_data)]
+        return cls(key, certificates[0], certificates[1:])
+
+    @property
+    def name(self):
+        """Common name of the signer, or the whole subject without one."""
+        names = self.certificate.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        return names[0].value if names else self.certificate.subject.rfc4514_string()
+
+    def _certificates(self):
+        return [
+            cert.public_bytes(serialization.Encoding.DER)
+            for cert in [self.certificate, *self.chain]
+        ]
+
+    def reserved_size(self):
+        """Bytes to reserve in /Contents for this signer's CMS structure."""
+        if isinstance(self.key, rsa.RSAPrivateKey):
+            value = self.key.key_size // 8
+        else:
+            value = 2 * ((self.key.curve.key_size + 7) // 8) + 9
+        return sum(len(cert) for cert in self._certificates()) + value + CMS_OVERHEAD
+
+    def sign_digest(self, digest, signing_time):
+        """Detached CMS SignedData (DER) for a SHA-256 digest of the content."""
+        signed_attributes = [
+            _attribute(OID_CONTENT_TYPE, _oid(OID_DATA)),
+            _attribute(OID_SIGNING_TIME, _utc_time(signing_time)),
+            _attribute(OID_MESSAGE_DIGEST, _octets(digest)),
+        ]
+        # The signature covers the attributes encoded as a SET, although
+        # they are stored under an implicit [0] tag
+        attributes = _set(*signed_attributes)
+        if isinstance(self.key, rsa.RSAPrivateKey):
+            value = self.key.sign(attributes, padding.PKCS1v15(), hashes.SHA256())
+            algorithm = _algorithm(OID_RSA)
+        else:
+            value = self.key.sign(attributes, ec.ECDSA(hashes.SHA256()))
+            algorithm = _algorithm(OID_ECDSA_SHA256, null_parameters=False)
+
+        signer_info = _sequence(
+            _integer(1),
+            _sequence(
+                self.certificate.issuer.public_bytes(),
+                _integer(self.certificate.serial_number),
+            ),
+            _algorithm(OID_SHA256),
+            b"\xa0" + attributes[1:],
+            algorithm,
+            _octets(value),
+        )
+        signed_data = _sequence(
+            _integer(1),
+            _set(_algorithm(OID_SHA256)),
+            _sequence(_oid(OID_DATA)),
+            _der(0xA0, b"".join(self._certificates())),
+            _set(signer_info),
+        )
+        return _sequence(_oid(OID_SIGNED_DATA), _der(0xA0, signed_data))
+
+
+class _Tail(io.BytesIO):
+    """An update built in memory, telling positions in the whole file."""
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+
+    def tell(self):
+        return self.base + super().tell()
+
+
+class _UpdateObjects:
+    """
+    Numbers and collects new objects for the update; stands in for the
+    writer when a stamp's fonts and images are added.
+    """
+
+    def __init__(self, first_num):
+        self.next_num = first_num
+        self.objects = []
+
+    def reserve(self):
+        num = self.next_num
+        self.next_num += 1
+        return IndirectObject(num, 0, None)
+
+    def _add_object(self, obj):
+        ref = self.reserve()
+        self.objects.append((ref.idnum, obj))
+        return ref
+
+
+def _number(value):
+    return format_number(value, NUMBER_PRECISION).encode("ascii")
+
+
+def _pdf_date(moment):
+    return moment.strftime("D:%Y%m%d%H%M%S+00'00'")
+
+
+def _text(value):
+    """A PDF string for value: literal when it is ASCII, else UTF-16."""
+    try:
+        value.encode("ascii")
+        escaped = value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        return b"(" + escaped.encode("ascii") + b")"
+    except UnicodeEncodeError:
+        return b"<feff" + value.encode("utf-16-be").hex().encode("ascii") + b">"
+
+
+def _field_names(fields, names=None):
+    """Fully qualified names of the fields of an AcroForm field tree."""
+    names = set() if names is None else names
+    for field in fields:
+        field = field.get_object()
+        names.add(field.get("/T", ""))
+        if "/Kids" in field:
+            _field_names(field["/Kids"], names)
+    return names
+
+
+def _write_object(out, objects, num, data, generation=0):
+    objects[num] = out.tell()
+    out.write(b"%d %d obj\n" % (num, generation))
+    out.write(data)
+    out.write(b"\nendobj\n")
+
+
+def sign_document(
+    source, out, signer, page_index=0, appearance=None, reason=None, location=None
+):
+    """
+    Copy the PDF source to the binary file out with a signature appended
+    to the page at page_index (the last page when out of range).
+    appearance is None for an invisible signature, or a function of the
+    page's width and height returning (stamp, rect): a Stamp drawn in page
+    space, shown within rect, an (x0, y0, x1, y1) box relative to the
+    page's lower-left corner. Returns the signature's field name, byte
+    range and size.
+    """
+    signing_time = datetime.now(timezone.utc)
+    serializer = Serializer()
+
+    with mapped_input(source) as data:
+        prev_xref, xref_is_stream = last_xref(data)
+        reader = PdfReader(as_stream(data))
+        if reader.is_encrypted:
+            raise ValueError("Cannot sign an encrypted PDF")
+        if not 0 <= page_index < len(reader.pages):
+            page_index = len(reader.pages) - 1
+        trailer = reader.trailer
+        root_ref = trailer.raw_get("/Root")
+        catalog = root_ref.get_object()
+        page = reader.pages[page_index]
+        page_ref = page.indirect_reference
+        box = page.mediabox
+        origin = float(box.left), float(box.bottom)
+        if appearance is not None:
+            appearance = appearance(float(box.width), float(box.height))
+
+        form_ref = catalog.raw_get("/AcroForm") if "/AcroForm" in catalog else None
+        form = DictionaryObject(form_ref.get_object() if form_ref is not None else {})
+        fields = list(form["/Fields"].get_object()) if "/Fields" in form else []
+        existing = _field_names(fields)
+        n = len(existing) + 1
+        while f"{FIELD_PREFIX}{n}" in existing:
+            n += 1
+        field_name = f"{FIELD_PREFIX}{n}"
+        annotations = list(page["/Annots"].get_object()) if "/Annots" in page else []
+        page_entries = {k: v for k, v in page.items() if k != "/Annots"}
+        catalog_entries = {k: v for k, v in catalog.items() if k != "/AcroForm"}
+
+        update = _UpdateObjects(object_span(reader))
+        sig_ref = update.reserve()
+        field_ref = update.reserve()
+        contents_size = signer.reserved_size()
+        placeholder = b"[0 " + b" ".join([b" " * BYTE_RANGE_DIGITS] * 3) + b"]"
+
+        out.seek(0)
+        digest = hashlib.sha256()
+        for start in range(0, len(data), HASH_CHUNK):
+            chunk = data[start : start + HASH_CHUNK]
+            digest.update(chunk)
+            out.write(chunk)
+        tail = _Tail(len(data))
+        if bytes(data[-1:]) not in (b"\n", b"\r"):
+            tail.write(b"\n")
+
+    objects = {}
+    signature = [
+        b"<< /Type /Sig /Filter /Adobe.PPKLite /SubFilter /adbe.pkcs7.detached",
+        b"/Name " + _text(signer.name),
+        b"/M " + _text(_pdf_date(signing_time)),
+    ]
+    if reason:
+        signature.append(b"/Reason " + _text(reason))
+    if location:
+        signature.append(b"/Location " + _text(location))
+    # Positions of the byte range and contents placeholders in the file
+    objects[sig_ref.idnum] = tail.tell()
+    tail.write(b"%d 0 obj\n" % sig_ref.idnum + b" ".join(signature) + b" /ByteRange ")
+    byte_range_at = tail.tell()
+    tail.write(placeholder + b" /Contents ")
+    contents_at = tail.tell()
+    tail.write(b"<" + b"0" * (2 * contents_size) + b">")
+    contents_end = tail.tell()
+    tail.write(b" >>\nendobj\n")
+
+    field = [
+        b"<< /Type /Annot /Subtype /Widget /FT /Sig",
+        b"/T " + _text(field_name),
+        b"/V " + serializer.reference(sig_ref),
+        b"/P " + serializer.reference(page_ref),
+        b"/F %d" % WIDGET_FLAGS,
+    ]
+    if appearance is None:
+        field.append(b"/Rect [0 0 0 0]")
+    else:
+        stamp, (x0, y0, x1, y1) = appearance
+        rect = [x0 + origin[0], y0 + origin[1], x1 + origin[0], y1 + origin[1]]
+        field.append(b"/Rect [%s]" % b" ".join(_number(v) for v in rect))
+        resources = stamp.resources(StampObjects(update))
+        form_stream = update.reserve()
+        field.append(b"/AP << /N %s >>" % serializer.reference(form_stream))
+        data = stamp.content()
+        appearance_entries = b" ".join(
+            [
+                b"<< /Type /XObject /Subtype /Form",
+                b"/BBox [%s]" % b" ".join(_number(v) for v in (x0, y0, x1, y1)),
+                b"/Resources " + serializer.value(resources),
+                b"/Length %d >>" % len(data),
+            ]
+        )
+        _write_object(
+            tail,
+            objects,
+            form_stream.idnum,
+            appearance_entries + b"\nstream\n" + data + b"\nendstream",
+        )
+    field.append(b">>")
+    _write_object(tail, objects, field_ref.idnum, b" ".join(field))
+
+    for num, obj in update.objects:
+        _write_object(tail, objects, num, serializer.value(obj))
+
+    # New revisions of the page, with the widget, and of the form, with the field
+    annotations.append(field_ref)
+    _write_object(
+        tail,
+        objects,
+        page_ref.idnum,
+        serializer.dictionary(
+            page_entries, b"/Annots " + serializer.value(ArrayObject(annotations))
+        ),
+        page_ref.generation,
+    )
+    form[NameObject("/Fields")] = ArrayObject([*fields, field_ref])
+    form[NameObject("/SigFlags")] = NumberObject(SIG_FLAGS)
+    generations = {page_ref.idnum: page_ref.generation}
+    if isinstance(form_ref, IndirectObject):
+        _write_object(tail, objects, form_ref.idnum, serializer.value(form), form_ref.generation)
+        generations[form_ref.idnum] = form_ref.generation
+    else:
+        _write_object(
+            tail,
+            objects,
+            root_ref.idnum,
+            serializer.dictionary(catalog_entries, b"/AcroForm " + serializer.value(form)),
+            root_ref.generation,
+        )
+        generations[root_ref.idnum] = root_ref.generation
+
+    write_update_end(tail, objects, generations, prev_xref, xref_is_stream, trailer)
+    end = tail.tell()
+
+    byte_range = [0, contents_at, contents_end, end - contents_end]
+    values = b"[%s]" % b" ".join(b"%d" % v for v in byte_range)
+    buffer = tail.getbuffer()
+    base = tail.base
+
+    def span(start, stop):
+        return buffer[start - base : stop - base]
+
+    span(byte_range_at, byte_range_at + len(placeholder))[:] = values.ljust(len(placeholder))
+    digest.update(span(base, contents_at))
+    digest.update(span(contents_end, end))
+
+    cms = signer.sign_digest(digest.digest(), signing_time)
+    if len(cms) > contents_size:
+        raise ValueError("Signature is larger than the space reserved for it")
+    span(contents_at + 1, contents_at + 1 + 2 * len(cms))[:] = cms.hex().encode("ascii")
+    del buffer
+    out.write(tail.getvalue())
+
+    return {
+        "field": field_name,
+        "byteRange": byte_range,
+        "signatureBytes": len(cms),
+        "signer": signer.name,
+    }
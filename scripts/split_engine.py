@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Parallel split engine used by split_pdf.py.
+Each output part is written by a worker process that maps the source file
+once and copies only the objects the part's pages reach. Resource
+dictionaries are pruned to the names each page or form actually uses, so
+shared resource dictionaries do not drag every font and image into every
+part. Size and outline splits are planned from the structure scanner,
+without decoding or test-writing anything.
+"""
+
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import DictionaryObject, NameObject, StreamObject
+except ImportError:
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import DictionaryObject, NameObject, StreamObject
+
+from content_stream import resource_names
+from pdf_scan import PdfScan, Ref, collect_refs, decode_string, decode_text
+from pipe_io import as_stream, map_file
+from pdf_serializer import (
+    EXCLUDED_PAGE_KEYS,
+    EXCLUDED_TYPES,
+    FIRST_SOURCE_NUM,
+    PAGES_NUM,
+    PDF_HEADER,
+    Serializer,
+    write_document_end,
+)
+
+# Resource categories whose entries are looked up by name from content
+PRUNABLE_RESOURCES = (
+    "/Font",
+    "/XObject",
+    "/ExtGState",
+    "/Shading",
+    "/Pattern",
+    "/ColorSpace",
+    "/Properties",
+)
+
+# Estimated bytes every part costs for its header, page tree, catalog and trailer
+PART_OVERHEAD = 1024
+
+# Estimated bytes per copied object for its xref entry and obj/endobj framing
+OBJECT_OVERHEAD = 30
+
+# Structural objects a page's closure never includes
+STRUCTURE_TYPES = ("/Page", "/Pages", "/Catalog")
+
+# Source opened once per worker process: (path, mmap, pages)
+_SOURCE = None
+
+
+def _source_pages(path):
+    """The worker's page list for path, mapping the file on first use."""
+    global _SOURCE
+    if _SOURCE is None or _SOURCE[0] != path:
+        data = map_file(path)
+        reader = PdfReader(as_stream(data))
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ValueError("File is encrypted")
+        _SOURCE = (path, data, list(reader.pages))
+    return _SOURCE[2]
+
+
+def _prunable_count(resources):
+    """Number of named entries a resources dictionary could lose to pruning."""
+    resources = resources.get_object()
+    count = 0
+    for key in PRUNABLE_RESOURCES:
+        category = resources.get(key)
+        if category is not None:
+            count += len(category.get_object())
+    return count
+
+
+def prune_resources(resources, names):
+    """
+    Copy of a resources dictionary keeping only the named entries of each
+    prunable category. Categories left empty are dropped.
+    """
+    resources = resources.get_object()
+    pruned = DictionaryObject()
+    for key, value in resources.items():
+        if key not in PRUNABLE_RESOURCES:
+            pruned[NameObject(key)] = value
+            continue
+        category = value.get_object()
+        if not isinstance(category, DictionaryObject):
+            continue
+        kept = DictionaryObject()
+        for name in category.keys():
+            if name in names:
+                kept[NameObject(name)] = category.raw_get(name)
+        if kept:
+            pruned[NameObject(key)] = kept
+    return pruned
+
+
+def _has_content(obj):
+    """True for streams whose data is drawn with their own /Resources."""
+    return obj.get("/Subtype") == "/Form" or obj.get("/PatternType") == 1
+
+
+def _worth_pruning(obj):
+    """
+    Pruning needs the content decoded, so it is skipped when the resources
+    hold at most one named entry: a lone font or image is almost always used.
+    """
+    resources = obj.get("/Resources")
+    return resources is not None and _prunable_count(resources) > 1
+
+
+class _PartWriter(Serializer):
+    """Serializes the closure of a set of pages with compact numbering."""
+
+    def __init__(self, out, page_numbers):
+        self.out = out
+        self.numbers = dict(page_numbers)
+        self.next_num = FIRST_SOURCE_NUM + len(page_numbers)
+        self.queue = deque()
+        self.objects = {}
+
+    def reference(self, ref):
+        if ref.idnum in self.numbers:
+            return b"%d 0 R" % self.numbers[ref.idnum]
+        target = ref.get_object()
+        if target is None:
+            return b"null"
+        if isinstance(target, DictionaryObject):
+            obj_type = target.get("/Type")
+            if obj_type in EXCLUDED_TYPES or obj_type == "/Page":
+                return b"null"
+        num = self.next_num
+        self.next_num += 1
+        self.numbers[ref.idnum] = num
+        self.queue.append((num, target))
+        return b"%d 0 R" % num
+
+    def value(self, obj):
+        if isinstance(obj, StreamObject) and _has_content(obj) and _worth_pruning(obj):
+            entries = dict(obj.items())
+            entries["/Resources"] = prune_resources(
+                obj["/Resources"], resource_names(obj.get_data())
+            )
+            return self.stream(obj, entries)
+        return super().value(obj)
+
+    def write(self, num, data):
+        self.objects[num] = self.out.tell()
+        self.out.write(b"%d 0 obj\n" % num)
+        self.out.write(data)
+        self.out.write(b"\nendobj\n")
+
+    def write_page(self, num, page):
+        entries = {k: v for k, v in page.items() if k not in EXCLUDED_PAGE_KEYS}
+        if _worth_pruning(page):
+            content = page.get_contents()
+            names = resource_names(content.get_data()) if content is not None else set()
+            entries["/Resources"] = prune_resources(page["/Resources"], names)
+        self.write(num, self.dictionary(entries, b"/Parent %d 0 R" % PAGES_NUM))
+        while self.queue:
+            queued_num, target = self.queue.popleft()
+            self.write(queued_num, self.value(target))
+
+
+def write_part(path, page_indices, output_path=None):
+    """
+    Write the pages at page_indices (0-based) of path to output_path, or
+    into memory when output_path is None (the result then carries "data").
+    Returns the part's page count, size and timing.
+    """
+    started = time.perf_counter()
+    source_pages = _source_pages(path)
+    pages = [source_pages[i] for i in page_indices]
+    numbers = {
+        page.indirect_reference.idnum: FIRST_SOURCE_NUM + n for n, page in enumerate(pages)
+    }
+    out = io.BytesIO() if output_path is None else open(output_path, "wb")
+    with out:
+        out.write(PDF_HEADER)
+        part = _PartWriter(out, numbers)
+        for page in pages:
+            part.write_page(numbers[page.indirect_reference.idnum], page)
+        write_document_end(out, part.objects, list(numbers.values()))
+        result = {
+            "output": output_path,
+            "pages": len(pages),
+            "bytes": out.tell(),
+        }
+        if output_path is None:
+            result["data"] = out.getvalue()
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _write_part_job(job):
+    path, page_indices, output_path = job
+    return write_part(path, page_indices, output_path)
+
+
+def iter_parts(path, parts, workers=None):
+    """
+    Write every (page_indices, output_path) part of path, in parallel
+    across worker processes when there is more than one part. A part whose
+    output_path is None is returned in memory. Yields one result per part,
+    in order, as soon as it is ready.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(parts)))
+    jobs = [(path, page_indices, output_path) for page_indices, output_path in parts]
+
+    if workers == 1:
+        for job in jobs:
+            yield _write_part_job(job)
+        return
+
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_write_part_job, jobs, chunksize=chunksize)
+
+
+def split_parts(path, parts, workers=None):
+    """Write every part of path (see iter_parts); returns results in order."""
+    return list(iter_parts(path, parts, workers))
+
+
+def _page_closure(scan, page_num):
+    """Object numbers a page drags into a part: itself and all it references."""
+    page = scan.get(Ref(page_num))
+    if not isinstance(page, dict):
+        return {page_num}
+    stack = []
+    for key, value in page.items():
+        if key not in EXCLUDED_PAGE_KEYS:
+            collect_refs(value, stack)
+    # Resources may be inherited from an ancestor /Pages node
+    node = page
+    seen_nodes = set()
+    while "/Resources" not in node and isinstance(node.get("/Parent"), Ref):
+        parent = node["/Parent"]
+        if parent.num in seen_nodes:
+            break
+        seen_nodes.add(parent.num)
+        node = scan.get(parent)
+        if not isinstance(node, dict):
+            break
+        collect_refs(node.get("/Resources"), stack)
+
+    closure = {page_num}
+    while stack:
+        num = stack.pop()
+        if num in closure or num not in scan.objects:
+            continue
+        header = scan.objects[num]["header"]
+        if isinstance(header, dict) and header.get("/Type") in STRUCTURE_TYPES:
+            continue
+        closure.add(num)
+        stack.extend(scan.references(num))
+    return closure
+
+
+def plan_size_parts(path, max_bytes):
+    """
+    Group consecutive pages into parts of at most max_bytes (estimated).
+    Each page costs the file bytes of every object in its closure that the
+    part does not hold yet, so shared fonts and images are counted once per
+    part. No trial writes are made; pruning only makes real parts smaller.
+    A page that alone exceeds the limit gets a part of its own.
+    Returns a list of (page indices, estimated bytes).
+    """
+    with PdfScan(path) as scan:
+        costs = {num: info["size"] + OBJECT_OVERHEAD for num, info in scan.objects.items()}
+        parts = []
+        current = []
+        included = set()
+        size = PART_OVERHEAD
+        for index, page_num in enumerate(scan.page_refs()):
+            closure = _page_closure(scan, page_num)
+            added = sum(costs.get(num, 0) for num in closure - included)
+            if current and size + added > max_bytes:
+                parts.append((current, size))
+                current = []
+                included = set()
+                size = PART_OVERHEAD
+                added = sum(costs.get(num, 0) for num in closure)
+            current.append(index)
+            included |= closure
+            size += added
+        if current:
+            parts.append((current, size))
+    return parts
+
+
+def _named_destinations(scan, catalog):
+    """Map of destination name (bytes) to destination from /Dests and /Names."""
+    names = {}
+    dests = scan.get(catalog.get("/Dests"))
+    if isinstance(dests, dict):
+        for key, value in dests.items():
+            names[key[1:].encode("latin-1")] = value
+
+    name_tree = scan.get(catalog.get("/Names"))
+    root = scan.get(name_tree.get("/Dests")) if isinstance(name_tree, dict) else None
+    stack = [root]
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict) or id(node) in seen:
+            continue
+        seen.add(id(node))
+        pairs = scan.get(node.get("/Names"))
+        if isinstance(pairs, list):
+            for key, value in zip(pairs[0::2], pairs[1::2]):
+                if isinstance(key, bytes):
+                    names[decode_string(key)] = value
+        kids = scan.get(node.get("/Kids"))
+        if isinstance(kids, list):
+            stack.extend(scan.get(kid) for kid in kids)
+    return names
+
+
+def _destination_page(scan, dest, named):
+    """Page object number a destination (explicit or named) points at."""
+    for _ in range(4):
+        dest = scan.get(dest)
+        if isinstance(dest, dict):
+            dest = dest.get("/D")
+        elif isinstance(dest, str):
+            dest = named.get(dest[1:].encode("latin-1"))
+        elif isinstance(dest, bytes):
+            dest = named.get(decode_string(dest))
+        elif isinstance(dest, list):
+            return dest[0].num if dest and isinstance(dest[0], Ref) else None
+        else:
+            return None
+    return None
+
+
+def plan_outline_parts(path, level=1):
+    """
+    One part per outline entry down to `level`, read from the /Outlines tree.
+    Entries are ordered by the page they point at; pages before the first
+    entry become a part of their own. Returns a list of (page indices, title),
+    or an empty list when the document has no usable outline.
+    """
+    with PdfScan(path) as scan:
+        page_refs = scan.page_refs()
+        page_index = {num: i for i, num in enumerate(page_refs)}
+        catalog = scan.get(scan.trailer.get("/Root"))
+        if not isinstance(catalog, dict):
+            return []
+        outlines = scan.get(catalog.get("/Outlines"))
+        if not isinstance(outlines, dict):
+            return []
+        named = None
+        starts = {}
+
+        stack = [(outlines.get("/First"), 1)]
+        seen = set()
+        while stack:
+            ref, depth = stack.pop()
+            while isinstance(ref, Ref) and ref.num not in seen:
+                seen.add(ref.num)
+                item = scan.get(ref)
+                if not isinstance(item, dict):
+                    break
+                dest = item.get("/Dest")
+                if dest is None:
+                    action = scan.get(item.get("/A"))
+                    if isinstance(action, dict) and action.get("/S") == "/GoTo":
+                        dest = action.get("/D")
+                if isinstance(scan.get(dest), (str, bytes)) and named is None:
+                    named = _named_destinations(scan, catalog)
+                page_num = _destination_page(scan, dest, named or {})
+                if page_num in page_index and page_index[page_num] not in starts:
+                    title = item.get("/Title")
+                    starts[page_index[page_num]] = (
+                        decode_text(title) if isinstance(title, bytes) else ""
+                    )
+                if depth < level and isinstance(item.get("/First"), Ref):
+                    stack.append((item["/First"], depth + 1))
+                ref = item.get("/Next")
+
+    if not starts:
+        return []
+    boundaries = sorted(starts)
+    if boundaries[0] != 0:
+        starts[0] = None
+        boundaries.insert(0, 0)
+    boundaries.append(len(page_refs))
+    return [
+        (list(range(start, end)), starts[start])
+        for start, end in zip(boundaries, boundaries[1:])
+    ]
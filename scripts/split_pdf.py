@@ -2,7 +2,9 @@
 """
 Split a PDF file into multiple files.
 Usage: python split_pdf.py <input_file> <mode> [params...]
-Modes: all, ranges, extract, every, count
+Modes: all, ranges, extract, every, count, size, outline
+  size:    maxSizeMB=<n>     parts of at most n MB (default 10)
+  outline: outlineLevel=<n>  one part per bookmark down to level n (default 1)
 Output: JSON with result
 """
 
@@ -13,62 +15,14 @@ import re
 from datetime import datetime
 
 try:
-    from pypdf import PdfWriter, PdfReader
+    from pypdf import PdfReader
 except ImportError:
-    from PyPDF2 import PdfWriter, PdfReader
+    from PyPDF2 import PdfReader
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
-
-
-def parse_page_ranges(range_str, total_pages):
-    """Parse page range string like '1-3, 5-7, 10' into list of page numbers."""
-    pages = []
-    parts = range_str.split(",")
-
-    for part in parts:
-        part = part.strip()
-        if "-" in part:
-            # Range like "1-3"
-            try:
-                start, end = part.split("-")
-                start = int(start.strip())
-                end = int(end.strip())
-                for p in range(start, end + 1):
-                    if 1 <= p <= total_pages:
-                        pages.append(p)
-            except ValueError:
-                continue
-        else:
-            # Single page like "5"
-            try:
-                p = int(part)
-                if 1 <= p <= total_pages:
-                    pages.append(p)
-            except ValueError:
-                continue
-
-    return sorted(set(pages))
-
-
-def parse_page_numbers(num_str, total_pages):
-    """Parse page numbers like '1, 3, 5, 7' into list."""
-    pages = []
-    parts = num_str.split(",")
-
-    for part in parts:
-        part = part.strip()
-        try:
-            p = int(part)
-            if 1 <= p <= total_pages:
-                pages.append(p)
-        except ValueError:
-            continue
-
-    return sorted(set(pages))
+from page_selection import parse_pages
+from split_engine import iter_parts, plan_outline_parts, plan_size_parts, split_parts
+from output_manager import OutputJob
+from zip_packager import ZipPackager
 
 
 def split_pdf(input_path, mode="all", params=None):
@@ -86,27 +40,17 @@ def split_pdf(input_path, mode="all", params=None):
         if total_pages == 0:
             return {"success": False, "error": "PDF has no pages"}
 
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(input_path))[0]
 
-        output_files = []
+        # (0-based page indices, output filename) for every part
+        parts = []
 
         if mode == "all":
             # Extract each page as separate PDF
             for i in range(total_pages):
-                writer = PdfWriter()
-                writer.add_page(reader.pages[i])
-
                 output_filename = f"{base_name}_page_{i + 1}_{timestamp}.pdf"
-                output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
-
-                output_files.append(output_path)
+                parts.append(([i], output_filename))
 
         elif mode == "ranges":
             # Split by page ranges
@@ -114,21 +58,16 @@ def split_pdf(input_path, mode="all", params=None):
             if not range_str:
                 return {"success": False, "error": "No page ranges specified"}
 
-            pages = parse_page_ranges(range_str, total_pages)
+            try:
+                pages = parse_pages(range_str, total_pages)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
             if not pages:
                 return {"success": False, "error": "Invalid page ranges"}
 
-            for i, page_num in enumerate(pages):
-                writer = PdfWriter()
-                writer.add_page(reader.pages[page_num - 1])  # 0-indexed
-
+            for page_num in pages:
                 output_filename = f"{base_name}_page_{page_num}_{timestamp}.pdf"
-                output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
-
-                output_files.append(output_path)
+                parts.append(([page_num - 1], output_filename))
 
         elif mode == "extract":
             # Extract specific pages into single PDF
@@ -136,21 +75,15 @@ def split_pdf(input_path, mode="all", params=None):
             if not num_str:
                 return {"success": False, "error": "No page numbers specified"}
 
-            pages = parse_page_numbers(num_str, total_pages)
+            try:
+                pages = parse_pages(num_str, total_pages)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
             if not pages:
                 return {"success": False, "error": "Invalid page numbers"}
 
-            writer = PdfWriter()
-            for page_num in pages:
-                writer.add_page(reader.pages[page_num - 1])  # 0-indexed
-
             output_filename = f"{base_name}_extracted_{timestamp}.pdf"
-            output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
-
-            output_files.append(output_path)
+            parts.append((list(pages.indices()), output_filename))
 
         elif mode == "every":
             # Split every X pages
@@ -164,18 +97,8 @@ def split_pdf(input_path, mode="all", params=None):
             part_num = 1
             for start in range(0, total_pages, every):
                 end = min(start + every, total_pages)
-
-                writer = PdfWriter()
-                for i in range(start, end):
-                    writer.add_page(reader.pages[i])
-
                 output_filename = f"{base_name}_part_{part_num}_{timestamp}.pdf"
-                output_path = os.path.join(DOWNLOAD_DIR, output_filename)
-
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
-
-                output_files.append(output_path)
+                parts.append((list(range(start, end)), output_filename))
                 part_num += 1
 
         elif mode == "count":
@@ -196,48 +119,80 @@ def split_pdf(input_path, mode="all", params=None):
             for part_num in range(1, count + 1):
                 # Distribute extra pages among first files
                 end = start + pages_per_file + (1 if part_num <= extra else 0)
+                output_filename = f"{base_name}_part_{part_num}_{timestamp}.pdf"
+                parts.append((list(range(start, end)), output_filename))
+                start = end
 
-                writer = PdfWriter()
-                for i in range(start, end):
-                    writer.add_page(reader.pages[i])
+        elif mode == "size":
+            # Split into parts no bigger than maxSizeMB, planned from object sizes
+            try:
+                max_mb = float(params.get("maxSizeMB", "10"))
+                if max_mb <= 0:
+                    max_mb = 10
+            except ValueError:
+                max_mb = 10
 
+            planned = plan_size_parts(input_path, int(max_mb * 1024 * 1024))
+            for part_num, (indices, _) in enumerate(planned, 1):
                 output_filename = f"{base_name}_part_{part_num}_{timestamp}.pdf"
-                output_path = os.path.join(DOWNLOAD_DIR, output_filename)
+                parts.append((indices, output_filename))
 
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
+        elif mode == "outline":
+            # One part per bookmark, read from the outline tree
+            try:
+                level = max(1, int(params.get("outlineLevel", "1")))
+            except ValueError:
+                level = 1
 
-                output_files.append(output_path)
-                start = end
+            planned = plan_outline_parts(input_path, level)
+            if not planned:
+                return {"success": False, "error": "PDF has no bookmarks to split by"}
+
+            for part_num, (indices, title) in enumerate(planned, 1):
+                slug = re.sub(r"[^A-Za-z0-9]+", "_", title or "front").strip("_")[:40]
+                slug = f"_{slug}" if slug else ""
+                output_filename = f"{base_name}_part_{part_num}{slug}_{timestamp}.pdf"
+                parts.append((indices, output_filename))
 
         else:
             # Default: extract all pages
             return split_pdf(input_path, "all", params)
 
-        # Create a zip file if multiple files
-        if len(output_files) > 1:
-            import zipfile
-
-            zip_filename = f"{base_name}_split_{timestamp}.zip"
-            zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
-
-            with zipfile.ZipFile(zip_path, "w") as zipf:
-                for file_path in output_files:
-                    zipf.write(file_path, os.path.basename(file_path))
-                    os.remove(file_path)  # Clean up individual files
-
+        job = OutputJob("split")
+        if len(parts) == 1:
+            indices, output_filename = parts[0]
+            output_path = job.staged(output_filename)
+            result = split_parts(input_path, [(indices, output_path)])[0]
+            output_path = job.publish(output_path)
             return {
                 "success": True,
-                "output": zip_path,
-                "files_count": len(output_files),
-            }
-        else:
-            return {
-                "success": True,
-                "output": output_files[0] if output_files else "",
+                "output": output_path,
                 "files_count": 1,
+                "originalSize": os.path.getsize(input_path),
+                "partsSize": result["bytes"],
             }
 
+        # Parts are written in parallel, each with only the objects it uses,
+        # and streamed from memory into the zip as they arrive
+        zip_filename = f"{base_name}_split_{timestamp}.zip"
+        zip_path = job.staged(zip_filename)
+        jobs = [(indices, None) for indices, _ in parts]
+        parts_size = 0
+        with ZipPackager(zip_path) as archive:
+            for (_, output_filename), result in zip(parts, iter_parts(input_path, jobs)):
+                archive.add(output_filename, result["data"])
+                parts_size += result["bytes"]
+        zip_path = job.publish(zip_path)
+
+        return {
+            "success": True,
+            "output": zip_path,
+            "files_count": len(parts),
+            "originalSize": os.path.getsize(input_path),
+            "partsSize": parts_size,
+            "zipSize": os.path.getsize(zip_path),
+        }
+
     except Exception as e:
         return {"success": False, "error": str(e)}
 
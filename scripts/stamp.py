@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Native stamping API shared by the stamping tools.
+Text, rectangles, lines and images are written straight as PDF operators
+instead of drawing a reportlab canvas and parsing it back. Text uses one
+of the standard 14 fonts, measured with the AFM metrics that ship with
+reportlab (loaded once per font), or an embedded TrueType font; opacity
+goes through an ExtGState. Building a stamp is string formatting.
+
+    stamp = Stamp()
+    stamp.text(306, 30, "Page 3 of 12", align="center")
+    stamp.rect(20, 20, 572, 752, stroke=(1, 0, 0), line_width=5)
+
+A stamp is placed on pages through overlay.FormStamper.
+"""
+
+import math
+import os
+import zlib
+from functools import lru_cache
+
+try:
+    from pypdf.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+        NumberObject,
+    )
+except ImportError:
+    from PyPDF2.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+        NumberObject,
+    )
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFontFile
+
+from content_stream import format_number
+
+STANDARD_FONTS = (
+    "Helvetica",
+    "Helvetica-Bold",
+    "Helvetica-Oblique",
+    "Helvetica-BoldOblique",
+    "Times-Roman",
+    "Times-Bold",
+    "Times-Italic",
+    "Times-BoldItalic",
+    "Courier",
+    "Courier-Bold",
+    "Courier-Oblique",
+    "Courier-BoldOblique",
+    "Symbol",
+    "ZapfDingbats",
+)
+
+# Fonts with their own built-in encoding instead of WinAnsi
+SYMBOLIC_FONTS = ("Symbol", "ZapfDingbats")
+
+# Decimal places kept in coordinates written to content streams
+PRECISION = 3
+
+# Text encoding of the non-symbolic fonts (WinAnsiEncoding)
+TEXT_CODEC = "cp1252"
+
+ALIGNMENTS = ("left", "center", "right")
+
+# Encoded images kept per process (see StampImage)
+IMAGE_CACHE_SIZE = 16
+
+
+def _num(value):
+    return format_number(value, PRECISION)
+
+
+def _color(rgb):
+    return " ".join(_num(c) for c in rgb)
+
+
+def parse_color(value, default=(0, 0, 0)):
+    """An (r, g, b) tuple in 0..1 from "#rrggbb" or a tuple; default otherwise."""
+    if isinstance(value, (tuple, list)) and len(value) == 3:
+        return tuple(float(c) for c in value)
+    if isinstance(value, str) and value.startswith("#") and len(value) == 7:
+        try:
+            return tuple(int(value[i : i + 2], 16) / 255 for i in (1, 3, 5))
+        except ValueError:
+            pass
+    return default
+
+
+def _literal(data):
+    """A PDF literal string for already-encoded bytes."""
+    escaped = data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + escaped.replace(b"\r", b"\\r").replace(b"\n", b"\\n") + b")"
+
+
+class StandardFont:
+    """One of the standard 14 fonts; nothing is embedded."""
+
+    def __init__(self, name):
+        if name not in STANDARD_FONTS:
+            raise ValueError(f"Not a standard font: {name}")
+        self.name = name
+        self.key = name
+        self.widths = pdfmetrics.getFont(name).widths
+
+    def encode(self, text):
+        if self.name in SYMBOLIC_FONTS:
+            return bytes(ord(ch) if ord(ch) < 256 else 0x3F for ch in text)
+        return text.encode(TEXT_CODEC, errors="replace")
+
+    def width(self, text, size):
+        """Width of text in points at size."""
+        return sum(self.widths[b] for b in self.encode(text)) * size / 1000
+
+    def pdf_object(self, writer):
+        font = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/" + self.name),
+            }
+        )
+        if self.name not in SYMBOLIC_FONTS:
+            font[NameObject("/Encoding")] = NameObject("/WinAnsiEncoding")
+        return writer._add_object(font)
+
+
+class EmbeddedFont(StandardFont):
+    """A TrueType font file embedded whole, addressed through WinAnsi codes."""
+
+    def __init__(self, path):
+        ttf = TTFontFile(path)
+        self.name = ttf.name.decode("latin-1") if isinstance(ttf.name, bytes) else ttf.name
+        self.key = os.path.abspath(path)
+        self.path = path
+        self.ttf = ttf
+        self.widths = []
+        for code in range(256):
+            char = bytes([code]).decode(TEXT_CODEC, errors="ignore")
+            width = ttf.charWidths.get(ord(char)) if char else None
+            self.widths.append(width if width is not None else ttf.defaultWidth)
+
+    def encode(self, text):
+        return text.encode(TEXT_CODEC, errors="replace")
+
+    def pdf_object(self, writer):
+        ttf = self.ttf
+        with open(self.path, "rb") as f:
+            data = f.read()
+        font_file = DecodedStreamObject()
+        font_file.set_data(data)
+        font_file = font_file.flate_encode()
+        font_file[NameObject("/Length1")] = NumberObject(len(data))
+
+        descriptor = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/FontDescriptor"),
+                NameObject("/FontName"): NameObject("/" + self.name),
+                # Nonsymbolic: the WinAnsi codes map through the font's cmap
+                NameObject("/Flags"): NumberObject(32),
+                NameObject("/FontBBox"): ArrayObject(FloatObject(v) for v in ttf.bbox),
+                NameObject("/ItalicAngle"): FloatObject(ttf.italicAngle),
+                NameObject("/Ascent"): FloatObject(ttf.ascent),
+                NameObject("/Descent"): FloatObject(ttf.descent),
+                NameObject("/CapHeight"): FloatObject(ttf.capHeight),
+                NameObject("/StemV"): NumberObject(ttf.stemV),
+                NameObject("/FontFile2"): writer._add_object(font_file),
+            }
+        )
+        font = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/TrueType"),
+                NameObject("/BaseFont"): NameObject("/" + self.name),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+                NameObject("/FirstChar"): NumberObject(0),
+                NameObject("/LastChar"): NumberObject(255),
+                NameObject("/Widths"): ArrayObject(FloatObject(round(w, 2)) for w in self.widths),
+                NameObject("/FontDescriptor"): writer._add_object(descriptor),
+            }
+        )
+        return writer._add_object(font)
+
+
+@lru_cache(maxsize=None)
+def get_font(font):
+    """A standard font by name, or a TrueType font by file path (cached)."""
+    if font in STANDARD_FONTS:
+        return StandardFont(font)
+    if os.path.exists(font):
+        return EmbeddedFont(font)
+    raise ValueError(f"Unknown font: {font}")
+
+
+def text_width(text, font="Helvetica", size=12):
+    """Width of text in points when set in font at size."""
+    return get_font(font).width(text, size)
+
+
+@lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def _encode_image(path, mtime):
+    """
+    An image file's encoded XObject data and soft mask, decoded and
+    compressed once per process however many documents embed it. Each is
+    (data, filter, width, height, mode); the mask is None when opaque.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        if image.format == "JPEG" and image.mode in ("L", "RGB"):
+            # JPEG data can be embedded as it is
+            with open(path, "rb") as f:
+                data = f.read()
+            return (data, "/DCTDecode", image.width, image.height, image.mode), None
+
+        alpha = None
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            alpha = image.getchannel("A")
+            if alpha.getextrema() == (255, 255):
+                alpha = None
+        mode = "L" if image.mode in ("1", "L", "LA") else "RGB"
+        size = image.width, image.height
+        encoded = (zlib.compress(image.convert(mode).tobytes()), "/FlateDecode", *size, mode)
+        if alpha is not None:
+            alpha = (zlib.compress(alpha.tobytes()), "/FlateDecode", *size, "L")
+        return encoded, alpha
+
+
+class StampImage:
+    """A raster image for a stamp, encoded once per process as an image XObject."""
+
+    def __init__(self, path):
+        self.path = path
+        self.key = os.path.abspath(path)
+
+    def pdf_object(self, writer):
+        encoded, alpha = _encode_image(self.key, os.path.getmtime(self.key))
+        stream = self._image_stream(*encoded)
+        if alpha is not None:
+            stream[NameObject("/SMask")] = writer._add_object(self._image_stream(*alpha))
+        return writer._add_object(stream)
+
+    @staticmethod
+    def _image_stream(data, filter_name, width, height, mode):
+        # Already encoded: the data is written as it is under its filter
+        stream = DecodedStreamObject()
+        stream.set_data(data)
+        stream[NameObject("/Filter")] = NameObject(filter_name)
+        stream[NameObject("/Type")] = NameObject("/XObject")
+        stream[NameObject("/Subtype")] = NameObject("/Image")
+        stream[NameObject("/Width")] = NumberObject(width)
+        stream[NameObject("/Height")] = NumberObject(height)
+        stream[NameObject("/ColorSpace")] = NameObject(
+            "/DeviceGray" if mode == "L" else "/DeviceRGB"
+        )
+        stream[NameObject("/BitsPerComponent")] = NumberObject(8)
+        return stream
+
+
+class Stamp:
+    """
+    Operators and resources of one stamp. Coordinates are in points from
+    the lower-left corner of the page's media box.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.fonts = {}
+        self.states = {}
+        self.images = {}
+
+    def _font(self, font):
+        font = get_font(font)
+        for name, known in self.fonts.items():
+            if known is font:
+                return name
+        name = f"/F{len(self.fonts) + 1}"
+        self.fonts[name] = font
+        return name
+
+    def _state(self, opacity):
+        """Graphics-state operator for a fill/stroke opacity, or b"" for opaque."""
+        if opacity is None or opacity >= 1:
+            return b""
+        opacity = round(max(0.0, float(opacity)), 3)
+        for name, known in self.states.items():
+            if known == opacity:
+                return f"{name} gs ".encode()
+        name = f"/GS{len(self.states) + 1}"
+        self.states[name] = opacity
+        return f"{name} gs ".encode()
+
+    def text(self, x, y, text, font="Helvetica", size=12, color=(0, 0, 0),
+             align="left", opacity=None, angle=0):
+        """
+        Set a single line of text with its baseline at (x, y). align places x
+        at the left, centre or right of the text; angle rotates it
+        counter-clockwise about (x, y).
+        """
+        if align not in ALIGNMENTS:
+            raise ValueError(f"Invalid alignment: {align}")
+        name = self._font(font)
+        font = self.fonts[name]
+        offset = 0
+        if align != "left":
+            width = font.width(text, size)
+            offset = -width / 2 if align == "center" else -width
+        radians = math.radians(angle)
+        cos, sin = math.cos(radians), math.sin(radians)
+        matrix = " ".join(
+            _num(v)
+            for v in (cos, sin, -sin, cos, x + offset * cos, y + offset * sin)
+        )
+        self.operations.append(
+            b"q " + self._state(opacity)
+            + f"{_color(color)} rg BT {name} {_num(size)} Tf {matrix} Tm ".encode()
+            + _literal(font.encode(text))
+            + b" Tj ET Q"
+        )
+        return self
+
+    def rect(self, x, y, width, height, stroke=None, fill=None, line_width=1, opacity=None):
+        """A rectangle, stroked and/or filled with (r, g, b) colours."""
+        if stroke is None and fill is None:
+            stroke = (0, 0, 0)
+        ops = b"q " + self._state(opacity)
+        if stroke is not None:
+            ops += f"{_color(stroke)} RG {_num(line_width)} w ".encode()
+        if fill is not None:
+            ops += f"{_color(fill)} rg ".encode()
+        paint = "B" if stroke is not None and fill is not None else ("S" if stroke is not None else "f")
+        ops += f"{_num(x)} {_num(y)} {_num(width)} {_num(height)} re {paint} Q".encode()
+        self.operations.append(ops)
+        return self
+
+    def line(self, x1, y1, x2, y2, color=(0, 0, 0), line_width=1, opacity=None):
+        """A straight stroked line."""
+        self.operations.append(
+            b"q " + self._state(opacity)
+            + f"{_color(color)} RG {_num(line_width)} w "
+            f"{_num(x1)} {_num(y1)} m {_num(x2)} {_num(y2)} l S Q".encode()
+        )
+        return self
+
+    def image(self, x, y, width, height, path):
+        """A raster image file scaled into the given box."""
+        key = os.path.abspath(path)
+        name = next((n for n, img in self.images.items() if img.key == key), None)
+        if name is None:
+            name = f"/Im{len(self.images) + 1}"
+            self.images[name] = StampImage(path)
+        self.operations.append(
+            f"q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(y)} cm {name} Do Q".encode()
+        )
+        return self
+
+    def content(self):
+        """The stamp's content stream."""
+        return b"\n".join(self.operations)
+
+    def resources(self, objects):
+        """
+        The stamp's resource dictionary. objects is a dict shared across
+        stamps of one writer, so each font, opacity and image is written
+        once (see FormStamper).
+        """
+        resources = DictionaryObject()
+        if self.fonts:
+            resources[NameObject("/Font")] = DictionaryObject(
+                {NameObject(n): objects.font(f) for n, f in self.fonts.items()}
+            )
+        if self.states:
+            resources[NameObject("/ExtGState")] = DictionaryObject(
+                {NameObject(n): objects.state(a) for n, a in self.states.items()}
+            )
+        if self.images:
+            resources[NameObject("/XObject")] = DictionaryObject(
+                {NameObject(n): objects.image(img) for n, img in self.images.items()}
+            )
+        return resources
+
+
+class StampObjects:
+    """Fonts, graphics states and images already written to one writer."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.fonts = {}
+        self.states = {}
+        self.images = {}
+
+    def font(self, font):
+        if font.key not in self.fonts:
+            self.fonts[font.key] = font.pdf_object(self.writer)
+        return self.fonts[font.key]
+
+    def state(self, opacity):
+        if opacity not in self.states:
+            state = DictionaryObject(
+                {
+                    NameObject("/Type"): NameObject("/ExtGState"),
+                    NameObject("/ca"): FloatObject(opacity),
+                    NameObject("/CA"): FloatObject(opacity),
+                }
+            )
+            self.states[opacity] = self.writer._add_object(state)
+        return self.states[opacity]
+
+    def image(self, image):
+        if image.key not in self.images:
+            self.images[image.key] = image.pdf_object(self.writer)
+        return self.images[image.key]
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """
 Batch stamp multiple PDFs.
+Each file is stamped in a worker process: the stamp is drawn once per page
+size as a Form XObject that every page of the file references. At most
+`workers` files are open at once, and finished files are streamed into the
+output ZIP as they complete; a file that fails is reported and skipped.
 Usage: python stamp_multiple_pdf.py <files_json> <stamp_text>
 files_json: JSON array of file paths
 Output: JSON with result
@@ -8,21 +12,105 @@ Output: JSON with result
 
 import sys
 import os
+import io
 import json
-import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 
 try:
     from pypdf import PdfReader, PdfWriter
+    from overlay import FormStamper
+    from stamp import text_width
+    from zip_packager import ZipPackager
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+
+# Maximum number of input files open at once (one per worker)
+MAX_OPEN_FILES = int(os.environ.get("PDF_STAMP_MAX_OPEN_FILES", "8"))
+
+# Stamped files held in memory ahead of the ZIP writer, per worker
+WINDOW_PER_WORKER = 2
+
+STAMP_COLOR = (0.8, 0.1, 0.1)
+STAMP_FONT = "Helvetica-Bold"
+STAMP_SIZE = 24
+STAMP_MARGIN = 36
+STAMP_PADDING = 8
+
+
+def draw_stamp(stamp, text, width, height):
+    """Draw the text in a box in the top-right corner of a page."""
+    box_width = text_width(text, STAMP_FONT, STAMP_SIZE) + 2 * STAMP_PADDING
+    box_height = STAMP_SIZE + 2 * STAMP_PADDING
+    x = width - STAMP_MARGIN - box_width
+    y = height - STAMP_MARGIN - box_height
+    stamp.rect(x, y, box_width, box_height, stroke=STAMP_COLOR, line_width=2)
+    # Baseline placed so the cap height sits centred in the box
+    stamp.text(
+        x + box_width / 2, y + STAMP_PADDING + STAMP_SIZE * 0.15, text,
+        font=STAMP_FONT, size=STAMP_SIZE, color=STAMP_COLOR, align="center",
+    )
+
+
+def stamp_file(file_path, stamp_text):
+    """Stamp every page of one PDF; returns its bytes."""
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+
+    # One stamp form per page size, referenced from every page
+    stamper = FormStamper(
+        writer, lambda stamp, w, h: draw_stamp(stamp, stamp_text, w, h), "/Stamp"
+    )
+    for page in reader.pages:
+        stamper.stamp(writer.add_page(page))
+
+    # Copy metadata
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _stamp_job(file_path, stamp_text):
+    try:
+        return {"file": file_path, "data": stamp_file(file_path, stamp_text)}
+    except Exception as e:
+        return {"file": file_path, "error": str(e)}
+
+
+def iter_stamped(files, stamp_text, workers=None):
+    """
+    Stamp files across worker processes, yielding one result per file in
+    the order they finish. Only a bounded window of files is submitted
+    ahead of the consumer, so finished ones do not pile up in memory.
+    """
+    if workers is None:
+        workers = min(MAX_OPEN_FILES, os.cpu_count() or 1)
+    workers = max(1, min(workers, len(files)))
+
+    if workers == 1:
+        for file_path in files:
+            yield _stamp_job(file_path, stamp_text)
+        return
+
+    queue = iter(files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while True:
+            for file_path in queue:
+                running.add(pool.submit(_stamp_job, file_path, stamp_text))
+                if len(running) >= WINDOW_PER_WORKER * workers:
+                    break
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
 
 
 def stamp_multiple_pdfs(files_json, stamp_text="STAMPED"):
@@ -33,68 +121,63 @@ def stamp_multiple_pdfs(files_json, stamp_text="STAMPED"):
         if not files:
             return {"success": False, "error": "No files provided"}
 
+        stamp_text = stamp_text or "STAMPED"
         stamped_files = []
         failed_files = []
 
+        existing = []
         for file_path in files:
-            if not os.path.exists(file_path):
+            if os.path.exists(file_path):
+                existing.append(file_path)
+            else:
                 failed_files.append({"file": file_path, "error": "File not found"})
-                continue
-
-            try:
-                reader = PdfReader(file_path)
-                writer = PdfWriter()
-
-                for page in reader.pages:
-                    writer.add_page(page)
-
-                # Copy metadata
-                if reader.metadata:
-                    writer.add_metadata(reader.metadata)
 
-                # Generate stamped filename
-                base_name = os.path.splitext(os.path.basename(file_path))[0]
+        # The first result is held in memory; once a second one arrives
+        # both go into a ZIP and later results stream straight into it
+        first = None
+        archive = None
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job = OutputJob("stamp_multiple")
+        zip_path = job.staged(f"stamped_pdfs_{timestamp}.zip")
+
+        try:
+            for result in iter_stamped(existing, stamp_text):
+                if "error" in result:
+                    failed_files.append({"file": result["file"], "error": result["error"]})
+                    continue
+
+                # Generate stamped filename; the ZIP suffixes repeated names
+                base_name = os.path.splitext(os.path.basename(result["file"]))[0]
                 stamped_filename = f"{base_name}_stamped.pdf"
-                stamped_path = os.path.join(DOWNLOAD_DIR, stamped_filename)
-
-                # Ensure download directory exists
-                os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-                # Write output
-                with open(stamped_path, "wb") as f:
-                    writer.write(f)
-
-                stamped_files.append(stamped_path)
-
-            except Exception as e:
-                failed_files.append({"file": file_path, "error": str(e)})
-
-        # Create ZIP if multiple files
-        if len(stamped_files) > 1:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            zip_filename = f"stamped_pdfs_{timestamp}.zip"
-            zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
-
-            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                for stamped_file in stamped_files:
-                    zipf.write(stamped_file, os.path.basename(stamped_file))
-
-            # Clean up individual files
-            for stamped_file in stamped_files:
-                try:
-                    os.remove(stamped_file)
-                except:
-                    pass
 
-            output_path = zip_path
-        elif len(stamped_files) == 1:
-            output_path = stamped_files[0]
+                if first is None:
+                    first = (stamped_filename, result["data"])
+                    stamped_files.append(stamped_filename)
+                    continue
+                if archive is None:
+                    archive = ZipPackager(zip_path)
+                    archive.add(*first)
+                stamped_files.append(archive.add(stamped_filename, result["data"]))
+        except BaseException:
+            if archive is not None:
+                archive.abort()
+            raise
+
+        if archive is not None:
+            archive.close()
+            output_path = job.publish(zip_path)
+        elif first is not None:
+            output_path = job.staged(first[0])
+            with open(output_path, "wb") as f:
+                f.write(first[1])
+            output_path = job.publish(output_path)
         else:
             output_path = None
 
         return {
             "success": True,
             "output": output_path,
+            "stamped": stamped_files,
             "stampedCount": len(stamped_files),
             "failedCount": len(failed_files),
             "failed": failed_files,
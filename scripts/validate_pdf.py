@@ -8,6 +8,7 @@ Output: JSON with result
 import sys
 import os
 import json
+import re
 from datetime import datetime
 
 # Get download directory from environment or use default
@@ -22,73 +23,80 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {str(e)}"}))
     sys.exit(1)
 
+from pipe_io import as_stream, input_exists, mapped_input
+
+# PDF/A markers; regular expressions search bytes, memoryviews and memory
+# maps alike, in place
+PDFA_MARKERS = (re.compile(rb"/Type /Catalog"), re.compile(rb"/Metadata"))
+
 
 def validate_pdf(input_path):
     """Validate PDF and check for PDF/A compliance."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
-
-        # Basic validation
-        validation = {
-            "isValid": True,
-            "pageCount": len(reader.pages),
-            "isPdfA": False,
-            "issues": [],
-            "warnings": [],
-            "metadata": {},
-        }
-
-        # Check PDF version
-        if hasattr(reader, "pdf_header"):
-            validation["pdfVersion"] = str(reader.pdf_header)
-
-        # Check metadata
-        if reader.metadata:
-            validation["metadata"] = {
-                "hasTitle": bool(reader.metadata.get("/Title")),
-                "hasAuthor": bool(reader.metadata.get("/Author")),
-                "hasSubject": bool(reader.metadata.get("/Subject")),
-                "hasKeywords": bool(reader.metadata.get("/Keywords")),
-            }
-
-        # Check for PDF/A markers (basic check)
-        try:
-            with open(input_path, "rb") as f:
-                content = f.read()
-                if b"/Type /Catalog" in content and b"/Metadata" in content:
-                    validation["isPdfA"] = True
-        except:
-            pass
-
-        # Check for encryption
-        if reader.is_encrypted:
-            validation["isEncrypted"] = True
-            validation["warnings"].append(
-                "PDF is encrypted - limited validation possible"
-            )
-
-        # Check for form fields
-        if reader.get_form_text_fields():
-            validation["hasFormFields"] = True
-
-        # Validate each page
-        for i, page in enumerate(reader.pages):
-            if not page.get("/MediaBox"):
-                validation["issues"].append(f"Page {i + 1}: Missing MediaBox")
-
-        # Overall validity
-        if validation["issues"]:
-            validation["isValid"] = False
-
-        return {"success": True, "validation": validation}
+        # Mapped, so the marker search below reads the page cache in place
+        with mapped_input(input_path) as data:
+            return {"success": True, "validation": _validate(data)}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def _validate(data):
+    reader = PdfReader(as_stream(data))
+
+    # Basic validation
+    validation = {
+        "isValid": True,
+        "pageCount": len(reader.pages),
+        "isPdfA": False,
+        "issues": [],
+        "warnings": [],
+        "metadata": {},
+    }
+
+    # Check PDF version
+    if hasattr(reader, "pdf_header"):
+        validation["pdfVersion"] = str(reader.pdf_header)
+
+    # Check metadata
+    if reader.metadata:
+        validation["metadata"] = {
+            "hasTitle": bool(reader.metadata.get("/Title")),
+            "hasAuthor": bool(reader.metadata.get("/Author")),
+            "hasSubject": bool(reader.metadata.get("/Subject")),
+            "hasKeywords": bool(reader.metadata.get("/Keywords")),
+        }
+
+    # Check for PDF/A markers (basic check)
+    if all(marker.search(data) for marker in PDFA_MARKERS):
+        validation["isPdfA"] = True
+
+    # Check for encryption
+    if reader.is_encrypted:
+        validation["isEncrypted"] = True
+        validation["warnings"].append(
+            "PDF is encrypted - limited validation possible"
+        )
+
+    # Check for form fields
+    if reader.get_form_text_fields():
+        validation["hasFormFields"] = True
+
+    # Validate each page
+    for i, page in enumerate(reader.pages):
+        if not page.get("/MediaBox"):
+            validation["issues"].append(f"Page {i + 1}: Missing MediaBox")
+
+    # Overall validity
+    if validation["issues"]:
+        validation["isValid"] = False
+
+    return validation
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print(json.dumps({"success": False, "error": "Input PDF file required"}))
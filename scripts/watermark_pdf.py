@@ -9,83 +9,54 @@ import sys
 import os
 import json
 from datetime import datetime
-import math
-import tempfile
 
 try:
     from pypdf import PdfReader, PdfWriter
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.colors import Color
+    from overlay import FormStamper
 except ImportError:
     from PyPDF2 import PdfReader, PdfWriter
 
-# Get download directory from environment or use default
-DOWNLOAD_DIR = os.environ.get(
-    "DOWNLOAD_DIR",
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-)
+from output_manager import OutputJob
+from pipe_io import input_exists, input_name, open_input
 
 
-def create_watermark(text, opacity=0.3):
-    """Create a watermark PDF page."""
-    # Use temp directory for watermark (cross-platform)
-    temp_dir = tempfile.gettempdir()
-    watermark_path = os.path.join(temp_dir, "watermark.pdf")
-
-    # Create watermark using reportlab
-    c = canvas.Canvas(watermark_path, pagesize=letter)
-    width, height = letter
-
-    # Set watermark properties
-    c.setFont("Helvetica-Bold", 60)
-    c.setFillColor(Color(0.5, 0.5, 0.5, alpha=float(opacity)))
-
-    # Rotate and center text
-    c.saveState()
-    c.translate(width / 2, height / 2)
-    c.rotate(45)
-    c.drawCentredString(0, 0, text)
-    c.restoreState()
-
-    c.save()
-    return watermark_path
+def draw_watermark(stamp, text, opacity, width, height):
+    """Draw the watermark diagonally across the centre of a page."""
+    stamp.text(
+        width / 2, height / 2, text,
+        font="Helvetica-Bold", size=60, color=(0.5, 0.5, 0.5),
+        align="center", opacity=float(opacity), angle=45,
+    )
 
 
 def watermark_pdf(input_path, watermark_text, opacity="0.3"):
     """Add watermark to PDF."""
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         return {"success": False, "error": f"File not found: {input_path}"}
 
     try:
-        reader = PdfReader(input_path)
+        reader = PdfReader(open_input(input_path))
         writer = PdfWriter()
 
-        # Create watermark
-        watermark_path = create_watermark(watermark_text, float(opacity))
-        watermark_reader = PdfReader(watermark_path)
-        watermark_page = watermark_reader.pages[0]
-
-        # Add watermark to each page
+        # One watermark form per page size, referenced from every page
+        stamper = FormStamper(
+            writer,
+            lambda stamp, w, h: draw_watermark(stamp, watermark_text, float(opacity), w, h),
+            "/Wm",
+        )
         for page in reader.pages:
-            page.merge_page(watermark_page)
-            writer.add_page(page)
-
-        # Clean up watermark file
-        os.remove(watermark_path)
-
-        # Ensure download directory exists
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+            stamper.stamp(writer.add_page(page))
 
         # Generate output filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        base_name = os.path.splitext(input_name(input_path))[0]
         output_filename = f"{base_name}_watermarked_{timestamp}.pdf"
-        output_path = os.path.join(DOWNLOAD_DIR, output_filename)
+        job = OutputJob("watermark")
 
         # Write watermarked PDF
-        with open(output_path, "wb") as output_file:
+        with job.open(output_filename) as output_file:
             writer.write(output_file)
+        output_path = job.output
 
         return {"success": True, "output": output_path}
 
@@ -7,33 +7,25 @@ Usage: python word_to_pdf.py <input_docx>
 Outputs a JSON payload with `success`, `output` (PDF path) or `error`.
 """
 
-import sys, os, json, datetime, subprocess, traceback
+import sys, json, datetime, subprocess, traceback
 from pathlib import Path
 
 
-# Get download directory from environment or use default
-def _get_download_dir():
-    return Path(
-        os.environ.get(
-            "DOWNLOAD_DIR",
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "download"),
-        )
-    )
+from output_manager import OutputJob
 
 
 # ----------------------------------------------------------------------
-# Helper: produce a timestamped output filename inside the ./download folder
+# Helper: produce a timestamped output filename
 # ----------------------------------------------------------------------
-def _output_path():
+def _output_name():
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_name = f"word_to_pdf_{ts}.pdf"
-    return _get_download_dir() / out_name
+    return f"word_to_pdf_{ts}.pdf"
 
 
 # ----------------------------------------------------------------------
 # Primary conversion – Microsoft Word COM
 # ----------------------------------------------------------------------
-def _convert_using_com(input_path: str) -> str:
+def _convert_using_com(input_path: str, job: OutputJob) -> str:
     try:
         import win32com.client  # pywin32
     except Exception as e:
@@ -43,11 +35,11 @@ def _convert_using_com(input_path: str) -> str:
     word.Visible = False
     try:
         doc = word.Documents.Open(str(Path(input_path).absolute()))
-        out_path = _output_path()
+        out_path = job.staged(_output_name())
         # 17 = wdFormatPDF
         doc.SaveAs(str(out_path), FileFormat=17)
         doc.Close()
-        return str(out_path)
+        return job.publish(out_path)
     finally:
         word.Quit()
 
@@ -55,9 +47,9 @@ def _convert_using_com(input_path: str) -> str:
 # ----------------------------------------------------------------------
 # Fallback conversion – LibreOffice (`unoconv` or `soffice`)
 # ----------------------------------------------------------------------
-def _convert_using_libreoffice(input_path: str) -> str:
-    out_dir = _get_download_dir()
-    out_dir.mkdir(parents=True, exist_ok=True)
+def _convert_using_libreoffice(input_path: str, job: OutputJob) -> str:
+    # LibreOffice names the output after the input, inside a staging folder
+    out_dir = Path(job.staging_dir())
 
     # Try unoconv first
     try:
@@ -67,7 +59,7 @@ def _convert_using_libreoffice(input_path: str) -> str:
             capture_output=True,
             timeout=120,
         )
-        return str(out_dir / (Path(input_path).stem + ".pdf"))
+        return job.publish(str(out_dir / (Path(input_path).stem + ".pdf")))
     except Exception:
         # Direct LibreOffice call as fallback
         subprocess.run(
@@ -84,7 +76,7 @@ def _convert_using_libreoffice(input_path: str) -> str:
             capture_output=True,
             timeout=120,
         )
-        return str(out_dir / (Path(input_path).stem + ".pdf"))
+        return job.publish(str(out_dir / (Path(input_path).stem + ".pdf")))
 
 
 # ----------------------------------------------------------------------
@@ -93,11 +85,12 @@ def _convert_using_libreoffice(input_path: str) -> str:
 def word_to_pdf(input_path: str):
     if not Path(input_path).exists():
         return {"success": False, "error": f"File not found: {input_path}"}
+    job = OutputJob("word_to_pdf")
     try:
-        pdf_path = _convert_using_com(input_path)
+        pdf_path = _convert_using_com(input_path, job)
     except Exception as com_err:
         try:
-            pdf_path = _convert_using_libreoffice(input_path)
+            pdf_path = _convert_using_libreoffice(input_path, job)
         except Exception as lo_err:
             return {
                 "success": False,
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Streaming ZIP writer shared by the tools that return several files.
+Members are handed over as bytes or as an iterable of byte chunks and go
+straight into the archive, so no tool writes its parts to disk first.
+Each member is probed for compressibility: PNG/JPEG/ZIP data and anything
+that barely shrinks is stored, the rest is deflated. In-memory members are
+probed and deflated on a thread pool (zlib releases the GIL) while the
+archive is written in the order members were added.
+"""
+
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+DEFLATE_LEVEL = 6
+
+# Signatures of formats that are already compressed as a whole
+COMPRESSED_MAGIC = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # JPEG
+    b"PK\x03\x04",  # ZIP, DOCX, XLSX, PPTX
+    b"GIF8",
+    b"\x1f\x8b",  # gzip
+    b"RIFF",  # WebP
+)
+
+# Bytes sampled from the start, middle and end of a member by the probe
+PROBE_SAMPLE = 16 * 1024
+
+# Members deflated only if the probe sample shrinks below this ratio
+STORE_RATIO = 0.9
+
+# Members below this size are stored; deflate framing would eat the gain
+MIN_DEFLATE_SIZE = 256
+
+# Deflated members held in memory ahead of the writer, per worker
+WINDOW_PER_WORKER = 2
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+UTF8_FLAG = 0x800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+# Made by Unix so the external attributes below carry file permissions
+VERSION_MADE_BY = (3 << 8) | VERSION_ZIP64
+FILE_ATTRIBUTES = (0o100644 & 0xFFFF) << 16
+
+# Stem of members whose name sanitises to nothing
+FALLBACK_NAME = "file"
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+ZIP64_END_RECORD = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+
+
+def is_compressible(data):
+    """
+    Probe whether deflating data is worth it: known compressed formats are
+    not, everything else is judged by deflating a few samples at level 1.
+    """
+    if len(data) < MIN_DEFLATE_SIZE:
+        return False
+    head = bytes(data[:4])
+    if head.startswith(COMPRESSED_MAGIC):
+        return False
+    if len(data) <= 3 * PROBE_SAMPLE:
+        samples = [data]
+    else:
+        middle = (len(data) - PROBE_SAMPLE) // 2
+        samples = [
+            data[:PROBE_SAMPLE],
+            data[middle : middle + PROBE_SAMPLE],
+            data[-PROBE_SAMPLE:],
+        ]
+    raw = sum(len(sample) for sample in samples)
+    packed = sum(len(zlib.compress(sample, 1)) for sample in samples)
+    return packed < raw * STORE_RATIO
+
+
+def pack_member(data, level=DEFLATE_LEVEL):
+    """Returns (method, crc, packed bytes) for an in-memory member."""
+    crc = zlib.crc32(data)
+    if is_compressible(data):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        packed = compressor.compress(data) + compressor.flush()
+        if len(packed) < len(data):
+            return ZIP_DEFLATED, crc, packed
+    return ZIP_STORED, crc, data
+
+
+def _dos_time(timestamp):
+    t = time.localtime(timestamp)
+    year = max(1980, t.tm_year)
+    date = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    clock = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return date, clock
+
+
+def safe_member_name(name):
+    """
+    A member name that cannot escape the folder it is extracted into:
+    forward slashes only, no drive, and no empty, "." or ".." parts.
+    Empty when nothing usable is left.
+    """
+    name = name.replace("\\", "/").replace(os.sep, "/")
+    parts = []
+    for part in name.split("/"):
+        part = "".join(c for c in part if c >= " ")
+        if part in ("", ".", "..") or part.endswith(":"):
+            continue
+        parts.append(part)
+    return "/".join(parts)
+
+
+class ZipPackager:
+    """
+    Writes a ZIP archive to output_path member by member.
+
+        with ZipPackager(path) as archive:
+            archive.add("page_1.pdf", pdf_bytes)
+            archive.add("log.txt", (line.encode() for line in lines))
+
+    Bytes-like members are packed on worker threads; iterables are streamed
+    through the writer in chunks. If the block raises, the partial archive
+    is removed.
+    """
+
+    def __init__(self, output_path, workers=None, level=DEFLATE_LEVEL):
+        self.output_path = output_path
+        self.level = level
+        if workers is None:
+            workers = min(4, os.cpu_count() or 1)
+        self.window = max(1, workers) * WINDOW_PER_WORKER
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.pending = deque()
+        self.entries = []
+        self.names = set()
+        self.date, self.clock = _dos_time(time.time())
+        self.stats = {
+            "members": 0,
+            "stored": 0,
+            "deflated": 0,
+            "bytes": 0,
+            "compressedBytes": 0,
+        }
+        self.out = open(output_path, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def add(self, name, data):
+        """
+        Add a member from bytes or from an iterable of byte chunks. Returns
+        the member's name, suffixed if an earlier member already had it.
+        """
+        name = self._unique_name(name)
+        if isinstance(data, (bytes, bytearray, memoryview)) and len(data) < ZIP64_LIMIT:
+            future = self.pool.submit(pack_member, data, self.level)
+            self.pending.append((name, len(data), future))
+            while len(self.pending) > self.window:
+                self._write_pending()
+        else:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                data = [data]
+            self._drain()
+            self._write_streamed(name, data)
+        return name
+
+    def close(self):
+        """Finish the archive and return member statistics."""
+        try:
+            self._drain()
+            self._write_central_directory()
+        finally:
+            self.pool.shutdown()
+            self.out.close()
+        return dict(self.stats)
+
+    def abort(self):
+        """Drop the archive, e.g. after a failure while building members."""
+        for _, _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.pool.shutdown()
+        self.out.close()
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+
+    def _unique_name(self, name):
+        name = safe_member_name(name) or f"{FALLBACK_NAME}_{len(self.names) + 1}"
+        if name in self.names:
+            stem, dot, ext = name.rpartition(".")
+            if not dot:
+                stem, ext = name, ""
+            n = 2
+            while True:
+                candidate = f"{stem}_{n}.{ext}" if dot else f"{stem}_{n}"
+                if candidate not in self.names:
+                    name = candidate
+                    break
+                n += 1
+        self.names.add(name)
+        return name
+
+    def _drain(self):
+        while self.pending:
+            self._write_pending()
+
+    def _write_pending(self):
+        name, size, future = self.pending.popleft()
+        method, crc, packed = future.result()
+        offset = self.out.tell()
+        encoded = name.encode("utf-8")
+        self.out.write(
+            LOCAL_HEADER.pack(
+                0x04034B50, VERSION_DEFAULT, UTF8_FLAG, method, self.clock, self.date,
+                crc, len(packed), size, len(encoded), 0,
+            )
+        )
+        self.out.write(encoded)
+        self.out.write(packed)
+        self._record(encoded, method, crc, len(packed), size, offset)
+
+    def _write_streamed(self, name, chunks):
+        """
+        Stream an iterable member. Its sizes are unknown up front, so the
+        local header reserves a ZIP64 field and is patched afterwards. The
+        first PROBE_SAMPLE bytes are buffered for the compressibility probe.
+        """
+        chunks = iter(chunks)
+        head = []
+        buffered = 0
+        for chunk in chunks:
+            head.append(chunk)
+            buffered += len(chunk)
+            if buffered >= PROBE_SAMPLE:
+                break
+        first = b"".join(head)
+        method = ZIP_DEFLATED if is_compressible(first) else ZIP_STORED
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+
+        offset = self.out.tell()
+        encoded = name.encode("utf-8")
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+        self.out.write(
+            LOCAL_HEADER.pack(
+                0x04034B50, VERSION_ZIP64, UTF8_FLAG, method, self.clock, self.date,
+                0, ZIP64_LIMIT, ZIP64_LIMIT, len(encoded), len(extra),
+            )
+        )
+        self.out.write(encoded)
+        self.out.write(extra)
+
+        crc = 0
+        size = 0
+        packed_size = 0
+        chunk = first
+        while True:
+            if chunk:
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if method == ZIP_DEFLATED:
+                    chunk = compressor.compress(chunk)
+                self.out.write(chunk)
+                packed_size += len(chunk)
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+        if method == ZIP_DEFLATED:
+            tail = compressor.flush()
+            self.out.write(tail)
+            packed_size += len(tail)
+
+        end = self.out.tell()
+        self.out.seek(offset + 14)
+        self.out.write(struct.pack("<I", crc))
+        self.out.seek(offset + LOCAL_HEADER.size + len(encoded) + 4)
+        self.out.write(struct.pack("<QQ", size, packed_size))
+        self.out.seek(end)
+        self._record(encoded, method, crc, packed_size, size, offset)
+
+    def _record(self, encoded, method, crc, packed_size, size, offset):
+        self.entries.append((encoded, method, crc, packed_size, size, offset))
+        self.stats["members"] += 1
+        self.stats["stored" if method == ZIP_STORED else "deflated"] += 1
+        self.stats["bytes"] += size
+        self.stats["compressedBytes"] += packed_size
+
+    def _write_central_directory(self):
+        start = self.out.tell()
+        for encoded, method, crc, packed_size, size, offset in self.entries:
+            # ZIP64 extra holds, in order, whichever fields overflow 32 bits
+            zip64 = [v for v in (size, packed_size, offset) if v >= ZIP64_LIMIT]
+            extra = b""
+            if zip64:
+                extra = struct.pack("<HH", 0x0001, 8 * len(zip64))
+                extra += struct.pack("<%dQ" % len(zip64), *zip64)
+            self.out.write(
+                CENTRAL_HEADER.pack(
+                    0x02014B50, VERSION_MADE_BY,
+                    VERSION_ZIP64 if zip64 else VERSION_DEFAULT,
+                    UTF8_FLAG, method, self.clock, self.date, crc,
+                    min(packed_size, ZIP64_LIMIT), min(size, ZIP64_LIMIT),
+                    len(encoded), len(extra), 0, 0, 0, FILE_ATTRIBUTES,
+                    min(offset, ZIP64_LIMIT),
+                )
+            )
+            self.out.write(encoded)
+            self.out.write(extra)
+        end = self.out.tell()
+
+        count = len(self.entries)
+        size = end - start
+        if count >= ZIP64_COUNT_LIMIT or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            self.out.write(
+                ZIP64_END_RECORD.pack(
+                    0x06064B50, ZIP64_END_RECORD.size - 12, VERSION_MADE_BY,
+                    VERSION_ZIP64, 0, 0, count, count, size, start,
+                )
+            )
+            self.out.write(ZIP64_LOCATOR.pack(0x07064B50, 0, end, 1))
+        self.out.write(
+            END_RECORD.pack(
+                0x06054B50, 0, 0,
+                min(count, ZIP64_COUNT_LIMIT), min(count, ZIP64_COUNT_LIMIT),
+                min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0,
+            )
+        )
+
+
+def write_zip(output_path, members, workers=None):
+    """Write (name, data) members to output_path; returns member statistics."""
+    with ZipPackager(output_path, workers) as archive:
+        for name, data in members:
+            archive.add(name, data)
+    return archive.stats
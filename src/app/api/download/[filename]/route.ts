@@ -6,6 +6,9 @@ import { validateDownloadFilename, addSecurityHeaders } from "@/lib/security";
 // Cross-platform download directory
 const DOWNLOAD_DIR = join(process.cwd(), "download");
 
+// Job directories created by scripts/output_manager.py: <kind>_<date>_<time>_<hex>
+const JOB_ID_PATTERN = /^[a-z0-9_]+_\d{8}_\d{6}_[0-9a-f]{8}$/;
+
 // Allowed file extensions for downloads
 const ALLOWED_EXTENSIONS = new Set([
   "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx",
@@ -28,8 +31,19 @@ export async function GET(
       return addSecurityHeaders(errorResponse);
     }
 
+    // Outputs live in per-job directories; ?job=<id> selects one
+    const job = request.nextUrl.searchParams.get("job");
+    if (job !== null && !JOB_ID_PATTERN.test(job)) {
+      const errorResponse = NextResponse.json(
+        { error: "Invalid job" },
+        { status: 400 }
+      );
+      return addSecurityHeaders(errorResponse);
+    }
+    const baseDir = job ? join(DOWNLOAD_DIR, job) : DOWNLOAD_DIR;
+
     // Validate filename to prevent path traversal
-    const validatedPath = validateDownloadFilename(filename, DOWNLOAD_DIR);
+    const validatedPath = validateDownloadFilename(filename, baseDir);
     
     if (!validatedPath) {
       const errorResponse = NextResponse.json(
@@ -0,0 +1,9 @@
+import { NextRequest } from "next/server";
+import { handlePdfApiRoute } from "@/lib/api-utils";
+
+export async function POST(request: NextRequest) {
+  return handlePdfApiRoute(request, {
+    scriptName: "analyze_pdf.py",
+    jsonOnly: true,
+  });
+}
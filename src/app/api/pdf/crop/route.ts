@@ -5,5 +5,6 @@ export async function POST(request: NextRequest) {
   return handlePdfApiRoute(request, {
     scriptName: "crop_pdf.py",
     additionalParams: ["cropBox"],
+    piped: true,
   });
 }
\ No newline at end of file
@@ -4,5 +4,6 @@ import { handlePdfApiRoute } from "@/lib/api-utils";
 export async function POST(request: NextRequest) {
   return handlePdfApiRoute(request, {
     scriptName: "grayscale_pdf.py",
+    piped: true,
   });
 }
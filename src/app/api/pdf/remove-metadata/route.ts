@@ -4,5 +4,6 @@ import { handlePdfApiRoute } from "@/lib/api-utils";
 export async function POST(request: NextRequest) {
   return handlePdfApiRoute(request, {
     scriptName: "remove_metadata_pdf.py",
+    piped: true,
   });
 }
@@ -5,5 +5,6 @@ export async function POST(request: NextRequest) {
   return handlePdfApiRoute(request, {
     scriptName: "rotate_pdf.py",
     additionalParams: ["rotation"],
+    piped: true,
   });
 }
\ No newline at end of file
@@ -3,6 +3,7 @@ import {
   ensureDirectories,
   saveUploadedFile,
   executePythonScript,
+  executePythonScriptPiped,
   cleanupFile,
 } from "@/lib/pdf-processor";
 import { uploadToSupabase } from "@/lib/supabase-upload";
@@ -22,6 +23,12 @@ export interface ApiRouteOptions {
   requireMultipleFiles?: boolean;
   minFiles?: number;
   additionalParams?: string[];
+  // Pipe a single upload through the tool in memory (stdin in, fd 3 out)
+  // instead of writing the input and output to disk; the tool must accept
+  // "-" as its input path. Ignored on Vercel, which runs tools remotely
+  piped?: boolean;
+  // The tool only reports JSON (no output file); return it as the response
+  jsonOnly?: boolean;
 }
 
 export function getClientIp(request: NextRequest): string {
@@ -39,6 +46,50 @@ export function getClientIp(request: NextRequest): string {
   return "unknown";
 }
 
+// Run a tool on one upload entirely in memory and upload its output
+async function handlePipedFile(
+  file: File,
+  scriptName: string,
+  params: string[],
+  userId: string
+): Promise<NextResponse> {
+  const input = Buffer.from(await file.arrayBuffer());
+  const { result, data } = await executePythonScriptPiped(scriptName, ["-", ...params], input);
+
+  if (!result.success) {
+    return NextResponse.json(
+      { success: false, error: result.error || "Processing failed" },
+      { status: 500 }
+    );
+  }
+  if (data.length === 0) {
+    return NextResponse.json(
+      { success: false, error: "Invalid output from processing" },
+      { status: 500 }
+    );
+  }
+
+  // The tool only saw stdin, so the output is named after the upload here
+  const baseName = file.name.replace(/\.pdf$/i, "") || "document";
+  const tool = scriptName.replace(/(_pdf)?\.py$/, "");
+  const outputFileName = `${baseName}_${tool}_${Date.now()}.pdf`;
+  const { url, error } = await uploadToSupabase(data, outputFileName, userId);
+
+  if (error || !url) {
+    return NextResponse.json(
+      { success: false, error: "Upload failed: " + (error || "Please try again") },
+      { status: 500 }
+    );
+  }
+
+  return NextResponse.json({
+    ...result,
+    success: true,
+    downloadUrl: url,
+    fileName: outputFileName,
+  });
+}
+
 export async function handlePdfApiRoute(
   request: NextRequest,
   options: ApiRouteOptions
@@ -50,6 +101,8 @@ export async function handlePdfApiRoute(
     requireMultipleFiles = false,
     minFiles = 2,
     additionalParams = [],
+    piped = false,
+    jsonOnly = false,
   } = options;
 
   try {
@@ -125,21 +178,28 @@ export async function handlePdfApiRoute(
       }
     }
 
-    // 6. Save uploaded files
-    for (const file of files) {
-      const filePath = await saveUploadedFile(file);
-      inputPaths.push(filePath);
-    }
-
-    // 7. Extract additional parameters
-    const scriptArgs: string[] = [...inputPaths];
+    // 6. Extract additional parameters
+    const params: string[] = [];
     for (const param of additionalParams) {
       const value = formData.get(param) as string;
       if (value) {
-        scriptArgs.push(value);
+        params.push(value);
       }
     }
 
+    // Vercel has no local Python; there every tool goes through
+    // executePythonScript, which forwards it to the Render service
+    if (piped && files.length === 1 && process.env.VERCEL !== "1") {
+      return await handlePipedFile(files[0], scriptName, params, user.id);
+    }
+
+    // 7. Save uploaded files
+    for (const file of files) {
+      const filePath = await saveUploadedFile(file);
+      inputPaths.push(filePath);
+    }
+    const scriptArgs: string[] = [...inputPaths, ...params];
+
     // 8. Execute Python script
     const result = await executePythonScript(scriptName, scriptArgs);
 
@@ -150,6 +210,11 @@ export async function handlePdfApiRoute(
       );
     }
 
+    // Report-only tools have no output file; their JSON is the response
+    if (jsonOnly) {
+      return NextResponse.json(result);
+    }
+
     outputPath = result.output as string;
     if (!outputPath) {
       return NextResponse.json(
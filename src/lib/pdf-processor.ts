@@ -1,4 +1,4 @@
-import { exec } from "child_process";
+import { exec, spawn } from "child_process";
 import { promisify } from "util";
 import { mkdir, writeFile, unlink, access, readFile } from "fs/promises";
 import { join } from "path";
@@ -20,6 +20,8 @@ export type PythonScriptResult = {
   success: boolean;
   output?: string;
   error?: string;
+  // "RESOURCE_LIMIT" when the input was rejected by the pre-flight guard
+  errorCode?: string;
   downloadUrl?: string;
   fileName?: string;
   file_data?: string;
@@ -115,6 +117,63 @@ export async function executePythonScript(
   }
 }
 
+// Run a Python tool on an in-memory document without touching disk.
+// The input is piped to stdin (pass "-" where the tool expects the input
+// path) and the output document comes back on fd 3; stdout keeps the JSON.
+// Needs a local Python, so it is not available on Vercel.
+export async function executePythonScriptPiped(
+  scriptName: string,
+  args: string[],
+  input: Buffer
+): Promise<{ result: PythonScriptResult; data: Buffer }> {
+  if (process.env.VERCEL === '1') {
+    return {
+      result: { success: false, error: "Piped execution needs a local Python" },
+      data: Buffer.alloc(0),
+    };
+  }
+
+  const scriptPath = join(SCRIPTS_DIR, scriptName);
+  const pythonCmd = process.platform === "win32" ? "py" : "python3";
+  const pythonArgs = process.platform === "win32" ? ["-3", scriptPath, ...args] : [scriptPath, ...args];
+
+  return new Promise((resolvePromise) => {
+    const child = spawn(pythonCmd, pythonArgs, {
+      env: { ...process.env, DOWNLOAD_DIR, UPLOAD_DIR, PDF_OUTPUT_FD: "3" },
+      stdio: ["pipe", "pipe", "pipe", "pipe"],
+      timeout: 120000,
+    });
+
+    const stdout: Buffer[] = [];
+    const output: Buffer[] = [];
+    const outputStream = child.stdio[3] as NodeJS.ReadableStream;
+    child.stdout.on("data", (chunk: Buffer) => stdout.push(chunk));
+    outputStream.on("data", (chunk: Buffer) => output.push(chunk));
+    child.stderr.on("data", (chunk: Buffer) => {
+      const text = chunk.toString();
+      if (!text.includes("warning")) console.error("Python stderr:", text);
+    });
+
+    child.on("error", (error) => {
+      resolvePromise({ result: { success: false, error: error.message }, data: Buffer.alloc(0) });
+    });
+    child.on("close", () => {
+      let result: PythonScriptResult;
+      try {
+        result = JSON.parse(Buffer.concat(stdout).toString().trim()) as PythonScriptResult;
+      } catch {
+        result = { success: false, error: "Invalid output from processing" };
+      }
+      resolvePromise({ result, data: Buffer.concat(output) });
+    });
+
+    child.stdin.on("error", () => {
+      // The tool may exit before reading all of its input
+    });
+    child.stdin.end(input);
+  });
+}
+
 // Map script names to Render service endpoints
 function getEndpointForScript(scriptName: string): string | null {
   const mapping: Record<string, string> = {
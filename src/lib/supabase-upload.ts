@@ -13,8 +13,9 @@ async function delay(ms: number): Promise<void> {
   return new Promise((resolve) => setTimeout(resolve, ms));
 }
 
+// source is a path to read, or the document itself when it never touched disk
 export async function uploadToSupabase(
-  filePath: string,
+  source: string | Buffer,
   fileName: string,
   userId: string
 ): Promise<SupabaseUploadResponse> {
@@ -35,7 +36,7 @@ export async function uploadToSupabase(
 
   for (let attempt = 1; attempt <= MAX_RETRY_ATTEMPTS; attempt++) {
     try {
-      const fileBuffer = await readFile(filePath);
+      const fileBuffer = typeof source === "string" ? await readFile(source) : source;
       const uint8Array = new Uint8Array(fileBuffer);
 
       const { error } = await supabaseServer.storage